@@ -1,23 +1,73 @@
 """
 API routes for SecurePrompt application.
 """
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, Depends, Header, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse, StreamingResponse
 from pydantic import BaseModel
-from typing import Dict, Any, List, Optional
-import urllib.request
-import urllib.error
+from typing import Dict, Any, AsyncIterator, Awaitable, Callable, List, Literal, Optional
+import hmac
+import httpx
 import json
+from contextlib import asynccontextmanager
 import os
 import time
-from .core.checker import check_prompt
+from .core.checker import PromptChecker, keyword_reloader, prompt_checker
+from .core.pii import redact_findings
+from .core.profiling import PROFILING, PROFILING_TOKEN, SLOW_REQUEST_SECONDS, profiled, slow_request_log
+from .core.sanitizer import default_sanitizer
+from .core.tenants import TENANT_HEADER, UnknownTenantError, tenant_registry
+from .metrics import record_check, sanitize_duration, timed, upstream_duration, upstream_queue_duration
+from .ndjson import LineTooLongError, check_ndjson_line, encode_record, iter_lines
+from .response_cache import response_cache, response_key
+from .scheduler import INTERACTIVE, PRIORITY_HEADER, UpstreamBusyError, request_priority, upstream_scheduler
+from .upstream import get_client
 
 
 router = APIRouter()
 
 
+def tenant_checker(request: Request) -> PromptChecker:
+    """
+    Resolve the checker of the requesting tenant.
+    
+    The tenant is named by the TENANT_HEADER header, or selected by an API
+    key sent as a bearer token or in X-API-Key. Requests without either use
+    the base keyword set.
+    
+    Args:
+        request: Incoming request
+        
+    Returns:
+        Checker with the tenant's keywords
+    """
+    api_key = request.headers.get("X-API-Key")
+    authorization = request.headers.get("Authorization", "")
+    if not api_key and authorization.lower().startswith("bearer "):
+        api_key = authorization[7:].strip()
+    
+    try:
+        tenant = tenant_registry.resolve(request.headers.get(TENANT_HEADER), api_key)
+        return tenant_registry.checker_for(tenant)
+    except UnknownTenantError as e:
+        raise HTTPException(status_code=403, detail=f"Unknown tenant: {e.args[0]}")
+
+
 class PromptRequest(BaseModel):
     """Request model for prompt checking."""
     prompt: str
+    # "count" and "exists" skip match positions; the leftmost kinds report
+    # non-overlapping matches
+    match_kind: Literal["all", "leftmost-longest", "leftmost-first", "count", "exists"] = "all"
+    # Also catch obfuscated keywords ("p a s s w 0 r d"), or keywords with up
+    # to max_errors typos ("pasword"); "all" and "exists" only, not both
+    normalize: bool = False
+    max_errors: Literal[0, 1, 2] = 0
+
+
+class BatchPromptRequest(BaseModel):
+    """Request model for batch prompt checking."""
+    prompts: List[str]
 
 
 class GenerateRequest(BaseModel):
@@ -43,29 +93,237 @@ class ChatCompletionsRequest(BaseModel):
 
 
 @router.post("/check", response_model=Dict[str, Any])
-async def check_prompt_endpoint(request: PromptRequest) -> Dict[str, Any]:
+async def check_prompt_endpoint(request: PromptRequest,
+                                checker: PromptChecker = Depends(tenant_checker)) -> Dict[str, Any]:
     """
     Check if a prompt contains sensitive content.
     
     Args:
         request: PromptRequest containing the prompt to check
+        checker: Checker of the requesting tenant
         
     Returns:
-        Dictionary with status, matches, and response (if safe)
+        Dictionary with status, matches, and response (if safe); counts per
+        keyword instead of matches for "count", and only the status for
+        "exists". Every kind lists personal data findings under "pii" when
+        PII detection is enabled
     """
+    if request.normalize or request.max_errors:
+        if request.match_kind not in ("all", "exists"):
+            raise HTTPException(
+                status_code=422,
+                detail="normalize and max_errors support the 'all' and 'exists' match kinds only"
+            )
+        if request.normalize and request.max_errors:
+            raise HTTPException(
+                status_code=422,
+                detail="normalize and max_errors cannot be combined"
+            )
+    
     try:
-        result = check_prompt(request.prompt)
+        started = time.perf_counter()
+        if request.match_kind in ("exists", "count"):
+            findings = checker.pii_findings(request.prompt)
+            if request.match_kind == "exists":
+                sensitive = bool(findings) or checker.is_sensitive(
+                    request.prompt, request.normalize, request.max_errors
+                )
+                result = {"status": "SENSITIVE" if sensitive else "SAFE"}
+            else:
+                counts = checker.count_keywords(request.prompt)
+                result = {"status": "SENSITIVE" if counts or findings else "SAFE", "counts": counts}
+            if findings is not None:
+                result["pii"] = findings
+        else:
+            result = checker.check_prompt(
+                request.prompt, request.match_kind, request.normalize, request.max_errors
+            )
+        record_check("/check", time.perf_counter() - started, len(request.prompt),
+                     int(result["status"] == "SENSITIVE"))
         return result
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error processing prompt: {str(e)}")
 
 
+# Batch checking configuration
+BATCH_MAX_PROMPTS = int(os.getenv('BATCH_MAX_PROMPTS', '10000'))
+BATCH_PROCESSES = int(os.getenv('BATCH_PROCESSES', '0')) or None
+
+
+@router.post("/check/batch")
+def check_batch_endpoint(request: BatchPromptRequest,
+                         checker: PromptChecker = Depends(tenant_checker)) -> JSONResponse:
+    """
+    Check a batch of prompts in one request.
+    
+    Runs in the threadpool so large batches do not block the event loop.
+    Results are serialized directly instead of going through response model
+    validation.
+    
+    Args:
+        request: BatchPromptRequest containing the prompts to check
+        checker: Checker of the requesting tenant
+        
+    Returns:
+        Per-prompt results in input order plus summary counts
+    """
+    if len(request.prompts) > BATCH_MAX_PROMPTS:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Batch too large: at most {BATCH_MAX_PROMPTS} prompts per request"
+        )
+    
+    try:
+        started = time.perf_counter()
+        results = checker.check_many(request.prompts, BATCH_PROCESSES)
+        seconds = time.perf_counter() - started
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error processing batch: {str(e)}")
+    
+    sensitive = sum(1 for result in results if result["status"] == "SENSITIVE")
+    record_check("/check/batch", seconds, sum(map(len, request.prompts)), sensitive, len(results))
+    return JSONResponse({
+        "results": results,
+        "total": len(results),
+        "sensitive": sensitive
+    })
+
+
+class DuplexStreamingResponse(StreamingResponse):
+    """
+    Streaming response whose body iterator may still be reading the request.
+    
+    The stock StreamingResponse watches for client disconnects by consuming
+    ``receive`` concurrently, which would swallow request body chunks that
+    the generator is waiting for.
+    """
+    
+    async def __call__(self, scope, receive, send) -> None:
+        await self.stream_response(send)
+        if self.background is not None:
+            await self.background()
+
+
+# Lines at least this long are scanned in the threadpool
+NDJSON_THREADPOOL_BYTES = 64 * 1024
+
+
+@router.post("/check/stream")
+async def check_stream_endpoint(request: Request,
+                                checker: PromptChecker = Depends(tenant_checker)) -> StreamingResponse:
+    """
+    Check an NDJSON body of prompts, streaming NDJSON results back.
+    
+    The body is read incrementally and each result is sent as soon as its
+    line is scanned, so memory use does not grow with the body size.
+    
+    Args:
+        request: Raw request with one prompt per line (see app/ndjson.py)
+        checker: Checker of the requesting tenant
+        
+    Returns:
+        NDJSON stream with one result per non-blank input line
+    """
+    async def results():
+        line_number = 0
+        try:
+            async for line in iter_lines(request.stream()):
+                line_number += 1
+                started = time.perf_counter()
+                if len(line) >= NDJSON_THREADPOOL_BYTES:
+                    record = await run_in_threadpool(
+                        check_ndjson_line, line, line_number, checker.check_prompt
+                    )
+                else:
+                    record = check_ndjson_line(line, line_number, checker.check_prompt)
+                if record is not None:
+                    if "status" in record:
+                        record_check("/check/stream", time.perf_counter() - started, len(line),
+                                     int(record["status"] == "SENSITIVE"))
+                    yield encode_record(record)
+        except LineTooLongError as e:
+            yield encode_record({"line": line_number + 1, "error": str(e)})
+    
+    return DuplexStreamingResponse(results(), media_type="application/x-ndjson")
+
+
 @router.get("/health")
 async def health_check():
     """Health check endpoint."""
     return {"status": "healthy", "message": "SecurePrompt API is running"}
 
 
+def admin_token(request: Request) -> None:
+    """
+    Require PROFILING_TOKEN as a bearer token.
+    
+    Args:
+        request: Incoming request
+        
+    Raises:
+        HTTPException: 401 if the token is missing or wrong
+    """
+    authorization = request.headers.get("Authorization", "")
+    token = authorization[7:].strip() if authorization.lower().startswith("bearer ") else ""
+    if not PROFILING_TOKEN or not hmac.compare_digest(token.encode(), PROFILING_TOKEN.encode()):
+        raise HTTPException(status_code=401, detail="Invalid admin token",
+                            headers={"WWW-Authenticate": "Bearer"})
+
+
+# Included by app/main.py only when profiling is enabled and PROFILING_TOKEN is set
+admin_router = APIRouter(dependencies=[Depends(admin_token)])
+
+
+@admin_router.get("/admin/slow-requests")
+async def slow_requests() -> Dict[str, Any]:
+    """
+    List the most recent slow or explicitly profiled requests.
+    
+    Returns:
+        Profiling mode and threshold, plus the kept requests newest first,
+        each with its stage breakdown and input sizes
+    """
+    return {
+        "profiling": PROFILING,
+        "threshold_seconds": SLOW_REQUEST_SECONDS,
+        "recorded": slow_request_log.recorded,
+        "requests": slow_request_log.entries()
+    }
+
+
+@admin_router.delete("/admin/slow-requests")
+async def clear_slow_requests() -> Dict[str, Any]:
+    """Empty the slow request log."""
+    slow_request_log.clear()
+    return {"status": "cleared"}
+
+
+@router.get("/keywords")
+async def keyword_set_info(checker: PromptChecker = Depends(tenant_checker)) -> Dict[str, Any]:
+    """
+    List the monitored keywords and describe the keyword set in use.
+    
+    Args:
+        checker: Checker of the requesting tenant
+        
+    Returns:
+        Keywords plus version, fingerprint and build time of the live set,
+        and the tenant registry counters
+    """
+    keyword_set = checker.keyword_set
+    return {
+        "version": keyword_set.version,
+        "fingerprint": keyword_set.automaton.fingerprint,
+        "keywords": keyword_set.keywords,
+        "count": len(keyword_set.keywords),
+        "states": keyword_set.automaton.state_count,
+        "loaded_at": keyword_set.loaded_at,
+        "build_seconds": keyword_set.build_seconds,
+        "sources": keyword_reloader.source.paths or ["default"],
+        "tenants": tenant_registry.stats()
+    }
+
+
 
 
 
@@ -74,7 +332,44 @@ OLLAMA_BASE_URL = os.getenv('OLLAMA_BASE_URL', 'http://localhost:11434')
 OLLAMA_MODEL = os.getenv('OLLAMA_MODEL', 'llama3.2:latest')
 
 
-def call_ollama_generate(prompt: str, model: str = OLLAMA_MODEL) -> Dict[str, Any]:
+@asynccontextmanager
+async def upstream_slot(model: str, priority: int) -> AsyncIterator[None]:
+    """Hold an Ollama slot for a model, recording the time spent queued."""
+    async with upstream_scheduler.slot(model, priority) as waited:
+        upstream_queue_duration.observe(waited, (upstream_scheduler.label(model),))
+        yield
+
+
+async def cached_upstream(call: Callable[[], Awaitable[Dict[str, Any]]], endpoint: str, model: str,
+                          payload: Any, parameters: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    Make a non-streaming upstream call through the response cache, if enabled.
+    
+    Args:
+        call: Coroutine function making the upstream call
+        endpoint: Upstream endpoint label
+        model: Model name
+        payload: Prompt or messages exactly as sent upstream
+        parameters: Generation parameters of the request
+        
+    Returns:
+        Upstream response, possibly shared with identical requests
+    """
+    if response_cache is None:
+        return await call()
+    return await response_cache.fetch(
+        response_key(endpoint, model, payload, parameters), call, upstream_succeeded
+    )
+
+
+def upstream_succeeded(result: Dict[str, Any]) -> bool:
+    """Whether an upstream result is a real answer rather than an error stand-in."""
+    return "error" not in result and result.get("id") != "chatcmpl-error"
+
+
+@profiled("ollama_generate")
+async def call_ollama_generate(prompt: str, model: str = OLLAMA_MODEL,
+                               priority: int = INTERACTIVE) -> Dict[str, Any]:
     """Call Ollama generate endpoint"""
     try:
         data = {
@@ -83,18 +378,15 @@ def call_ollama_generate(prompt: str, model: str = OLLAMA_MODEL) -> Dict[str, An
             "stream": False
         }
         
-        json_data = json.dumps(data).encode('utf-8')
-        req = urllib.request.Request(
-            f"{OLLAMA_BASE_URL}/api/generate",
-            data=json_data,
-            headers={'Content-Type': 'application/json'}
-        )
+        async with upstream_slot(model, priority):
+            with timed(upstream_duration, ("generate",)):
+                response = await get_client().post(f"{OLLAMA_BASE_URL}/api/generate", json=data)
+        response.raise_for_status()
+        return response.json()
         
-        with urllib.request.urlopen(req, timeout=30) as response:
-            result = json.loads(response.read().decode('utf-8'))
-            return result
-            
-    except urllib.error.URLError as e:
+    except UpstreamBusyError:
+        raise
+    except httpx.TransportError as e:
         return {
             "error": f"Failed to connect to Ollama: {str(e)}",
             "response": f"[OLLAMA UNAVAILABLE] Mock response for: {prompt}",
@@ -110,7 +402,9 @@ def call_ollama_generate(prompt: str, model: str = OLLAMA_MODEL) -> Dict[str, An
         }
 
 
-def call_ollama_chat(messages: List[Dict[str, str]], model: str = OLLAMA_MODEL) -> Dict[str, Any]:
+@profiled("ollama_chat")
+async def call_ollama_chat(messages: List[Dict[str, str]], model: str = OLLAMA_MODEL,
+                           priority: int = INTERACTIVE) -> Dict[str, Any]:
     """Call Ollama chat endpoint"""
     try:
         data = {
@@ -119,18 +413,15 @@ def call_ollama_chat(messages: List[Dict[str, str]], model: str = OLLAMA_MODEL)
             "stream": False
         }
         
-        json_data = json.dumps(data).encode('utf-8')
-        req = urllib.request.Request(
-            f"{OLLAMA_BASE_URL}/api/chat",
-            data=json_data,
-            headers={'Content-Type': 'application/json'}
-        )
+        async with upstream_slot(model, priority):
+            with timed(upstream_duration, ("chat",)):
+                response = await get_client().post(f"{OLLAMA_BASE_URL}/api/chat", json=data)
+        response.raise_for_status()
+        return response.json()
         
-        with urllib.request.urlopen(req, timeout=30) as response:
-            result = json.loads(response.read().decode('utf-8'))
-            return result
-            
-    except urllib.error.URLError as e:
+    except UpstreamBusyError:
+        raise
+    except httpx.TransportError as e:
         return {
             "error": f"Failed to connect to Ollama: {str(e)}",
             "message": {
@@ -152,7 +443,9 @@ def call_ollama_chat(messages: List[Dict[str, str]], model: str = OLLAMA_MODEL)
         }
 
 
-def call_ollama_v1_chat(messages: List[Dict[str, str]], model: str = OLLAMA_MODEL) -> Dict[str, Any]:
+@profiled("ollama_v1_chat")
+async def call_ollama_v1_chat(messages: List[Dict[str, str]], model: str = OLLAMA_MODEL,
+                              priority: int = INTERACTIVE) -> Dict[str, Any]:
     """Call Ollama OpenAI-compatible v1 chat completions endpoint"""
     try:
         data = {
@@ -161,18 +454,15 @@ def call_ollama_v1_chat(messages: List[Dict[str, str]], model: str = OLLAMA_MODE
             "stream": False
         }
         
-        json_data = json.dumps(data).encode('utf-8')
-        req = urllib.request.Request(
-            f"{OLLAMA_BASE_URL}/v1/chat/completions",
-            data=json_data,
-            headers={'Content-Type': 'application/json'}
-        )
+        async with upstream_slot(model, priority):
+            with timed(upstream_duration, ("v1_chat",)):
+                response = await get_client().post(f"{OLLAMA_BASE_URL}/v1/chat/completions", json=data)
+        response.raise_for_status()
+        return response.json()
         
-        with urllib.request.urlopen(req, timeout=30) as response:
-            result = json.loads(response.read().decode('utf-8'))
-            return result
-            
-    except urllib.error.URLError as e:
+    except UpstreamBusyError:
+        raise
+    except httpx.TransportError as e:
         # Return OpenAI-compatible error format
         return {
             "id": "chatcmpl-error",
@@ -222,67 +512,215 @@ def call_ollama_v1_chat(messages: List[Dict[str, str]], model: str = OLLAMA_MODE
 
 
 
+@profiled("ollama_generate_stream")
+async def stream_ollama_generate(prompt: str, model: str = OLLAMA_MODEL,
+                                 priority: int = INTERACTIVE) -> AsyncIterator[Dict[str, Any]]:
+    """Stream Ollama generate endpoint results, one NDJSON object at a time"""
+    data = {
+        "model": model,
+        "prompt": prompt,
+        "stream": True
+    }
+    
+    async with upstream_slot(model, priority):
+        with timed(upstream_duration, ("generate_stream",)):
+            async with get_client().stream("POST", f"{OLLAMA_BASE_URL}/api/generate", json=data) as response:
+                response.raise_for_status()
+                async for line in response.aiter_lines():
+                    line = line.strip()
+                    if line:
+                        yield json.loads(line)
+
+
+@profiled("ollama_v1_chat_stream")
+async def stream_ollama_v1_chat(messages: List[Dict[str, str]], model: str = OLLAMA_MODEL,
+                                priority: int = INTERACTIVE) -> AsyncIterator[Dict[str, Any]]:
+    """Stream Ollama OpenAI-compatible chat completion chunks from its SSE feed"""
+    data = {
+        "model": model,
+        "messages": messages,
+        "stream": True
+    }
+    
+    async with upstream_slot(model, priority):
+        with timed(upstream_duration, ("v1_chat_stream",)):
+            async with get_client().stream("POST", f"{OLLAMA_BASE_URL}/v1/chat/completions", json=data) as response:
+                response.raise_for_status()
+                async for line in response.aiter_lines():
+                    line = line.strip()
+                    if not line.startswith("data:"):
+                        continue
+                    payload = line[5:].strip()
+                    if payload == "[DONE]":
+                        return
+                    yield json.loads(payload)
+
+
+# Scan streamed LLM output and cut the stream when a keyword appears
+STREAM_OUTPUT_FILTER = os.getenv('STREAM_OUTPUT_FILTER', 'false').lower() == 'true'
+
+
+def _sse_event(data: Dict[str, Any]) -> bytes:
+    """Encode one server-sent event"""
+    return b"data: " + json.dumps(data).encode('utf-8') + b"\n\n"
+
+
+def _content_filter_event(chunk: Dict[str, Any], model: str) -> bytes:
+    """Final chat completion chunk of a stream cut by the output filter"""
+    return _sse_event({
+        "id": chunk.get("id", f"chatcmpl-{int(time.time())}"),
+        "object": "chat.completion.chunk",
+        "created": chunk.get("created", int(time.time())),
+        "model": model,
+        "choices": [
+            {
+                "index": 0,
+                "delta": {},
+                "finish_reason": "content_filter"
+            }
+        ]
+    })
 
-def estimate_tokens(text: str) -> int:
-    """Rough token estimation: ~4 characters per token"""
-    return max(1, len(text) // 4)
 
-def smart_sanitize_prompt(prompt: str, matches: List[Dict[str, Any]]) -> str:
-    """Smart sanitization that completely removes sensitive context"""
-    sanitized = prompt
+async def stream_chat_completion(messages: List[Dict[str, str]], model: str,
+                                 checker: PromptChecker = prompt_checker,
+                                 priority: int = INTERACTIVE) -> AsyncIterator[bytes]:
+    """
+    Relay Ollama chat completion chunks to the client as server-sent events.
     
-    import re
+    Each chunk is forwarded as soon as it arrives. With STREAM_OUTPUT_FILTER
+    enabled, generated text is fed through an incremental keyword scan and
+    the stream ends with finish_reason "content_filter" on the first match,
+    before the chunk that completed the keyword is sent. A chunk ending in a
+    possible whole-word match is held back until the next chunk, or the end
+    of the stream, settles it.
+    """
+    scanner = checker.aho_corasick.scanner() if STREAM_OUTPUT_FILTER else None
+    held: List[Dict[str, Any]] = []
     
-    # More aggressive sanitization - remove entire sensitive phrases
-    sanitization_patterns = [
-        # Indonesian ID patterns
-        (r'\b(?:NIK|nik)\s*[:\s]*\d+', 'ID'),
-        (r'\b(?:NIM|nim)\s*[:\s]*\d+', 'student ID'),
-        (r'\b(?:NISN|nisn)\s*[:\s]*\d+', 'student number'),
-        (r'\b(?:KTP|ktp)\s*[:\s]*\d+', 'ID card'),
-        
-        # Phone patterns
-        (r'\b(?:Phone|phone|Telepon|telepon|HP|hp)\s*[:\s]*\d+', 'phone'),
-        (r'\b08\d{8,11}', 'phone'),
-        (r'\b\+62\d{8,11}', 'phone'),
-        
-        # Email patterns
-        (r'\b[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}', 'email'),
-        
-        # Any remaining long numbers that might be IDs
-        (r'\b\d{10,16}\b', 'ID number'),
-    ]
+    try:
+        async for chunk in stream_ollama_v1_chat(messages, model, priority):
+            chunk["model"] = model
+            if scanner is not None:
+                text = "".join(
+                    (choice.get("delta") or {}).get("content") or ""
+                    for choice in chunk.get("choices", [])
+                )
+                if text and scanner.feed(text):
+                    yield _content_filter_event(chunk, model)
+                    break
+                if scanner.pending:
+                    held.append(chunk)
+                    continue
+            for waiting in held:
+                yield _sse_event(waiting)
+            held = []
+            yield _sse_event(chunk)
+        else:
+            if scanner is not None and scanner.finish():
+                yield _content_filter_event(held[-1] if held else {}, model)
+            else:
+                for waiting in held:
+                    yield _sse_event(waiting)
+    except Exception as e:
+        yield _sse_event({
+            "error": {
+                "message": f"Ollama error: {str(e)}",
+                "type": "server_error",
+                "code": "ollama_error"
+            }
+        })
     
-    # Apply patterns
-    for pattern, replacement in sanitization_patterns:
-        sanitized = re.sub(pattern, replacement, sanitized, flags=re.IGNORECASE)
+    yield b"data: [DONE]\n\n"
+
+
+async def stream_generate(prompt: str, model: str,
+                          checker: PromptChecker = prompt_checker,
+                          priority: int = INTERACTIVE) -> AsyncIterator[bytes]:
+    """
+    Relay Ollama generate results to the client as NDJSON.
     
-    # Clean up multiple spaces and normalize
-    sanitized = re.sub(r'\s+', ' ', sanitized).strip()
+    Applies the same STREAM_OUTPUT_FILTER cut-off and hold-back as
+    stream_chat_completion, ending the stream with a final ``done`` object.
+    """
+    scanner = checker.aho_corasick.scanner() if STREAM_OUTPUT_FILTER else None
+    held: List[Dict[str, Any]] = []
     
-    # Additional cleanup for common Indonesian sensitive terms
-    sensitive_terms = ['NIK', 'NIM', 'NISN', 'KTP', 'nik', 'nim', 'nisn', 'ktp']
-    for term in sensitive_terms:
-        sanitized = sanitized.replace(f'{term}:', 'ID:')
-        sanitized = sanitized.replace(f'{term} ', 'ID ')
-        
-    return sanitized
+    def content_filter(chunk: Dict[str, Any]) -> bytes:
+        return json.dumps({
+            "model": model,
+            "created_at": chunk.get("created_at"),
+            "response": "",
+            "done": True,
+            "done_reason": "content_filter"
+        }).encode('utf-8') + b"\n"
+    
+    try:
+        async for chunk in stream_ollama_generate(prompt, model, priority):
+            if scanner is not None:
+                if scanner.feed(chunk.get("response", "")):
+                    yield content_filter(chunk)
+                    return
+                if scanner.pending:
+                    held.append(chunk)
+                    continue
+            for waiting in held:
+                yield json.dumps(waiting).encode('utf-8') + b"\n"
+            held = []
+            yield json.dumps(chunk).encode('utf-8') + b"\n"
+        if scanner is not None and scanner.finish():
+            yield content_filter(held[-1] if held else {})
+            return
+        for waiting in held:
+            yield json.dumps(waiting).encode('utf-8') + b"\n"
+    except Exception as e:
+        yield json.dumps({
+            "model": model,
+            "error": f"Ollama error: {str(e)}",
+            "response": "",
+            "done": True
+        }).encode('utf-8') + b"\n"
+
+
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token estimation: ~4 characters per token"""
+    return max(1, len(text) // 4)
+
+@profiled("sanitize", lambda prompt, matches: len(prompt))
+def smart_sanitize_prompt(prompt: str, matches: List[Dict[str, Any]]) -> str:
+    """Smart sanitization that completely removes sensitive context"""
+    # All rules are precompiled in app/core/sanitizer.py and applied in one pass
+    with timed(sanitize_duration):
+        return default_sanitizer.sanitize(prompt).text
 
 def sanitize_prompt(prompt: str, matches: List[Dict[str, Any]]) -> str:
     """Legacy function - kept for backwards compatibility"""
     return smart_sanitize_prompt(prompt, matches)
 
 
+# Block /generate prompts whose keywords are obfuscated too
+NORMALIZED_BLOCKING = os.getenv('NORMALIZED_BLOCKING', 'false').lower() == 'true'
+
+
 @router.post("/generate")
-async def generate(request: GenerateRequest) -> Dict[str, Any]:
+async def generate(request: GenerateRequest,
+                   checker: PromptChecker = Depends(tenant_checker),
+                   priority_hint: Optional[str] = Header(None, alias=PRIORITY_HEADER)) -> Dict[str, Any]:
     """
     Ollama-compatible generate endpoint with security check.
+    
+    Safe prompts queue for an Ollama slot; a saturated queue is answered
+    with 429 or 503 and Retry-After.
     """
     try:
-        # Check prompt for sensitive content
-        check_result = check_prompt(request.prompt)
-        
-        if check_result['status'] == 'SENSITIVE':
+        # Check prompt for sensitive content; blocking only needs a yes/no
+        started = time.perf_counter()
+        sensitive = checker.is_sensitive(request.prompt, NORMALIZED_BLOCKING)
+        record_check("/generate", time.perf_counter() - started, len(request.prompt),
+                     int(sensitive))
+        if sensitive:
             # BLOCK COMPLETELY - Don't send to Ollama at all
             return {
                 "model": request.model,
@@ -296,9 +734,19 @@ async def generate(request: GenerateRequest) -> Dict[str, Any]:
                 "eval_count": 20,
                 "eval_duration": 50000
             }
+        priority = request_priority(len(request.prompt), priority_hint)
+        if request.stream:
+            upstream_scheduler.admit(request.model)
+            return StreamingResponse(
+                stream_generate(request.prompt, request.model, checker, priority),
+                media_type="application/x-ndjson"
+            )
         else:
             # If safe, send original prompt to Ollama
-            ollama_result = call_ollama_generate(request.prompt, request.model)
+            ollama_result = await cached_upstream(
+                lambda: call_ollama_generate(request.prompt, request.model, priority),
+                "generate", request.model, request.prompt
+            )
             
             response = {
                 "model": request.model,
@@ -309,19 +757,23 @@ async def generate(request: GenerateRequest) -> Dict[str, Any]:
         
         return response
         
+    except UpstreamBusyError:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error processing generate request: {str(e)}")
 
 
 @router.post("/chat/completions")
-async def chat_completions(request: ChatCompletionsRequest) -> Dict[str, Any]:
+async def chat_completions(request: ChatCompletionsRequest,
+                           checker: PromptChecker = Depends(tenant_checker),
+                           priority_hint: Optional[str] = Header(None, alias=PRIORITY_HEADER)) -> Dict[str, Any]:
     """
     OpenAI-compatible chat completions endpoint with security check.
+    
+    Queues for an Ollama slot like /generate.
     """
     try:
-        # Extract the latest user message
-        user_messages = [msg for msg in request.messages if msg.role == "user"]
-        if not user_messages:
+        if not any(msg.role == "user" for msg in request.messages):
             return {
                 "error": {
                     "message": "No user message found in request",
@@ -330,44 +782,44 @@ async def chat_completions(request: ChatCompletionsRequest) -> Dict[str, Any]:
                 }
             }
         
-        user_message = user_messages[-1].content
+        # Security check over the whole conversation in one pass; messages
+        # from earlier turns are served from the checker's result cache
+        contents = [msg.content for msg in request.messages]
+        started = time.perf_counter()
+        check_result = checker.check_conversation(contents)
+        record_check("/chat/completions", time.perf_counter() - started,
+                     sum(map(len, contents)), int(check_result["status"] == "SENSITIVE"))
         
-        # Security check
-        check_result = check_prompt(user_message)
+        # SMART FILTERING: sanitize user messages with matches or personal
+        # data and keep the rest (including system messages from Moodle) as
+        # they are. Detected personal data is redacted by position first,
+        # since the sanitizer rules miss grouped numbers
+        pii_by_message: Dict[int, List[Dict[str, Any]]] = {}
+        for finding in check_result.get("pii", ()):
+            pii_by_message.setdefault(finding["message"], []).append(finding)
+        messages_dict = []
+        for index, (msg, matches) in enumerate(zip(request.messages, check_result["messages"])):
+            content = msg.content
+            if msg.role == "user" and (matches or index in pii_by_message):
+                if index in pii_by_message:
+                    content = redact_findings(content, pii_by_message[index])
+                content = smart_sanitize_prompt(content, matches)
+            messages_dict.append({"role": msg.role, "content": content})
         
-        if check_result["status"] == "SENSITIVE":
-            # SMART FILTERING: Sanitize content and keep original context
-            sanitized_message = smart_sanitize_prompt(user_message, check_result["matches"])
-            
-            # Create modified messages - preserve original system messages but sanitize user content
-            modified_messages = []
-            
-            # Keep original system messages as they come from Moodle
-            for msg in request.messages:
-                if msg.role == "system":
-                    modified_messages.append({
-                        "role": msg.role,
-                        "content": msg.content
-                    })
-                elif msg.role == "user" and msg.content == user_message:
-                    # Replace with sanitized version
-                    modified_messages.append({
-                        "role": "user", 
-                        "content": sanitized_message
-                    })
-                else:
-                    modified_messages.append({
-                        "role": msg.role,
-                        "content": msg.content
-                    })
-                    
-            messages_dict = modified_messages
-        else:
-            # If safe, send original conversation
-            messages_dict = [{"role": msg.role, "content": msg.content} for msg in request.messages]
+        priority = request_priority(sum(map(len, contents)), priority_hint)
+        if request.stream:
+            upstream_scheduler.admit(request.model)
+            return StreamingResponse(
+                stream_chat_completion(messages_dict, request.model, checker, priority),
+                media_type="text/event-stream"
+            )
         
         # Call Ollama
-        ollama_result = call_ollama_v1_chat(messages_dict, request.model)
+        ollama_result = await cached_upstream(
+            lambda: call_ollama_v1_chat(messages_dict, request.model, priority),
+            "v1_chat", request.model, messages_dict,
+            {"temperature": request.temperature, "max_tokens": request.max_tokens}
+        )
         
         # Check if Ollama returned an error
         if "error" in ollama_result:
@@ -381,7 +833,9 @@ async def chat_completions(request: ChatCompletionsRequest) -> Dict[str, Any]:
         
         # Clean up response format
         completion_text = ollama_result["choices"][0]["message"]["content"]
-        prompt_text = " ".join([msg.content for msg in request.messages])
+        # Same estimate as estimate_tokens on the joined messages, without joining them
+        prompt_chars = sum(len(msg.content) for msg in request.messages) + len(request.messages) - 1
+        prompt_tokens = max(1, prompt_chars // 4)
         
         # Create clean OpenAI-compatible response
         clean_response = {
@@ -400,14 +854,16 @@ async def chat_completions(request: ChatCompletionsRequest) -> Dict[str, Any]:
                 }
             ],
             "usage": {
-                "prompt_tokens": estimate_tokens(prompt_text),
+                "prompt_tokens": prompt_tokens,
                 "completion_tokens": estimate_tokens(completion_text),
-                "total_tokens": estimate_tokens(prompt_text) + estimate_tokens(completion_text)
+                "total_tokens": prompt_tokens + estimate_tokens(completion_text)
             }
         }
         
         return clean_response
         
+    except UpstreamBusyError:
+        raise
     except Exception as e:
         return {
             "error": {
@@ -0,0 +1,68 @@
+"""
+Command line tools for SecurePrompt.
+
+Usage:
+    python -m app.cli check-ndjson [INPUT] [-o OUTPUT]
+"""
+import argparse
+import sys
+from typing import BinaryIO, List, Optional
+
+from .ndjson import check_ndjson_line, encode_record
+
+
+def check_ndjson(source: BinaryIO, destination: BinaryIO) -> int:
+    """
+    Check every prompt of an NDJSON stream, writing NDJSON results.
+    
+    Lines are read and written one at a time, so memory use stays constant
+    regardless of the input size.
+    
+    Args:
+        source: Binary input stream with one prompt per line
+        destination: Binary output stream for the results
+        
+    Returns:
+        Number of input lines reported as SENSITIVE
+    """
+    sensitive = 0
+    for line_number, line in enumerate(source, start=1):
+        record = check_ndjson_line(line, line_number)
+        if record is None:
+            continue
+        if record.get("status") == "SENSITIVE":
+            sensitive += 1
+        destination.write(encode_record(record))
+    destination.flush()
+    return sensitive
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """Entry point for ``python -m app.cli``."""
+    parser = argparse.ArgumentParser(prog="python -m app.cli", description="SecurePrompt tools")
+    commands = parser.add_subparsers(dest="command", required=True)
+    
+    ndjson_parser = commands.add_parser(
+        "check-ndjson", help="Check an NDJSON file of prompts and write NDJSON results"
+    )
+    ndjson_parser.add_argument("input", nargs="?", default="-", help="Input file (default: stdin)")
+    ndjson_parser.add_argument("-o", "--output", default="-", help="Output file (default: stdout)")
+    
+    args = parser.parse_args(argv)
+    
+    source = sys.stdin.buffer if args.input == "-" else open(args.input, "rb")
+    destination = sys.stdout.buffer if args.output == "-" else open(args.output, "wb")
+    try:
+        sensitive = check_ndjson(source, destination)
+    finally:
+        if source is not sys.stdin.buffer:
+            source.close()
+        if destination is not sys.stdout.buffer:
+            destination.close()
+    
+    print(f"{sensitive} sensitive prompt(s) found", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
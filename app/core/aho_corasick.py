@@ -1,101 +1,1028 @@
 """
 Manual implementation of Aho-Corasick algorithm for pattern matching.
 """
-from typing import List, Dict, Set, Tuple
+import codecs
+import hashlib
+import sys
+from array import array
+from functools import cached_property
+from typing import Callable, Iterator, List, Dict, Optional, Tuple, Sequence, Union
 from collections import deque
 
 
-class TrieNode:
-    """Node in the trie structure for Aho-Corasick algorithm."""
+# Boundary modes: where a pattern may occur relative to surrounding words.
+# A word boundary is any non-letter character or either end of the text,
+# so "NIK123" still matches a whole-word "nik" but "nikmat" does not.
+ANYWHERE = 0
+PREFIX = 1       # Must start a word
+WHOLE_WORD = 3   # Must start and end a word
+
+_LEFT_BOUNDARY = 1
+_RIGHT_BOUNDARY = 2
+
+# Class of characters a folding function drops (see search_folded)
+_SKIP_CLASS = -1
+
+# Match kinds for search()
+MATCH_ALL = "all"                            # Every occurrence, overlaps included
+MATCH_LEFTMOST_LONGEST = "leftmost-longest"  # Non-overlapping, longest at each start
+MATCH_LEFTMOST_FIRST = "leftmost-first"      # Non-overlapping, earliest listed at each start
+MATCH_KINDS = (MATCH_ALL, MATCH_LEFTMOST_LONGEST, MATCH_LEFTMOST_FIRST)
+
+# Characters from most to least frequent in English and Indonesian text;
+# the pre-filter anchors each pattern on its rarest part (see _Prefilter)
+_COMMON_CHARS = " aenitrsoulkdmghpcbyfwvjzxq"
+
+# Characters per anchor; longer anchors are rarer in text but cost the same
+# to search for
+_ANCHOR_LENGTH = 4
+
+# Above this many anchors, searching for each one costs more than the scan
+_PREFILTER_MAX_ANCHORS = 64
+
+
+def pattern_fingerprint(patterns: List[str], boundaries: Optional[Sequence[int]] = None) -> str:
+    """
+    Stable identifier of a keyword set.
+    
+    Two lists containing the same keywords (ignoring case, order and
+    duplicates) produce the same automaton output and the same fingerprint.
     
-    def __init__(self):
-        self.children: Dict[str, 'TrieNode'] = {}
-        self.failure_link: 'TrieNode' = None
-        self.output: Set[str] = set()  # Patterns that end at this node
-        self.is_end_of_word: bool = False
+    Args:
+        patterns: List of keywords
+        boundaries: Optional boundary mode of each keyword
+        
+    Returns:
+        Hex digest identifying the keyword set
+    """
+    # Duplicates keep the least restrictive mode, as in the automaton
+    modes: Dict[str, int] = {}
+    for index, pattern in enumerate(patterns):
+        if pattern:
+            mode = boundaries[index] if boundaries else ANYWHERE
+            key = pattern.lower()
+            modes[key] = modes.get(key, mode) & mode
+    
+    unique = sorted(
+        pattern if not mode else f"{pattern}\1{mode}" for pattern, mode in modes.items()
+    )
+    return hashlib.sha1("\0".join(unique).encode("utf-8")).hexdigest()
 
 
 class AhoCorasick:
-    """Aho-Corasick string matching algorithm implementation."""
+    """
+    Aho-Corasick string matching algorithm implementation.
+    
+    States are plain integers and every per-state attribute lives in a flat
+    ``array``. The trie and failure links are compiled into a dense
+    transition table (state x character class) so scanning costs one table
+    lookup per character and never walks failure links. Instead of copying
+    output sets along failure links, each state stores the ID of the pattern
+    ending there plus an output link to the next state on its failure chain
+    that also ends a pattern.
+    
+    Patterns can require word boundaries (see ``PREFIX`` and ``WHOLE_WORD``).
+    The characters around a candidate are checked as it is reported, so
+    matches inside longer words are never emitted.
     
-    def __init__(self, patterns: List[str]):
+    Patterns can be added and removed in place (``add``, ``remove``) or on a
+    copy (``updated``). An update only revisits the states whose failure
+    chain passes through the changed part of the trie; a pattern with a
+    character the automaton has never seen needs a new table column and
+    falls back to a full rebuild.
+    
+    Complete texts are first searched for a rare part of every pattern with
+    ``str.find``, which runs in C, so clean text skips the per-character
+    loop and other text is only scanned around the hits.
+    """
+    
+    def __init__(self, patterns: List[str], boundaries: Optional[Sequence[int]] = None):
         """
         Initialize the Aho-Corasick automaton with a list of patterns.
         
         Args:
             patterns: List of strings to search for
+            boundaries: Optional boundary mode of each pattern; every
+                pattern matches anywhere when not given
         """
-        self.root = TrieNode()
-        self.patterns = [pattern.lower() for pattern in patterns]  # Case insensitive
-        self._build_trie()
-        self._build_failure_links()
+        self._build(patterns, boundaries)
     
-    def _build_trie(self):
-        """Build the trie structure from patterns."""
+    def _build(self, patterns: Sequence[str], boundaries: Optional[Sequence[int]]):
+        """Compile the automaton from scratch."""
+        # Case insensitive; empty patterns would match everywhere
+        kept = [index for index, pattern in enumerate(patterns) if pattern]
+        self.patterns = [patterns[index].lower() for index in kept]
+        self._boundaries = array('b', [boundaries[index] if boundaries else ANYWHERE
+                                       for index in kept])
+        self._char_classes = self._build_char_classes()
+        self._width = len(set(self._char_classes.values())) + 1
+        edges, terminal, state_count = self._build_trie()
+        children, fail, order = self._build_failure_links(edges, state_count)
+        self._compile(children, terminal, fail, order)
+        self._trie_index: Optional[_TrieIndex] = None
+        self._clear_cached()
+    
+    def _build_char_classes(self) -> Dict[str, int]:
+        """
+        Map every pattern character to a compact alphabet class.
+        
+        Class 0 is reserved for characters that appear in no pattern. Upper
+        and title case variants share the class of their lowercase form, so
+        case folding happens in the lookup instead of copying the text.
+        """
+        classes: Dict[str, int] = {}
         for pattern in self.patterns:
-            current = self.root
             for char in pattern:
-                if char not in current.children:
-                    current.children[char] = TrieNode()
-                current = current.children[char]
-            current.is_end_of_word = True
-            current.output.add(pattern)
-    
-    def _build_failure_links(self):
-        """Build failure links using BFS."""
-        # Initialize failure links for depth 1 nodes
-        queue = deque()
-        for child in self.root.children.values():
-            child.failure_link = self.root
-            queue.append(child)
-        
-        # Build failure links for deeper nodes
+                if char not in classes:
+                    classes[char] = len(classes) + 1
+        
+        for char, class_id in list(classes.items()):
+            for variant in (char.upper(), char.title()):
+                if len(variant) == 1 and variant.lower() == char:
+                    classes.setdefault(variant, class_id)
+        return classes
+    
+    def _build_trie(self) -> Tuple[Dict[int, int], Dict[int, int], int]:
+        """
+        Build the trie structure from patterns.
+        
+        Returns:
+            Trie edges keyed by ``state * width + class``, the pattern ID
+            ending at each terminal state, and the number of states
+        """
+        width = self._width
+        classes = self._char_classes
+        edges: Dict[int, int] = {}
+        terminal: Dict[int, int] = {}
+        state_count = 1
+        
+        for pattern_id, pattern in enumerate(self.patterns):
+            state = 0
+            for char in pattern:
+                key = state * width + classes[char]
+                child = edges.get(key)
+                if child is None:
+                    child = state_count
+                    edges[key] = child
+                    state_count += 1
+                state = child
+            # Duplicate patterns share the first ID and its least
+            # restrictive boundary mode
+            first_id = terminal.setdefault(state, pattern_id)
+            self._boundaries[first_id] &= self._boundaries[pattern_id]
+        
+        return edges, terminal, state_count
+    
+    def _build_failure_links(self, edges: Dict[int, int], state_count: int
+                             ) -> Tuple[List[List[Tuple[int, int]]], array, List[int]]:
+        """
+        Build failure links using BFS.
+        
+        Returns:
+            ``(class, child)`` pairs per trie state, the failure link of each
+            state and the BFS order of the states
+        """
+        width = self._width
+        children: List[List[Tuple[int, int]]] = [[] for _ in range(state_count)]
+        for key, child in edges.items():
+            state, class_id = divmod(key, width)
+            children[state].append((class_id, child))
+        
+        fail = array('i', bytes(4 * state_count))
+        order = [0]
+        queue = deque([0])
         while queue:
             current = queue.popleft()
-            
-            for char, child in current.children.items():
+            for class_id, child in children[current]:
+                order.append(child)
                 queue.append(child)
+                if current == 0:
+                    continue
                 
                 # Find the failure link for this child
-                failure = current.failure_link
-                while failure != self.root and char not in failure.children:
-                    failure = failure.failure_link
+                failure = fail[current]
+                while failure and failure * width + class_id not in edges:
+                    failure = fail[failure]
+                fail[child] = edges.get(failure * width + class_id, 0)
+        
+        return children, fail, order
+    
+    def _compile(self, children: List[List[Tuple[int, int]]],
+                 terminal: Dict[int, int], fail: array, order: List[int]):
+        """
+        Compile the trie and failure links into a dense DFA.
+    
+        Transition entries are stored pre-multiplied by the row width so the
+        next row offset is read directly from the table. Entries leading to a
+        state that reports matches are stored bitwise inverted, so a single
+        sign test tells the scan loop whether to look for output; because
+        the flag lives in the entries rather than in the state numbering,
+        states can be added later without renumbering the table. The trie
+        depth of each state is kept for the leftmost match kinds and for
+        incremental updates.
+        """
+        width = self._width
+        state_count = len(order)
+        
+        # Output link: nearest state on the failure chain that ends a pattern
+        out_links = array('i', [-1]) * state_count
+        for state in order[1:]:
+            target = fail[state]
+            out_links[state] = target if target in terminal else out_links[target]
+        
+        pattern_ids = array('i', [-1]) * state_count
+        depths = array('i', bytes(4 * state_count))
+        for state in order:
+            pattern_ids[state] = terminal.get(state, -1)
+            for _, child in children[state]:
+                depths[child] = depths[state] + 1
+        
+        # Rows are filled in BFS order so a failure row is always ready; the
+        # root row starts out all zeros, i.e. pointing back at the root
+        delta = array('i', bytes(4 * width * state_count))
+        for state in order:
+            row = state * width
+            if state:
+                fail_row = fail[state] * width
+                delta[row:row + width] = delta[fail_row:fail_row + width]
+            for class_id, child in children[state]:
+                entry = child * width
+                if pattern_ids[child] >= 0 or out_links[child] >= 0:
+                    entry = ~entry
+                delta[row + class_id] = entry
+        
+        self._delta = delta
+        self._pattern_ids = pattern_ids
+        self._out_links = out_links
+        self._depths = depths
+        self._start = 0
+    
+    @classmethod
+    def from_tables(cls, patterns: List[str], char_classes: Dict[str, int],
+                    delta: Sequence[int], pattern_ids: Sequence[int],
+                    out_links: Sequence[int], start: int,
+                    boundaries: Optional[Sequence[int]] = None,
+                    depths: Optional[Sequence[int]] = None) -> 'AhoCorasick':
+        """
+        Rebuild an automaton from previously compiled tables.
+        
+        The tables may be any integer sequences supporting indexing, such as
+        ``array`` objects or memoryviews over a memory-mapped snapshot, and
+        are used as-is without copying.
+        
+        Args:
+            patterns: Lowercased patterns indexed by pattern ID
+            char_classes: Character to alphabet class mapping
+            delta: Transition table with pre-multiplied row offsets,
+                inverted for states with output
+            pattern_ids: Pattern ID ending at each state, or -1
+            out_links: Output link of each state, or -1
+            start: Row offset of the root state
+            boundaries: Boundary mode of each pattern ID; all ``ANYWHERE``
+                when not given
+            depths: Trie depth of each state; recomputed from the
+                transition table when not given
                 
-                if char in failure.children and failure.children[char] != child:
-                    child.failure_link = failure.children[char]
-                else:
-                    child.failure_link = self.root
+        Returns:
+            AhoCorasick instance backed by the given tables
+        """
+        automaton = cls.__new__(cls)
+        automaton.patterns = patterns
+        automaton._char_classes = char_classes
+        automaton._width = len(delta) // len(pattern_ids)
+        automaton._delta = delta
+        automaton._pattern_ids = pattern_ids
+        automaton._out_links = out_links
+        automaton._start = start
+        automaton._boundaries = (
+            boundaries if boundaries is not None else array('b', bytes(len(patterns)))
+        )
+        automaton._depths = depths if depths is not None else automaton._depths_from_delta()
+        automaton._trie_index = None
+        return automaton
+    
+    def _depths_from_delta(self) -> array:
+        """
+        Recover the trie depth of each state from the transition table.
+        
+        The trie path is the shortest way to reach a state from the root, so
+        a breadth-first walk over the transitions finds every depth. Slots
+        left free by removed patterns are unreachable and get depth -1.
+        """
+        width = self._width
+        delta = self._delta
+        depths = array('i', [-1]) * len(self._pattern_ids)
+        depths[self._start // width] = 0
+        queue = deque([self._start])
+        while queue:
+            row = queue.popleft()
+            depth = depths[row // width] + 1
+            for target in delta[row:row + width]:
+                if target < 0:
+                    target = ~target
+                if depths[target // width] < 0:
+                    depths[target // width] = depth
+                    queue.append(target)
+        return depths
+    
+    def _clear_cached(self):
+        """Drop cached properties derived from the patterns."""
+        for name in ("fingerprint", "max_pattern_length", "_has_boundaries", "_folded_classes",
+                     "_prefilter"):
+            self.__dict__.pop(name, None)
+    
+    @cached_property
+    def fingerprint(self) -> str:
+        """Fingerprint of the keyword set compiled into this automaton."""
+        return pattern_fingerprint(self.patterns, self._boundaries)
+    
+    @cached_property
+    def max_pattern_length(self) -> int:
+        """Length of the longest pattern."""
+        return max(map(len, self.patterns), default=0)
+    
+    @cached_property
+    def _folded_classes(self) -> Dict[Callable[[str], str], '_FoldedClasses']:
+        """Class maps built by search_folded, keyed by folding function."""
+        return {}
+    
+    @cached_property
+    def _has_boundaries(self) -> bool:
+        """Whether any pattern requires a word boundary."""
+        return any(self._boundaries)
+    
+    @cached_property
+    def _prefilter(self) -> Optional['_Prefilter']:
+        """Anchor search for complete texts, or None when it would not pay off."""
+        return _Prefilter.build(self.patterns)
+    
+    def _candidate_windows(self, text: str) -> List[Tuple[int, int]]:
+        """Disjoint (start, end) windows of a text holding every match."""
+        prefilter = self._prefilter
+        windows = prefilter.windows(text) if prefilter is not None else None
+        return [(0, len(text))] if windows is None else windows
+    
+    @property
+    def state_count(self) -> int:
+        """Number of states in the compiled automaton."""
+        return len(self._pattern_ids)
+    
+    def memory_usage(self) -> Dict[str, int]:
+        """
+        Report the approximate memory held by the automaton, in bytes.
+        
+        Returns:
+            Dictionary with the size of each table and their total
+        """
+        report = {
+            "transitions": memoryview(self._delta).nbytes,
+            "pattern_ids": memoryview(self._pattern_ids).nbytes,
+            "output_links": memoryview(self._out_links).nbytes,
+            "depths": memoryview(self._depths).nbytes,
+            "boundaries": memoryview(self._boundaries).nbytes,
+            "char_classes": sys.getsizeof(self._char_classes),
+            "patterns": sys.getsizeof(self.patterns) + sum(
+                sys.getsizeof(pattern) for pattern in self.patterns
+            ),
+        }
+        report["total"] = sum(report.values())
+        return report
+    
+    def add(self, pattern: str, boundary: int = ANYWHERE) -> None:
+        """
+        Add a pattern in place, without rebuilding the automaton.
+        
+        Only the new trie states and the states whose failure chain passes
+        through them are visited. Adding an existing pattern keeps the least
+        restrictive of the two boundary modes.
+        
+        Args:
+            pattern: Pattern to add
+            boundary: Boundary mode of the pattern
+        """
+        pattern = pattern.lower()
+        if not pattern:
+            return
+        if any(char not in self._char_classes for char in pattern):
+            # A new character needs a new table column
+            self._build(*self._live_patterns([(pattern, boundary)]))
+            return
+        
+        index = self._update_index()
+        classes = self._char_classes
+        pattern_ids = self._pattern_ids
+        out_links = self._out_links
+        
+        state = 0
+        created = []
+        for char in pattern:
+            class_id = classes[char]
+            child = index.children[state].get(class_id)
+            if child is None:
+                child = self._new_state(index, state, class_id)
+                created.append(child)
+            state = child
+        
+        # Shallower states first, so every failure target is already linked
+        for new_state in created:
+            self._link_state(index, new_state)
+        
+        changed = []
+        pattern_id = pattern_ids[state]
+        if pattern_id >= 0:
+            self._boundaries[pattern_id] &= boundary
+        else:
+            # New IDs go last, so earlier patterns keep leftmost-first priority
+            pattern_id = len(self.patterns)
+            self.patterns.append(pattern)
+            self._boundaries.append(boundary)
+            if out_links[state] < 0:
+                changed.append(state)
+            pattern_ids[state] = pattern_id
+            changed.extend(self._refresh_out_links(index, state))
+        
+        for target in created:
+            self._point_entries(index, index.parent[target], index.parent_class[target], target)
+        for target in changed:
+            if target not in created:
+                self._point_entries(index, index.parent[target], index.parent_class[target], target)
+        self._clear_cached()
+    
+    def remove(self, pattern: str) -> bool:
+        """
+        Remove a pattern in place, without rebuilding the automaton.
+        
+        States that no longer lead to any pattern are unlinked and their
+        table rows reused by later additions.
+        
+        Args:
+            pattern: Pattern to remove
+            
+        Returns:
+            True if the pattern was present
+        """
+        pattern = pattern.lower()
+        classes = self._char_classes
+        if not pattern or any(char not in classes for char in pattern):
+            return False
+        
+        index = self._update_index()
+        pattern_ids = self._pattern_ids
+        state = 0
+        for char in pattern:
+            state = index.children[state].get(classes[char])
+            if state is None:
+                return False
+        pattern_id = pattern_ids[state]
+        if pattern_id < 0:
+            return False
+        
+        self.patterns[pattern_id] = ""
+        self._boundaries[pattern_id] = ANYWHERE
+        pattern_ids[state] = -1
+        changed = self._refresh_out_links(index, state)
+        if self._out_links[state] < 0:
+            changed.append(state)
+        
+        # Unlink states left without patterns, deepest first
+        removed = set()
+        while state and not index.children[state] and pattern_ids[state] < 0:
+            parent = index.parent[state]
+            class_id = index.parent_class[state]
+            self._unlink_state(index, state)
+            self._point_entries(index, parent, class_id, index.fail[state])
+            removed.add(state)
+            state = parent
+        
+        for target in changed:
+            if target not in removed:
+                self._point_entries(index, index.parent[target], index.parent_class[target], target)
+        self._clear_cached()
+        return True
+    
+    def updated(self, add: Sequence[str] = (), remove: Sequence[str] = (),
+                boundaries: Optional[Sequence[int]] = None) -> 'AhoCorasick':
+        """
+        Return a copy with patterns removed and added.
+        
+        This automaton is left untouched, so scans in flight can keep using
+        it. The tables are copied with one memory copy each; the trie index
+        used for updates moves to the copy instead of being rebuilt.
+        
+        Args:
+            add: Patterns to add
+            remove: Patterns to remove
+            boundaries: Optional boundary mode of each added pattern
+            
+        Returns:
+            Updated automaton
+        """
+        modes = list(boundaries) if boundaries else [ANYWHERE] * len(add)
+        copy = AhoCorasick.__new__(AhoCorasick)
+        if any(char not in self._char_classes for pattern in add for char in pattern.lower()):
+            removed = {pattern.lower() for pattern in remove}
+            patterns, kept_modes = self._live_patterns(list(zip(add, modes)), removed)
+            copy._build(patterns, kept_modes)
+            return copy
+        
+        index = self._update_index()
+        self._trie_index = None
+        copy.patterns = list(self.patterns)
+        copy._char_classes = self._char_classes
+        copy._width = self._width
+        copy._delta = self._delta[:]
+        copy._pattern_ids = self._pattern_ids[:]
+        copy._out_links = self._out_links[:]
+        copy._depths = self._depths[:]
+        copy._boundaries = self._boundaries[:]
+        copy._start = self._start
+        copy._trie_index = index
+        
+        for pattern in remove:
+            copy.remove(pattern)
+        for pattern, mode in zip(add, modes):
+            copy.add(pattern, mode)
+        return copy
+    
+    def _live_patterns(self, extra: Sequence[Tuple[str, int]] = (),
+                       removed: Sequence[str] = ()) -> Tuple[List[str], List[int]]:
+        """Current patterns and modes plus extra ones, for a full rebuild."""
+        patterns = []
+        modes = []
+        for pattern_id, pattern in enumerate(self.patterns):
+            if pattern and pattern not in removed:
+                patterns.append(pattern)
+                modes.append(self._boundaries[pattern_id])
+        for pattern, mode in extra:
+            patterns.append(pattern)
+            modes.append(mode)
+        return patterns, modes
+    
+    def _update_index(self) -> '_TrieIndex':
+        """Return the trie index, building it from the tables on first use."""
+        if self._trie_index is None:
+            # Mapped snapshot tables are read-only; copy them into arrays
+            for name in ("_delta", "_pattern_ids", "_out_links", "_depths"):
+                table = getattr(self, name)
+                if not isinstance(table, array):
+                    setattr(self, name, array('i', table.tobytes()))
+            if not isinstance(self._boundaries, array) or self._boundaries.typecode != 'b':
+                self._boundaries = array('b', self._boundaries)
+            self.patterns = list(self.patterns)
+            self._trie_index = _TrieIndex(self)
+        return self._trie_index
+    
+    def _encode(self, state: int) -> int:
+        """Transition table entry leading to a state."""
+        entry = state * self._width
+        if self._pattern_ids[state] >= 0 or self._out_links[state] >= 0:
+            return ~entry
+        return entry
+    
+    def _new_state(self, index: '_TrieIndex', parent: int, class_id: int) -> int:
+        """Allocate a trie state below parent, reusing a free slot if any."""
+        if index.free_states:
+            state = index.free_states.pop()
+        else:
+            state = len(self._pattern_ids)
+            self._delta.extend(array('i', bytes(4 * self._width)))
+            self._pattern_ids.append(-1)
+            self._out_links.append(-1)
+            self._depths.append(0)
+            index.children.append({})
+            index.parent.append(0)
+            index.parent_class.append(0)
+            index.fail.append(0)
+        
+        self._pattern_ids[state] = -1
+        self._out_links[state] = -1
+        self._depths[state] = self._depths[parent] + 1
+        index.children[state] = {}
+        index.parent[state] = parent
+        index.parent_class[state] = class_id
+        index.children[parent][class_id] = state
+        return state
+    
+    def _link_state(self, index: '_TrieIndex', state: int):
+        """
+        Set the failure link, output link and table row of a new state.
+        
+        Existing states whose longest proper suffix in the trie is now the
+        new state are moved below it in the failure tree.
+        """
+        width = self._width
+        parent = index.parent[state]
+        class_id = index.parent_class[state]
+        
+        target = 0
+        if parent:
+            failure = index.fail[parent]
+            while True:
+                child = index.children[failure].get(class_id)
+                if child is not None:
+                    target = child
+                    break
+                if not failure:
+                    break
+                failure = index.fail[failure]
+        
+        index.fail[state] = target
+        index.fail_children.setdefault(target, set()).add(state)
+        self._out_links[state] = (
+            target if self._pattern_ids[target] >= 0 else self._out_links[target]
+        )
+        row = state * width
+        self._delta[row:row + width] = self._delta[target * width:target * width + width]
+        
+        # States below the parent in the failure tree whose own child on
+        # class_id used to fail further up now fail to the new state; their
+        # failure subtrees keep their own links
+        stack = [node for node in index.fail_children.get(parent, ()) if node != state]
+        while stack:
+            node = stack.pop()
+            child = index.children[node].get(class_id)
+            if child is None:
+                stack.extend(index.fail_children.get(node, ()))
+                continue
+            index.fail_children[index.fail[child]].discard(child)
+            index.fail[child] = state
+            index.fail_children.setdefault(state, set()).add(child)
+    
+    def _unlink_state(self, index: '_TrieIndex', state: int):
+        """Detach a childless state without output and free its slot."""
+        target = index.fail[state]
+        index.fail_children[target].discard(state)
+        moved = index.fail_children.pop(state, None)
+        if moved:
+            for node in moved:
+                index.fail[node] = target
+            index.fail_children[target].update(moved)
+        
+        del index.children[index.parent[state]][index.parent_class[state]]
+        self._pattern_ids[state] = -1
+        self._out_links[state] = -1
+        self._depths[state] = -1
+        index.free_states.append(state)
+    
+    def _refresh_out_links(self, index: '_TrieIndex', state: int) -> List[int]:
+        """
+        Recompute output links below a state in the failure tree.
+        
+        Returns:
+            States that started or stopped reporting output
+        """
+        pattern_ids = self._pattern_ids
+        out_links = self._out_links
+        changed = []
+        stack = list(index.fail_children.get(state, ()))
+        while stack:
+            node = stack.pop()
+            had_output = pattern_ids[node] >= 0 or out_links[node] >= 0
+            target = index.fail[node]
+            out_links[node] = target if pattern_ids[target] >= 0 else out_links[target]
+            if had_output != (pattern_ids[node] >= 0 or out_links[node] >= 0):
+                changed.append(node)
+            stack.extend(index.fail_children.get(node, ()))
+        return changed
+    
+    def _point_entries(self, index: '_TrieIndex', parent: int, class_id: int, target: int):
+        """
+        Point every transition on class_id that should lead to target at it.
+        
+        These are the parent's own entry plus the entries of states below
+        the parent in the failure tree, except where a state has its own
+        child on class_id (its whole failure subtree then keeps using it).
+        """
+        width = self._width
+        delta = self._delta
+        entry = self._encode(target)
+        delta[parent * width + class_id] = entry
+        stack = list(index.fail_children.get(parent, ()))
+        while stack:
+            node = stack.pop()
+            if class_id in index.children[node]:
+                continue
+            delta[node * width + class_id] = entry
+            stack.extend(index.fail_children.get(node, ()))
+    
+    def search(self, text: str, match_kind: str = MATCH_ALL) -> List[Tuple[str, int]]:
+        """
+        Search for pattern occurrences in the text.
+        
+        Args:
+            text: Text to search in
+            match_kind: MATCH_ALL for every occurrence, or one of the
+                leftmost kinds for non-overlapping matches
                 
-                # Copy output from failure link
-                child.output.update(child.failure_link.output)
+        Returns:
+            List of tuples (pattern, position) in order of position
+        """
+        if match_kind == MATCH_ALL:
+            matches = []
+            for low, high in self._candidate_windows(text):
+                # Windows include the characters around their matches, so
+                # boundaries are checked as in a scan of the whole text
+                matches.extend(self._scan(text[low:high], self._start, low)[0])
+            return matches
+        if match_kind == MATCH_LEFTMOST_LONGEST:
+            return self._scan_leftmost(text, longest=True)
+        if match_kind == MATCH_LEFTMOST_FIRST:
+            return self._scan_leftmost(text, longest=False)
+        raise ValueError(f"Unknown match kind: {match_kind!r}")
     
-    def search(self, text: str) -> List[Tuple[str, int]]:
+    def count(self, text: str) -> Dict[str, int]:
         """
-        Search for all pattern occurrences in the text.
+        Count the occurrences of each pattern without listing them.
         
         Args:
             text: Text to search in
             
         Returns:
-            List of tuples (pattern, position) for all matches
+            Number of (possibly overlapping) occurrences per found pattern
         """
-        matches = []
-        text = text.lower()  # Case insensitive search
-        current = self.root
+        counts: Dict[str, int] = {}
+        patterns = self.patterns
+        for pattern_id, _ in self._iter_matches(text):
+            pattern = patterns[pattern_id]
+            counts[pattern] = counts.get(pattern, 0) + 1
+        return counts
+    
+    def search_folded(self, text: str, fold: Callable[[str], str]) -> List[Tuple[str, int, int]]:
+        """
+        Search the text as seen through a per-character folding function.
+        
+        Each character is replaced by its fold on the fly: an empty fold
+        drops the character, so patterns match across it. Folds are looked
+        up once per distinct character and kept in a class map, so the text
+        is never copied. Patterns are expected to be folded already.
+        
+        Args:
+            text: Text to search in
+            fold: Maps a character to its folded form, at most one
+                character; longer folds never match
+                
+        Returns:
+            List of tuples (pattern, start, end) in order of end, with
+            offsets in the original text
+        """
+        return [
+            (self.patterns[pattern_id], start, end)
+            for pattern_id, start, end in self._iter_folded(text, self._fold_map(fold))
+        ]
+    
+    def has_folded_matches(self, text: str, fold: Callable[[str], str]) -> bool:
+        """
+        Quick check if the folded text contains any pattern.
+        
+        Args:
+            text: Text to check
+            fold: Folding function, as for search_folded
+            
+        Returns:
+            True if any pattern is found, False otherwise
+        """
+        for _ in self._iter_folded(text, self._fold_map(fold)):
+            return True
+        return False
+    
+    def _fold_map(self, fold: Callable[[str], str]) -> '_FoldedClasses':
+        """Class map of a folding function, shared by every scan using it."""
+        classes = self._folded_classes.get(fold)
+        if classes is None:
+            classes = self._folded_classes.setdefault(fold, _FoldedClasses(self._char_classes, fold))
+        return classes
+    
+    def _iter_folded(self, text: str, classes: '_FoldedClasses') -> Iterator[Tuple[int, int, int]]:
+        """
+        Lazily yield every match in a text scanned through a folded class map.
+        
+        Dropped characters do not advance the automaton, so the start of a
+        match is read from a ring of the positions of the last consumed
+        characters instead of being computed from the pattern length.
+        
+        Yields:
+            (pattern ID, start, end) triples with offsets in the text
+        """
+        delta = self._delta
+        patterns = self.patterns
+        pattern_ids = self._pattern_ids
+        out_links = self._out_links
+        boundaries = self._boundaries
+        at_boundaries = self._at_boundaries
+        width = self._width
+        state = self._start
+        size = max(self.max_pattern_length, 1)
+        positions = [0] * size
+        consumed = 0
         
         for i, char in enumerate(text):
-            # Follow failure links until we find a valid transition or reach root
-            while current != self.root and char not in current.children:
-                current = current.failure_link
+            class_id = classes[char]
+            if class_id < 0:
+                continue
+            positions[consumed % size] = i
+            consumed += 1
+            state = delta[state + class_id]
+            if state < 0:
+                state = ~state
+                output = state // width
+                if pattern_ids[output] < 0:
+                    output = out_links[output]
+                while output >= 0:
+                    pattern_id = pattern_ids[output]
+                    output = out_links[output]
+                    start = positions[(consumed - len(patterns[pattern_id])) % size]
+                    mode = boundaries[pattern_id]
+                    if not mode or at_boundaries(text, start, i + 1, mode):
+                        yield pattern_id, start, i + 1
+    
+    def scanner(self) -> 'StreamScanner':
+        """
+        Create a resumable scanner for text that arrives in chunks.
+        
+        Returns:
+            StreamScanner positioned at the start of the stream
+        """
+        return StreamScanner(self)
+    
+    def _scan(self, text: str, state: int, offset: int, before: str = "",
+              final: bool = True) -> Tuple[List[Tuple[str, int]], int, List[Tuple[str, int]]]:
+        """
+        Run the automaton over text starting from a given state.
+        
+        Args:
+            text: Text to scan
+            state: Row offset of the state to resume from
+            offset: Absolute position of the first character of text
+            before: Text preceding this text, at least as long as the
+                longest pattern when available, for left boundaries
+            final: Whether the text ends at the end of the stream
             
-            # Move to next state if possible
-            if char in current.children:
-                current = current.children[char]
+        Returns:
+            Matches with absolute positions, the state after the text, and
+            matches ending on the last character whose right boundary
+            depends on the next chunk (always empty when final)
+        """
+        matches = []
+        deferred = []
+        delta = self._delta
+        classes = self._char_classes.get
+        patterns = self.patterns
+        pattern_ids = self._pattern_ids
+        out_links = self._out_links
+        boundaries = self._boundaries
+        width = self._width
+        end = len(text)
+        
+        for i, char in enumerate(text, offset):
+            state = delta[state + classes(char, 0)]
+            if state < 0:
+                state = ~state
+                # Longest pattern first, then shorter suffixes
+                output = state // width
+                if pattern_ids[output] < 0:
+                    output = out_links[output]
+                while output >= 0:
+                    pattern_id = pattern_ids[output]
+                    output = out_links[output]
+                    pattern = patterns[pattern_id]
+                    start = i - len(pattern) + 1
+                    mode = boundaries[pattern_id]
+                    if mode:
+                        if mode & _LEFT_BOUNDARY:
+                            j = start - offset - 1
+                            if j >= 0:
+                                if text[j].isalpha():
+                                    continue
+                            elif -j <= len(before) and before[j].isalpha():
+                                continue
+                        if mode & _RIGHT_BOUNDARY:
+                            j = i - offset + 1
+                            if j < end:
+                                if text[j].isalpha():
+                                    continue
+                            elif not final:
+                                deferred.append((pattern, start))
+                                continue
+                    matches.append((pattern, start))
+        
+        return matches, state, deferred
+    
+    @staticmethod
+    def _at_boundaries(text: str, start: int, end: int, mode: int) -> bool:
+        """Check the boundary mode of a match spanning text[start:end]."""
+        if mode & _LEFT_BOUNDARY and start > 0 and text[start - 1].isalpha():
+            return False
+        if mode & _RIGHT_BOUNDARY and end < len(text) and text[end].isalpha():
+            return False
+        return True
+    
+    def _iter_matches(self, text: str) -> Iterator[Tuple[int, int]]:
+        """
+        Lazily yield every match in a complete text.
+        
+        Args:
+            text: Text to scan
             
-            # Check for pattern matches at current position
-            for pattern in current.output:
-                start_pos = i - len(pattern) + 1
-                matches.append((pattern, start_pos))
+        Yields:
+            (pattern ID, position) pairs, so callers that stop early or only
+            count matches never build a list
+        """
+        delta = self._delta
+        classes = self._char_classes.get
+        patterns = self.patterns
+        pattern_ids = self._pattern_ids
+        out_links = self._out_links
+        boundaries = self._boundaries
+        at_boundaries = self._at_boundaries
+        width = self._width
+        
+        for low, high in self._candidate_windows(text):
+            state = self._start
+            for i, char in enumerate(text[low:high], low):
+                state = delta[state + classes(char, 0)]
+                if state < 0:
+                    state = ~state
+                    output = state // width
+                    if pattern_ids[output] < 0:
+                        output = out_links[output]
+                    while output >= 0:
+                        pattern_id = pattern_ids[output]
+                        output = out_links[output]
+                        start = i - len(patterns[pattern_id]) + 1
+                        mode = boundaries[pattern_id]
+                        if not mode or at_boundaries(text, start, i + 1, mode):
+                            yield pattern_id, start
+    
+    def _scan_leftmost(self, text: str, longest: bool) -> List[Tuple[str, int]]:
+        """
+        Find non-overlapping matches, preferring the leftmost start.
+        
+        The best candidate so far is committed as soon as the depth of the
+        current state shows that no match starting at or before it can still
+        end later; scanning then restarts from the root right after it.
+        
+        Args:
+            text: Text to scan
+            longest: Prefer the longest pattern at a start position instead
+                of the one listed first
+                
+        Returns:
+            List of tuples (pattern, position) in order of position
+        """
+        matches = []
+        delta = self._delta
+        classes = self._char_classes.get
+        patterns = self.patterns
+        pattern_ids = self._pattern_ids
+        out_links = self._out_links
+        boundaries = self._boundaries
+        depths = self._depths
+        at_boundaries = self._at_boundaries
+        width = self._width
+        root = self._start
+        
+        # No match spans two windows, so each window is resolved on its own
+        for i, end in self._candidate_windows(text):
+            state = root
+            best_id = -1
+            best_start = 0
+            while i < end or best_id >= 0:
+                has_output = False
+                if i < end:
+                    state = delta[state + classes(text[i], 0)]
+                    if state < 0:
+                        state = ~state
+                        has_output = True
+                    commit = best_id >= 0 and i - depths[state // width] >= best_start
+                else:
+                    commit = True
+                
+                if commit:
+                    pattern = patterns[best_id]
+                    matches.append((pattern, best_start))
+                    i = best_start + len(pattern)
+                    state = root
+                    best_id = -1
+                    continue
+                
+                if has_output:
+                    output = state // width
+                    if pattern_ids[output] < 0:
+                        output = out_links[output]
+                    while output >= 0:
+                        pattern_id = pattern_ids[output]
+                        output = out_links[output]
+                        length = len(patterns[pattern_id])
+                        start = i - length + 1
+                        mode = boundaries[pattern_id]
+                        if mode and not at_boundaries(text, start, i + 1, mode):
+                            continue
+                        if (best_id < 0 or start < best_start or (start == best_start and (
+                                length > len(patterns[best_id]) if longest
+                                else pattern_id < best_id))):
+                            best_id = pattern_id
+                            best_start = start
+                i += 1
         
         return matches
     
@@ -109,17 +1036,289 @@ class AhoCorasick:
         Returns:
             True if any pattern is found, False otherwise
         """
-        text = text.lower()
-        current = self.root
+        if self._has_boundaries:
+            # A reachable output state may still fail its boundary check
+            for _ in self._iter_matches(text):
+                return True
+            return False
+        
+        delta = self._delta
+        classes = self._char_classes.get
+        
+        for low, high in self._candidate_windows(text):
+            state = self._start
+            for char in text[low:high]:
+                state = delta[state + classes(char, 0)]
+                if state < 0:
+                    return True
+        
+        return False
+
+
+class _Prefilter:
+    """
+    Rare substrings that every pattern occurrence contains.
+    
+    Each pattern is anchored on its rarest run of ``_ANCHOR_LENGTH``
+    characters by ``_COMMON_CHARS`` rank. The casefolded text is searched for the anchors
+    with ``str.find``, and only windows around the hits can hold a match.
+    """
+    
+    def __init__(self, anchors: Sequence[str], radius: int):
+        """
+        Initialize the pre-filter.
         
-        for char in text:
-            while current != self.root and char not in current.children:
-                current = current.failure_link
+        Args:
+            anchors: Casefolded anchors, none containing another
+            radius: Length of the longest pattern
+        """
+        self.anchors = tuple(anchors)
+        self.radius = radius
+        # Each search costs about as much as scanning a character or two,
+        # so shorter texts are scanned right away
+        self.min_length = 2 * len(self.anchors)
+    
+    @classmethod
+    def build(cls, patterns: Sequence[str]) -> Optional['_Prefilter']:
+        """
+        Pick the anchors of a pattern list.
+        
+        Args:
+            patterns: Lowercased patterns; empty ones are ignored
             
-            if char in current.children:
-                current = current.children[char]
+        Returns:
+            Pre-filter, or None when there are no patterns or too many
+            anchors for the search to beat a scan
+        """
+        rarity = {char: rank for rank, char in enumerate(_COMMON_CHARS)}
+        rare = len(_COMMON_CHARS)
+        anchors = set()
+        for pattern in filter(None, patterns):
+            size = min(len(pattern), _ANCHOR_LENGTH)
+            slices = [pattern[i:i + size] for i in range(len(pattern) - size + 1)]
+            anchor = max(slices, key=lambda part: sum(rarity.get(char, rare) for char in part))
+            anchors.add(anchor.casefold())
+            if len(anchors) > _PREFILTER_MAX_ANCHORS:
+                return None
+        if not anchors:
+            return None
+        
+        # Hits of an anchor containing a shorter one are hits of that one too
+        kept = [anchor for anchor in anchors
+                if not any(other != anchor and other in anchor for other in anchors)]
+        return cls(sorted(kept), max(map(len, patterns)))
+    
+    def windows(self, text: str) -> Optional[List[Tuple[int, int]]]:
+        """
+        Find the parts of a text that can hold a match.
+        
+        A match contains the anchor of its pattern, so it lies within one
+        pattern length of an anchor hit; windows reach one character
+        further on both sides for the boundary checks.
+        
+        Args:
+            text: Text to filter
             
-            if current.output:
-                return True
+        Returns:
+            Sorted, disjoint (start, end) windows, empty for clean text, or
+            None when the text is short or the hits are so dense that the
+            whole text is scanned
+        """
+        if len(text) < self.min_length:
+            return None
+        folded = text.casefold()
+        if len(folded) != len(text):
+            # Offsets would not line up ("ß" folds to "ss")
+            return None
+        radius = self.radius
+        limit = len(text) // (2 * radius)
+        find = folded.find
+        hits = []
+        for anchor in self.anchors:
+            position = find(anchor)
+            while position >= 0:
+                hits.append(position)
+                if len(hits) > limit:
+                    return None
+                position = find(anchor, position + 1)
+        if not hits:
+            return []
+        
+        hits.sort()
+        windows = []
+        low = hits[0] - radius
+        high = hits[0] + radius + 1
+        for position in hits:
+            if position - radius > high:
+                windows.append((max(low, 0), high))
+                low = position - radius
+            high = position + radius + 1
+        windows.append((max(low, 0), min(high, len(text))))
+        return windows
+
+
+class _FoldedClasses(dict):
+    """
+    Character classes of an automaton seen through a folding function.
+    
+    Filled on first sight of each character: the class of its fold, or
+    ``_SKIP_CLASS`` when the fold is empty.
+    """
+    
+    def __init__(self, classes: Dict[str, int], fold: Callable[[str], str]):
+        """
+        Initialize an empty map.
+        
+        Args:
+            classes: Class of each pattern character
+            fold: Folding function applied to text characters
+        """
+        super().__init__()
+        self._classes = classes
+        self._fold = fold
+    
+    def __missing__(self, char: str) -> int:
+        """Fold a character seen for the first time and remember its class."""
+        folded = self._fold(char)
+        if not folded:
+            class_id = _SKIP_CLASS
+        else:
+            class_id = self._classes.get(folded, 0) if len(folded) == 1 else 0
+        self[char] = class_id
+        return class_id
+
+
+class _TrieIndex:
+    """
+    Trie edges and failure tree of an automaton, kept for in-place updates.
+    
+    Recovered from the compiled tables: an entry is a trie edge exactly when
+    it leads one level deeper, and a state's failure link is the entry of
+    its parent's failure state on the same class.
+    """
+    
+    def __init__(self, automaton: AhoCorasick):
+        """
+        Build the index from an automaton's tables.
+        
+        Args:
+            automaton: Automaton with array tables
+        """
+        width = automaton._width
+        delta = automaton._delta
+        depths = automaton._depths
+        state_count = len(automaton._pattern_ids)
+        
+        self.children: List[Dict[int, int]] = [{} for _ in range(state_count)]
+        self.parent = array('i', bytes(4 * state_count))
+        self.parent_class = array('i', bytes(4 * state_count))
+        self.fail = array('i', bytes(4 * state_count))
+        self.fail_children: Dict[int, set] = {}
+        
+        root = automaton._start // width
+        queue = deque([root])
+        while queue:
+            state = queue.popleft()
+            row = state * width
+            depth = depths[state] + 1
+            for class_id, target in enumerate(delta[row:row + width]):
+                if target < 0:
+                    target = ~target
+                child = target // width
+                if depths[child] != depth:
+                    continue
+                self.children[state][class_id] = child
+                self.parent[child] = state
+                self.parent_class[child] = class_id
+                failure = 0
+                if state != root:
+                    failure = delta[self.fail[state] * width + class_id]
+                    failure = (~failure if failure < 0 else failure) // width
+                self.fail[child] = failure
+                self.fail_children.setdefault(failure, set()).add(child)
+                queue.append(child)
+        
+        self.free_states = [state for state in range(state_count) if depths[state] < 0]
         
-        return False
\ No newline at end of file
+        # Duplicates are never reported; blank them so removing the pattern
+        # removes every copy
+        used = set(automaton._pattern_ids)
+        for pattern_id in range(len(automaton.patterns)):
+            if pattern_id not in used:
+                automaton.patterns[pattern_id] = ""
+
+
+class StreamScanner:
+    """
+    Resumable Aho-Corasick scan over text delivered in chunks.
+    
+    The automaton state is carried across ``feed`` calls, so keywords split
+    between two chunks are still found, and every match position is an
+    absolute character offset from the start of the stream. Chunks may be
+    ``bytes``; they are decoded incrementally as UTF-8, so multi-byte
+    characters split across chunks are handled too. Whole-word matches
+    ending on the last character of a chunk are reported with the next
+    chunk, once the character after them is known.
+    """
+    
+    def __init__(self, automaton: AhoCorasick):
+        """
+        Initialize the scanner at the start of a stream.
+        
+        Args:
+            automaton: Compiled automaton to scan with
+        """
+        self._automaton = automaton
+        self._state = automaton._start
+        self._decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        self._tail = ""  # End of the text so far, for left boundaries
+        self._deferred: List[Tuple[str, int]] = []
+        self.offset = 0  # Characters consumed so far
+    
+    def feed(self, chunk: Union[str, bytes]) -> List[Tuple[str, int]]:
+        """
+        Scan the next chunk of the stream.
+        
+        Args:
+            chunk: Next piece of text, or UTF-8 bytes
+            
+        Returns:
+            Matches ending inside this chunk, as (pattern, absolute position)
+        """
+        if isinstance(chunk, (bytes, bytearray, memoryview)):
+            chunk = self._decoder.decode(chunk)
+        return self._feed_text(chunk, final=False)
+    
+    def _feed_text(self, chunk: str, final: bool) -> List[Tuple[str, int]]:
+        """Scan decoded text, settling matches deferred by the last chunk."""
+        ready = []
+        if self._deferred and (chunk or final):
+            if final or not chunk[0].isalpha():
+                ready = self._deferred
+            self._deferred = []
+        
+        automaton = self._automaton
+        matches, self._state, deferred = automaton._scan(
+            chunk, self._state, self.offset, self._tail, final
+        )
+        self._deferred.extend(deferred)
+        self.offset += len(chunk)
+        if automaton._has_boundaries:
+            keep = automaton.max_pattern_length
+            self._tail = (self._tail + chunk[-keep:])[-keep:]
+        
+        return ready + matches if ready else matches
+    
+    @property
+    def pending(self) -> bool:
+        """Whether a match ending the text so far awaits the next chunk."""
+        return bool(self._deferred)
+    
+    def finish(self) -> List[Tuple[str, int]]:
+        """
+        Flush any buffered input at the end of the stream.
+        
+        Returns:
+            Matches found in the remaining buffered input
+        """
+        return self._feed_text(self._decoder.decode(b"", final=True), final=True)
@@ -0,0 +1,111 @@
+"""
+Bounded LRU cache for prompt check results.
+"""
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional
+
+
+class ResultCache:
+    """
+    Thread-safe LRU cache bounded by an estimated size in bytes, with TTL.
+    
+    Entries past their TTL are dropped when they are looked up; the least
+    recently used entries are evicted whenever the byte budget is exceeded.
+    """
+    
+    def __init__(self, max_bytes: int, ttl: float):
+        """
+        Initialize the cache.
+        
+        Args:
+            max_bytes: Upper bound for the summed entry sizes
+            ttl: Seconds an entry stays valid after it is stored
+        """
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+    
+    def get(self, key: Hashable) -> Optional[Any]:
+        """
+        Look up a cached value.
+        
+        Args:
+            key: Cache key
+            
+        Returns:
+            The cached value, or None on a miss or an expired entry
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            
+            expires_at, size, value = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                self.current_bytes -= size
+                self.expirations += 1
+                self.misses += 1
+                return None
+            
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+    
+    def put(self, key: Hashable, value: Any, size: int) -> None:
+        """
+        Store a value, evicting least recently used entries as needed.
+        
+        Args:
+            key: Cache key
+            value: Value to store; callers must treat it as immutable
+            size: Estimated size of the entry in bytes
+        """
+        if size > self.max_bytes:
+            return
+        
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self.current_bytes -= previous[1]
+            
+            self._entries[key] = (time.monotonic() + self.ttl, size, value)
+            self.current_bytes += size
+            while self.current_bytes > self.max_bytes:
+                _, (_, evicted_size, _) = self._entries.popitem(last=False)
+                self.current_bytes -= evicted_size
+                self.evictions += 1
+    
+    def clear(self) -> None:
+        """Drop every entry, keeping the counters."""
+        with self._lock:
+            self._entries.clear()
+            self.current_bytes = 0
+    
+    def stats(self) -> Dict[str, Any]:
+        """
+        Report cache counters.
+        
+        Returns:
+            Dictionary with entry count, size, hit/miss counters and hit ratio
+        """
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "bytes": self.current_bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+        }
@@ -1,8 +1,63 @@
 """
 Prompt checker using Aho-Corasick algorithm for sensitive content detection.
 """
-from typing import Dict, List, Any
-from .aho_corasick import AhoCorasick
+import codecs
+import hashlib
+import os
+import threading
+import time
+from bisect import bisect_right
+from concurrent.futures import BrokenExecutor, ProcessPoolExecutor
+from typing import (
+    Any, Callable, Dict, Iterable, List, NamedTuple, Optional, Sequence, Tuple, Union
+)
+from .aho_corasick import (
+    ANYWHERE, MATCH_ALL, WHOLE_WORD, AhoCorasick, pattern_fingerprint
+)
+from .cache import ResultCache
+from .keywords import KeywordReloader, KeywordSource, parse_keyword_list
+from .fuzzy import FuzzyMatcher
+from .normalize import NormalizingMatcher
+from .pii import PII_TYPES, PiiDetector, PiiStreamScanner
+from .profiling import profiled
+from .snapshot import SnapshotError, load_snapshot, save_snapshot
+
+
+# Optional path of a pre-built automaton snapshot (see app/core/snapshot.py)
+AUTOMATON_SNAPSHOT = os.getenv("AUTOMATON_SNAPSHOT")
+
+# Keyword files (comma-separated, replacing the defaults below), extra
+# keywords, and how often the files are checked for changes in seconds
+KEYWORD_FILES = parse_keyword_list(os.getenv("KEYWORD_FILES"))
+CUSTOM_KEYWORDS = parse_keyword_list(os.getenv("CUSTOM_KEYWORDS"))
+KEYWORD_RELOAD_INTERVAL = float(os.getenv("KEYWORD_RELOAD_INTERVAL", "5"))
+
+# Keyword changes touching at most this share of the list update the
+# current automaton in place of a full rebuild
+INCREMENTAL_UPDATE_RATIO = float(os.getenv("INCREMENTAL_UPDATE_RATIO", "0.1"))
+
+# Numeric personal data reported alongside keyword matches (comma-separated
+# types from app/core/pii.py); empty disables detection
+PII_DETECTION = parse_keyword_list(os.getenv("PII_DETECTION", ",".join(PII_TYPES)))
+
+# Result cache for repeated prompts; a size of 0 disables it
+CHECK_CACHE_MAX_BYTES = int(os.getenv("CHECK_CACHE_MAX_BYTES", str(32 * 1024 * 1024)))
+CHECK_CACHE_TTL = float(os.getenv("CHECK_CACHE_TTL", "3600"))
+
+# Shorter prompts are scanned directly; hashing them costs about as much
+CACHE_MIN_PROMPT_LENGTH = 256
+
+# Keywords this short only match whole words by default ("hp" must not
+# match inside "whatsapp", nor "pin" inside "shipping")
+SHORT_KEYWORD_LENGTH = 3
+
+# Placed between messages of a conversation scan; it is in no keyword, so
+# the automaton falls back to its start state and no match spans two messages
+MESSAGE_SEPARATOR = "\x00"
+
+# Rough per-entry overhead (key, tuple, list) and per-match cost in bytes
+_CACHE_ENTRY_BYTES = 200
+_CACHE_MATCH_BYTES = 120
 
 
 # Default list of sensitive keywords
@@ -61,20 +116,249 @@ DEFAULT_SENSITIVE_KEYWORDS = [
 ]
 
 
+def keyword_boundaries(keywords: Sequence[str]) -> List[int]:
+    """
+    Default boundary mode of each keyword.
+    
+    Args:
+        keywords: Sensitive keywords
+        
+    Returns:
+        WHOLE_WORD for short keywords, ANYWHERE for the rest
+    """
+    return [
+        WHOLE_WORD if len(keyword) <= SHORT_KEYWORD_LENGTH else ANYWHERE
+        for keyword in keywords
+    ]
+
+
+def _keyword_modes(keywords: Sequence[str], boundaries: Sequence[int]) -> Dict[str, int]:
+    """Effective boundary mode of each distinct lowercased keyword."""
+    modes: Dict[str, int] = {}
+    for keyword, mode in zip(keywords, boundaries):
+        if keyword:
+            key = keyword.lower()
+            modes[key] = modes.get(key, mode) & mode
+    return modes
+
+
+class KeywordSet(NamedTuple):
+    """Keywords and the automaton compiled from them, swapped as one unit."""
+    keywords: List[str]
+    boundaries: List[int]
+    automaton: AhoCorasick
+    version: int
+    loaded_at: float      # Unix time the set went live
+    build_seconds: float  # Time spent building or loading the automaton
+
+
 class PromptChecker:
-    """Checker for sensitive content in prompts using Aho-Corasick algorithm."""
+    """
+    Checker for sensitive content in prompts using Aho-Corasick algorithm.
+    
+    The keywords and their automaton live in one immutable KeywordSet that
+    replace_keywords swaps with a single assignment. Each check reads the
+    current set once, so checks in flight during a swap finish on the set
+    they started with and never wait for a rebuild.
+    """
     
-    def __init__(self, sensitive_keywords: List[str] = None):
+    def __init__(self, sensitive_keywords: List[str] = None,
+                 snapshot_path: Optional[str] = None,
+                 cache: Optional[ResultCache] = None,
+                 boundaries: Optional[Sequence[int]] = None,
+                 pii_detector: Optional[PiiDetector] = None):
         """
         Initialize the prompt checker.
         
         Args:
             sensitive_keywords: List of sensitive keywords to detect
+            snapshot_path: Optional automaton snapshot to memory-map instead
+                of building the automaton; written after a build if missing
+            cache: Optional cache of scan results for repeated prompts
+            boundaries: Boundary mode of each keyword (see aho_corasick);
+                defaults to keyword_boundaries
+            pii_detector: Optional detector of numeric personal data whose
+                findings count as sensitive alongside keyword matches
         """
         if sensitive_keywords is None:
             sensitive_keywords = DEFAULT_SENSITIVE_KEYWORDS
+        if boundaries is None:
+            boundaries = keyword_boundaries(sensitive_keywords)
+        
+        self.snapshot_path = snapshot_path
+        self.cache = cache
+        self.pii_detector = pii_detector
+        self._swap_lock = threading.Lock()
+        self._keyword_set = self._build_keyword_set(sensitive_keywords, boundaries, 1)
+        # Optional matchers derived from the current keyword set, by kind
+        self._derived: Tuple[Optional[KeywordSet], Dict[Any, Any]] = (None, {})
+        # Batch worker pool, with the keyword set and size it was started for
+        self._pool: Optional[Tuple[KeywordSet, int, ProcessPoolExecutor]] = None
+        self._pool_lock = threading.Lock()
+    
+    @property
+    def keyword_set(self) -> KeywordSet:
+        """Keyword set currently in use."""
+        return self._keyword_set
+    
+    @property
+    def sensitive_keywords(self) -> List[str]:
+        """Keywords currently in use."""
+        return self._keyword_set.keywords
+    
+    @property
+    def boundaries(self) -> List[int]:
+        """Boundary mode of each keyword currently in use."""
+        return self._keyword_set.boundaries
+    
+    @property
+    def aho_corasick(self) -> AhoCorasick:
+        """Automaton compiled from the current keywords."""
+        return self._keyword_set.automaton
+    
+    @property
+    def normalizing_matcher(self) -> NormalizingMatcher:
+        """Obfuscation-resistant matcher for the current keywords."""
+        return self._derived_matcher("normalize", NormalizingMatcher)
+    
+    def fuzzy_matcher(self, max_errors: int) -> FuzzyMatcher:
+        """
+        Approximate matcher for the current keywords.
+        
+        Args:
+            max_errors: Edits allowed for long keywords, 1 or 2
+            
+        Returns:
+            FuzzyMatcher over the current keywords
+        """
+        return self._derived_matcher(
+            ("fuzzy", max_errors),
+            lambda keywords, boundaries: FuzzyMatcher(keywords, boundaries, max_errors)
+        )
+    
+    def _derived_matcher(self, kind: Any, factory: Callable[[List[str], List[int]], Any]) -> Any:
+        """
+        Return a matcher built from the current keywords, building it once.
         
-        self.aho_corasick = AhoCorasick(sensitive_keywords)
+        Derived matchers are built on first use for each keyword set, so
+        deployments that never use them pay nothing, and are dropped with
+        the keyword set they were built from.
+        """
+        keyword_set = self._keyword_set
+        derived = self._derived
+        if derived[0] is not keyword_set:
+            derived = (keyword_set, {})
+            self._derived = derived
+        matcher = derived[1].get(kind)
+        if matcher is None:
+            matcher = derived[1][kind] = factory(keyword_set.keywords, keyword_set.boundaries)
+        return matcher
+    
+    def replace_keywords(self, sensitive_keywords: List[str],
+                         boundaries: Optional[Sequence[int]] = None) -> KeywordSet:
+        """
+        Build an automaton for new keywords and switch to it atomically.
+        
+        The automaton is built before the swap, so checks keep running on
+        the previous set meanwhile. When only a few keywords change, a copy
+        of the current automaton is updated instead of building a new one.
+        
+        Args:
+            sensitive_keywords: New list of sensitive keywords
+            boundaries: Boundary mode of each keyword; defaults to
+                keyword_boundaries
+                
+        Returns:
+            The keyword set now in use
+        """
+        if boundaries is None:
+            boundaries = keyword_boundaries(sensitive_keywords)
+        
+        with self._swap_lock:
+            current = self._keyword_set
+            keyword_set = self._update_keyword_set(current, sensitive_keywords, boundaries)
+            if keyword_set is None:
+                keyword_set = self._build_keyword_set(
+                    sensitive_keywords, boundaries, current.version + 1
+                )
+            self._keyword_set = keyword_set
+        return keyword_set
+    
+    def _update_keyword_set(self, current: KeywordSet, sensitive_keywords: Sequence[str],
+                            boundaries: Sequence[int]) -> Optional[KeywordSet]:
+        """
+        Derive the next KeywordSet by updating the current automaton.
+        
+        Keywords whose boundary mode changed are removed and added again.
+        Added keywords rank after the existing ones for leftmost-first
+        matching, instead of by their position in the new list.
+        
+        Returns:
+            The new set, or None if too many keywords changed
+        """
+        old_modes = _keyword_modes(current.keywords, current.boundaries)
+        new_modes = _keyword_modes(sensitive_keywords, boundaries)
+        removed = [keyword for keyword, mode in old_modes.items()
+                   if new_modes.get(keyword) != mode]
+        added = [keyword for keyword, mode in new_modes.items()
+                 if old_modes.get(keyword) != mode]
+        if len(removed) + len(added) > INCREMENTAL_UPDATE_RATIO * len(new_modes):
+            return None
+        
+        started = time.perf_counter()
+        automaton = current.automaton.updated(
+            added, removed, [new_modes[keyword] for keyword in added]
+        )
+        build_seconds = time.perf_counter() - started
+        if self.snapshot_path:
+            try:
+                save_snapshot(automaton, self.snapshot_path)
+            except OSError:
+                pass
+        return KeywordSet(list(sensitive_keywords), list(boundaries), automaton,
+                          current.version + 1, time.time(), build_seconds)
+    
+    def _build_keyword_set(self, sensitive_keywords: Sequence[str], boundaries: Sequence[int],
+                           version: int) -> KeywordSet:
+        """Compile keywords into a KeywordSet with the given version."""
+        keywords = list(sensitive_keywords)
+        modes = list(boundaries)
+        started = time.perf_counter()
+        automaton = self._load_automaton(keywords, modes, self.snapshot_path)
+        build_seconds = time.perf_counter() - started
+        return KeywordSet(keywords, modes, automaton, version, time.time(), build_seconds)
+    
+    @staticmethod
+    def _load_automaton(sensitive_keywords: List[str], boundaries: List[int],
+                        snapshot_path: Optional[str]) -> AhoCorasick:
+        """
+        Load the automaton from a snapshot, or build it from the keywords.
+        
+        Args:
+            sensitive_keywords: List of sensitive keywords to detect
+            boundaries: Boundary mode of each keyword
+            snapshot_path: Optional automaton snapshot path
+            
+        Returns:
+            Compiled AhoCorasick automaton
+        """
+        if not snapshot_path:
+            return AhoCorasick(sensitive_keywords, boundaries)
+        
+        if os.path.exists(snapshot_path):
+            try:
+                return load_snapshot(
+                    snapshot_path, pattern_fingerprint(sensitive_keywords, boundaries)
+                )
+            except SnapshotError:
+                pass  # Stale or incompatible snapshot, rebuild it below
+        
+        automaton = AhoCorasick(sensitive_keywords, boundaries)
+        try:
+            save_snapshot(automaton, snapshot_path)
+        except OSError:
+            pass  # Read-only filesystems (e.g. serverless) just skip caching
+        return automaton
     
     def _dummy_llm_response(self, prompt: str) -> str:
         """
@@ -88,27 +372,42 @@ class PromptChecker:
         """
         return f"LLM response: {prompt}"
     
-    def check_prompt(self, prompt: str) -> Dict[str, Any]:
+    @profiled("check_prompt", lambda self, prompt, *args, **kwargs: len(prompt))
+    def check_prompt(self, prompt: str, match_kind: str = MATCH_ALL,
+                     normalize: bool = False, max_errors: int = 0) -> Dict[str, Any]:
         """
         Check if prompt contains sensitive content.
         
         Args:
             prompt: User input prompt to check
+            match_kind: Match kind passed to AhoCorasick.search; only
+                MATCH_ALL results are cached
+            normalize: Also match obfuscated keywords (see normalize.py);
+                only MATCH_ALL is supported, and each match reports its end
+                since the matched text may be longer than the keyword
+            max_errors: Also match keywords with up to this many typos (see
+                fuzzy.py); like normalize, each match reports its end, plus
+                its edit distance
             
         Returns:
-            Dictionary with status and matches/response
+            Dictionary with status and matches/response, plus the typed
+            findings under "pii" when the checker has a PII detector
+            
+        Raises:
+            ValueError: If normalize or max_errors is combined with another
+                match kind, or with each other
         """
-        if not prompt or not prompt.strip():
-            return {
-                "status": "SAFE",
-                "matches": [],
-                "response": self._dummy_llm_response(prompt)
-            }
-        
-        # Search for sensitive patterns
-        matches = self.aho_corasick.search(prompt)
+        if normalize or max_errors:
+            formatted_matches = self._approximate_matches(
+                prompt, match_kind, normalize, max_errors
+            )
+        else:
+            # Search for sensitive patterns
+            if match_kind == MATCH_ALL:
+                matches = self._find_matches(prompt)
+            else:
+                matches = self.aho_corasick.search(prompt, match_kind)
         
-        if matches:
             # Convert matches to the required format
             formatted_matches = [
                 {
@@ -118,30 +417,464 @@ class PromptChecker:
                 for keyword, position in matches
             ]
             
-            return {
+        findings = self.pii_findings(prompt)
+        if formatted_matches or findings:
+            result = {
                 "status": "SENSITIVE",
                 "matches": formatted_matches
             }
         else:
-            return {
+            result = {
                 "status": "SAFE",
-                "matches": [],
-                "response": self._dummy_llm_response(prompt)
+                "matches": []
+            }
+        if findings is not None:
+            result["pii"] = findings
+        if result["status"] == "SAFE":
+            result["response"] = self._dummy_llm_response(prompt)
+        return result
+    
+    def pii_findings(self, prompt: str) -> Optional[List[Dict[str, Any]]]:
+        """
+        Find numeric personal data in a prompt.
+        
+        Args:
+            prompt: User input prompt to check
+            
+        Returns:
+            Findings with type, position and end, as reported under "pii";
+            None without a PII detector
+        """
+        if self.pii_detector is None:
+            return None
+        return [
+            {
+                "type": finding.type,
+                "position": finding.start,
+                "end": finding.end
             }
+            for finding in self.pii_detector.detect(prompt)
+        ]
+    
+    def _approximate_matches(self, prompt: str, match_kind: str, normalize: bool,
+                             max_errors: int) -> List[Dict[str, Any]]:
+        """Run the normalizing or the fuzzy matcher for check_prompt."""
+        if match_kind != MATCH_ALL:
+            raise ValueError(f"Approximate matching does not support {match_kind!r}")
+        if normalize and max_errors:
+            raise ValueError("Normalized and fuzzy matching cannot be combined")
+        
+        if normalize:
+            return [
+                {
+                    "keyword": keyword,
+                    "position": start,
+                    "end": end
+                }
+                for keyword, start, end in self.normalizing_matcher.search(prompt)
+            ]
+        return [
+            {
+                "keyword": keyword,
+                "position": start,
+                "end": end,
+                "distance": distance
+            }
+            for keyword, start, end, distance in self.fuzzy_matcher(max_errors).search(prompt)
+        ]
+    
+    @profiled("is_sensitive", lambda self, prompt, *args, **kwargs: len(prompt))
+    def is_sensitive(self, prompt: str, normalize: bool = False, max_errors: int = 0) -> bool:
+        """
+        Tell whether a prompt contains any sensitive keyword.
+        
+        Stops at the first match instead of collecting all of them.
+        
+        Args:
+            prompt: User input prompt to check
+            normalize: Also match obfuscated keywords
+            max_errors: Also match keywords with up to this many typos
+            
+        Returns:
+            True if any keyword or, with a PII detector, any personal data
+            is found
+        """
+        if self.pii_detector is not None and self.pii_detector.has_findings(prompt):
+            return True
+        if normalize:
+            return self.normalizing_matcher.has_matches(prompt)
+        if max_errors:
+            return self.fuzzy_matcher(max_errors).has_matches(prompt)
+        if self.cache is not None and len(prompt) >= CACHE_MIN_PROMPT_LENGTH:
+            return bool(self._find_matches(prompt))
+        return self.aho_corasick.has_matches(prompt)
+    
+    @profiled("count_keywords", lambda self, prompt: len(prompt))
+    def count_keywords(self, prompt: str) -> Dict[str, int]:
+        """
+        Count sensitive keyword occurrences without listing positions.
+        
+        Args:
+            prompt: User input prompt to check
+            
+        Returns:
+            Number of occurrences per keyword found
+        """
+        return self.aho_corasick.count(prompt)
+    
+    def _find_matches(self, prompt: str) -> Sequence[Tuple[str, int]]:
+        """
+        Scan a prompt, reusing the cached result for a repeated prompt.
+        
+        Cache keys combine the keyword-set fingerprint with a 128-bit digest
+        of the prompt, so a keyword change never serves stale results.
+        
+        Args:
+            prompt: Prompt to scan
+            
+        Returns:
+            Sequence of (keyword, position) matches
+        """
+        automaton = self.aho_corasick
+        if self.cache is None or len(prompt) < CACHE_MIN_PROMPT_LENGTH:
+            return automaton.search(prompt)
+        
+        key = self._cache_key(automaton, prompt)
+        matches = self.cache.get(key)
+        if matches is None:
+            matches = tuple(automaton.search(prompt))
+            self._cache_matches(key, matches)
+        return matches
+    
+    @staticmethod
+    def _cache_key(automaton: AhoCorasick, text: str) -> Tuple[str, bytes]:
+        """Build the result cache key for a text scanned by an automaton."""
+        digest = hashlib.blake2b(
+            text.encode("utf-8", "surrogatepass"), digest_size=16
+        ).digest()
+        return (automaton.fingerprint, digest)
+    
+    def _cache_matches(self, key: Tuple[str, bytes], matches: Tuple[Tuple[str, int], ...]):
+        """Store scan results under a key built by _cache_key."""
+        size = _CACHE_ENTRY_BYTES + _CACHE_MATCH_BYTES * len(matches)
+        self.cache.put(key, matches, size)
+    
+    @profiled("check_conversation", lambda self, messages: sum(map(len, messages)))
+    def check_conversation(self, messages: Sequence[str]) -> Dict[str, Any]:
+        """
+        Check every message of a conversation in one automaton pass.
+        
+        Messages already seen in an earlier turn are served from the result
+        cache, so each new turn only scans the messages it adds. The rest
+        are joined with MESSAGE_SEPARATOR and scanned together.
+        
+        Args:
+            messages: Message contents, in conversation order
+            
+        Returns:
+            Dictionary with status, all matches tagged with their message
+            index, and a per-message list of matches; positions are offsets
+            within each message and no dummy response is included. With a
+            PII detector, "pii" lists the findings tagged the same way
+        """
+        automaton = self.aho_corasick
+        per_message: List[Sequence[Tuple[str, int]]] = [()] * len(messages)
+        pending: List[int] = []
+        keys: Dict[int, Tuple[str, bytes]] = {}
+        
+        for index, message in enumerate(messages):
+            if not message:
+                continue
+            if self.cache is not None and len(message) >= CACHE_MIN_PROMPT_LENGTH:
+                key = self._cache_key(automaton, message)
+                cached = self.cache.get(key)
+                if cached is not None:
+                    per_message[index] = cached
+                    continue
+                keys[index] = key
+            pending.append(index)
+        
+        if pending:
+            # Start offset of each pending message in the joined text
+            starts = []
+            offset = 0
+            for index in pending:
+                starts.append(offset)
+                offset += len(messages[index]) + len(MESSAGE_SEPARATOR)
+            
+            found: Dict[int, List[Tuple[str, int]]] = {index: [] for index in pending}
+            text = MESSAGE_SEPARATOR.join(messages[index] for index in pending)
+            for keyword, position in automaton.search(text):
+                slot = bisect_right(starts, position) - 1
+                found[pending[slot]].append((keyword, position - starts[slot]))
+            
+            for index in pending:
+                matches = tuple(found[index])
+                per_message[index] = matches
+                if index in keys:
+                    self._cache_matches(keys[index], matches)
+        
+        result = {
+            "status": "SENSITIVE" if any(per_message) else "SAFE",
+            "matches": [
+                {
+                    "keyword": keyword,
+                    "position": position,
+                    "message": index
+                }
+                for index, matches in enumerate(per_message)
+                for keyword, position in matches
+            ],
+            "messages": [
+                [
+                    {
+                        "keyword": keyword,
+                        "position": position
+                    }
+                    for keyword, position in matches
+                ]
+                for matches in per_message
+            ]
+        }
+        
+        if self.pii_detector is not None:
+            detect = self.pii_detector.detect
+            result["pii"] = [
+                {
+                    "type": finding.type,
+                    "position": finding.start,
+                    "end": finding.end,
+                    "message": index
+                }
+                for index, message in enumerate(messages)
+                for finding in detect(message)
+            ]
+            if result["pii"]:
+                result["status"] = "SENSITIVE"
+        return result
+    
+    def check_stream(self, chunks: Iterable[Union[str, bytes]]) -> Dict[str, Any]:
+        """
+        Check text that arrives in chunks without joining it in memory.
+        
+        Args:
+            chunks: Pieces of text, or UTF-8 bytes, in stream order
+            
+        Returns:
+            Dictionary with status and matches, plus the PII findings under
+            "pii" when the checker has a PII detector; positions are offsets
+            in the whole stream and no dummy response is included
+        """
+        scanner = self.aho_corasick.scanner()
+        pii_scanner = PiiStreamScanner(self.pii_detector) if self.pii_detector is not None else None
+        decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        matches = []
+        findings = []
+        for chunk in chunks:
+            if isinstance(chunk, (bytes, bytearray, memoryview)):
+                chunk = decoder.decode(chunk)
+            matches.extend(scanner.feed(chunk))
+            if pii_scanner is not None:
+                findings.extend(pii_scanner.feed(chunk))
+        rest = decoder.decode(b"", final=True)
+        matches.extend(scanner.feed(rest))
+        matches.extend(scanner.finish())
+        
+        result = {
+            "status": "SENSITIVE" if matches or findings else "SAFE",
+            "matches": [
+                {
+                    "keyword": keyword,
+                    "position": position
+                }
+                for keyword, position in matches
+            ]
+        }
+        if pii_scanner is not None:
+            findings.extend(pii_scanner.feed(rest))
+            findings.extend(pii_scanner.finish())
+            result["pii"] = [
+                {
+                    "type": finding.type,
+                    "position": finding.start,
+                    "end": finding.end
+                }
+                for finding in findings
+            ]
+            if result["pii"]:
+                result["status"] = "SENSITIVE"
+        return result
+    
+    @profiled("check_many", lambda self, prompts, *args, **kwargs: sum(map(len, prompts)))
+    def check_many(self, prompts: Sequence[str], processes: Optional[int] = None,
+                   chunk_size: int = 1000) -> List[Dict[str, Any]]:
+        """
+        Check a batch of prompts.
+        
+        Args:
+            prompts: Prompts to check
+            processes: Number of worker processes for large batches; the
+                batch is checked in the calling process when not set
+            chunk_size: Number of prompts sent to a worker at a time
+            
+        Returns:
+            One result per prompt, in input order, as returned by check_prompt
+        """
+        if processes is None or processes <= 1 or len(prompts) <= chunk_size:
+            check = self.check_prompt
+            return [check(prompt) for prompt in prompts]
+        
+        chunks = [prompts[i:i + chunk_size] for i in range(0, len(prompts), chunk_size)]
+        executor = self._batch_pool(processes)
+        results: List[Dict[str, Any]] = []
+        try:
+            for chunk_results in executor.map(_check_batch_chunk, chunks):
+                results.extend(chunk_results)
+        except BrokenExecutor:
+            # A worker died; start a fresh pool for the next batch
+            self._drop_pool(executor)
+            raise
+        return results
+    
+    def _batch_pool(self, processes: int) -> ProcessPoolExecutor:
+        """
+        Return the batch worker pool, starting it on first use.
+        
+        Workers build their checker once, so the pool is kept across batches
+        and only replaced when the keywords or the number of processes
+        change. Batches still running on a replaced pool finish on it.
+        """
+        keyword_set = self._keyword_set
+        with self._pool_lock:
+            pool = self._pool
+            if pool is not None and pool[0] is keyword_set and pool[1] == processes:
+                return pool[2]
+            executor = ProcessPoolExecutor(
+                max_workers=processes,
+                initializer=_init_batch_worker,
+                initargs=(keyword_set.keywords, self.snapshot_path, keyword_set.boundaries,
+                          self.pii_detector),
+            )
+            self._pool = (keyword_set, processes, executor)
+        if pool is not None:
+            pool[2].shutdown(wait=False)
+        return executor
+    
+    def _drop_pool(self, executor: ProcessPoolExecutor) -> None:
+        """Forget a batch worker pool if it is still the current one."""
+        with self._pool_lock:
+            if self._pool is not None and self._pool[2] is executor:
+                self._pool = None
+        executor.shutdown(wait=False)
+    
+    def close(self, wait: bool = True) -> None:
+        """
+        Stop the batch worker processes, if any were started.
+        
+        Args:
+            wait: Whether to wait for the workers to exit; otherwise they
+                exit in the background once their current batch is done
+        """
+        with self._pool_lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool[2].shutdown(wait=wait)
+
+
+# Checker used inside batch worker processes
+_batch_checker: Optional[PromptChecker] = None
+
+
+def _init_batch_worker(sensitive_keywords: List[str], snapshot_path: Optional[str],
+                       boundaries: List[int], pii_detector: Optional[PiiDetector]):
+    """Build the checker once per batch worker process."""
+    global _batch_checker
+    _batch_checker = PromptChecker(
+        sensitive_keywords, snapshot_path, boundaries=boundaries, pii_detector=pii_detector
+    )
+
+
+def _check_batch_chunk(prompts: Sequence[str]) -> List[Dict[str, Any]]:
+    """Check one chunk of a batch inside a worker process."""
+    check = _batch_checker.check_prompt
+    return [check(prompt) for prompt in prompts]
 
 
 # Global instance for use in API
-prompt_checker = PromptChecker()
+keyword_source = KeywordSource(KEYWORD_FILES, DEFAULT_SENSITIVE_KEYWORDS, CUSTOM_KEYWORDS)
+prompt_checker = PromptChecker(
+    keyword_source.load(),
+    snapshot_path=AUTOMATON_SNAPSHOT,
+    cache=ResultCache(CHECK_CACHE_MAX_BYTES, CHECK_CACHE_TTL) if CHECK_CACHE_MAX_BYTES > 0 else None,
+    pii_detector=PiiDetector(PII_DETECTION) if PII_DETECTION else None
+)
 
+# Started with the application (see app/main.py)
+keyword_reloader = KeywordReloader(prompt_checker, keyword_source, KEYWORD_RELOAD_INTERVAL)
 
-def check_prompt(prompt: str) -> Dict[str, Any]:
+
+def check_prompt(prompt: str, match_kind: str = MATCH_ALL) -> Dict[str, Any]:
     """
     Function wrapper for checking prompts.
     
     Args:
         prompt: User input prompt to check
+        match_kind: Match kind passed to AhoCorasick.search
         
     Returns:
         Dictionary with status and matches/response
     """
-    return prompt_checker.check_prompt(prompt)
\ No newline at end of file
+    return prompt_checker.check_prompt(prompt, match_kind)
+
+
+def is_sensitive(prompt: str) -> bool:
+    """
+    Function wrapper for a yes/no sensitivity check.
+    
+    Args:
+        prompt: User input prompt to check
+        
+    Returns:
+        True if any keyword is found
+    """
+    return prompt_checker.is_sensitive(prompt)
+
+
+def count_keywords(prompt: str) -> Dict[str, int]:
+    """
+    Function wrapper for counting keyword occurrences.
+    
+    Args:
+        prompt: User input prompt to check
+        
+    Returns:
+        Number of occurrences per keyword found
+    """
+    return prompt_checker.count_keywords(prompt)
+
+
+def check_conversation(messages: Sequence[str]) -> Dict[str, Any]:
+    """
+    Function wrapper for checking every message of a conversation.
+    
+    Args:
+        messages: Message contents, in conversation order
+        
+    Returns:
+        Dictionary with status, matches and per-message matches
+    """
+    return prompt_checker.check_conversation(messages)
+
+
+def check_many(prompts: Sequence[str], processes: Optional[int] = None) -> List[Dict[str, Any]]:
+    """
+    Function wrapper for checking a batch of prompts.
+    
+    Args:
+        prompts: Prompts to check
+        processes: Optional number of worker processes for large batches
+        
+    Returns:
+        One result per prompt, in input order
+    """
+    return prompt_checker.check_many(prompts, processes)
\ No newline at end of file
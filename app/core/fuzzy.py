@@ -0,0 +1,207 @@
+"""
+Approximate keyword matching within a small edit distance.
+
+Catches typos such as "pasword" or "nomer rekening" that exact matching
+misses. Uses the pigeonhole filter: a keyword split into k + 1 pieces
+keeps at least one piece intact under k edits, so an exact automaton over
+the pieces finds every candidate region in one pass. Only the text around
+each piece hit is then verified with an edit-distance computation, so text
+without near-misses costs one automaton scan.
+"""
+from typing import Dict, List, Optional, Sequence, Set, Tuple
+
+from .aho_corasick import ANYWHERE, AhoCorasick
+
+
+# Largest supported number of edits
+MAX_ERRORS = 2
+
+# Shortest piece a keyword is split into. Shorter pieces would turn up in
+# most texts, and short keywords stay exact ("token" is one edit away from
+# "taken")
+MIN_PIECE_LENGTH = 3
+
+
+def allowed_errors(keyword: str, max_errors: int) -> int:
+    """
+    Number of edits allowed for a keyword.
+    
+    Args:
+        keyword: Keyword to match
+        max_errors: Upper bound requested by the caller
+        
+    Returns:
+        Edits allowed, 0 for keywords too short to match approximately
+    """
+    return max(min(max_errors, len(keyword) // MIN_PIECE_LENGTH - 1), 0)
+
+
+def split_pieces(keyword: str, errors: int) -> List[Tuple[str, int]]:
+    """
+    Split a keyword into errors + 1 pieces of near-equal length.
+    
+    Args:
+        keyword: Keyword to split
+        errors: Edits allowed for the keyword
+        
+    Returns:
+        (piece, offset in keyword) pairs
+    """
+    count = errors + 1
+    size, extra = divmod(len(keyword), count)
+    pieces = []
+    offset = 0
+    for index in range(count):
+        length = size + (1 if index < extra else 0)
+        pieces.append((keyword[offset:offset + length], offset))
+        offset += length
+    return pieces
+
+
+def best_alignment(keyword: str, window: str) -> Tuple[int, int, int]:
+    """
+    Find the substring of a window closest to a keyword.
+    
+    Semi-global edit distance: the keyword must be matched in full, the
+    window may be entered and left anywhere. Ties prefer the shortest span,
+    then the leftmost one.
+    
+    Args:
+        keyword: Keyword, lowercased
+        window: Text to search, lowercased
+        
+    Returns:
+        (distance, start, end) of the best span within the window
+    """
+    # Each cell holds (distance, start of the span ending there)
+    previous = [(0, j) for j in range(len(window) + 1)]
+    for i, char in enumerate(keyword, 1):
+        current = [(i, 0)]
+        for j, window_char in enumerate(window, 1):
+            diagonal = previous[j - 1]
+            cost = diagonal[0] + (char != window_char)
+            best = (cost, diagonal[1])
+            up = previous[j]
+            if up[0] + 1 < best[0]:
+                best = (up[0] + 1, up[1])
+            left = current[j - 1]
+            if left[0] + 1 < best[0]:
+                best = (left[0] + 1, left[1])
+            current.append(best)
+        previous = current
+    
+    distance, start, end = len(keyword) + 1, 0, 0
+    for j, (cost, span_start) in enumerate(previous):
+        if cost < distance or (cost == distance and j - span_start < end - start):
+            distance, start, end = cost, span_start, j
+    return distance, start, end
+
+
+class FuzzyMatcher:
+    """
+    Keyword matcher allowing up to k insertions, deletions or substitutions.
+    
+    Boundary modes are checked on the matched span, like exact matches.
+    Exact occurrences are reported too, with distance 0.
+    """
+    
+    def __init__(self, keywords: Sequence[str], boundaries: Optional[Sequence[int]] = None,
+                 max_errors: int = 1):
+        """
+        Build the piece automaton.
+        
+        Args:
+            keywords: Keywords to detect
+            boundaries: Optional boundary mode of each keyword
+            max_errors: Edits allowed for long keywords, 1 or 2; shorter
+                keywords get fewer (see allowed_errors)
+                
+        Raises:
+            ValueError: If max_errors is out of range
+        """
+        if not 1 <= max_errors <= MAX_ERRORS:
+            raise ValueError(f"max_errors must be between 1 and {MAX_ERRORS}")
+        self.max_errors = max_errors
+        
+        # Every keyword has pieces, so short keywords are still found exactly
+        self.keywords: List[str] = []
+        self._modes: List[int] = []
+        self._errors: List[int] = []
+        seen: Dict[str, int] = {}
+        pieces: Dict[str, List[Tuple[int, int]]] = {}
+        for index, keyword in enumerate(keywords):
+            keyword = keyword.lower()
+            mode = boundaries[index] if boundaries else ANYWHERE
+            if not keyword:
+                continue
+            if keyword in seen:
+                self._modes[seen[keyword]] &= mode
+                continue
+            keyword_id = len(self.keywords)
+            seen[keyword] = keyword_id
+            self.keywords.append(keyword)
+            self._modes.append(mode)
+            errors = allowed_errors(keyword, max_errors)
+            self._errors.append(errors)
+            for piece, offset in split_pieces(keyword, errors):
+                pieces.setdefault(piece, []).append((keyword_id, offset))
+        
+        self._pieces = pieces
+        self.automaton = AhoCorasick(list(pieces))
+    
+    def search(self, text: str) -> List[Tuple[str, int, int, int]]:
+        """
+        Search the text for keywords within the allowed edit distance.
+        
+        Args:
+            text: Text to search in
+            
+        Returns:
+            List of tuples (keyword, start, end, distance), ordered by start
+        """
+        found: Set[Tuple[int, int, int, int]] = set()
+        checked: Set[Tuple[int, int]] = set()
+        keywords = self.keywords
+        for piece, position in self.automaton.search(text):
+            for keyword_id, offset in self._pieces[piece]:
+                # Where the keyword would start if the piece were in place
+                origin = position - offset
+                if (keyword_id, origin) in checked:
+                    continue
+                checked.add((keyword_id, origin))
+                
+                keyword = keywords[keyword_id]
+                errors = self._errors[keyword_id]
+                if not errors:
+                    match = (origin, origin + len(keyword), 0)
+                else:
+                    low = max(origin - errors, 0)
+                    window = text[low:origin + len(keyword) + errors].lower()
+                    distance, start, end = best_alignment(keyword, window)
+                    if distance > errors:
+                        continue
+                    match = (low + start, low + end, distance)
+                
+                start, end, distance = match
+                mode = self._modes[keyword_id]
+                if not mode or AhoCorasick._at_boundaries(text, start, end, mode):
+                    found.add((start, end, keyword_id, distance))
+        
+        return [
+            (keywords[keyword_id], start, end, distance)
+            for start, end, keyword_id, distance in sorted(found)
+        ]
+    
+    def has_matches(self, text: str) -> bool:
+        """
+        Tell whether the text contains any keyword within the allowed distance.
+        
+        Args:
+            text: Text to check
+            
+        Returns:
+            True if any keyword is found
+        """
+        if not self.automaton.has_matches(text):
+            return False
+        return bool(self.search(text))
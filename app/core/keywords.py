@@ -0,0 +1,182 @@
+"""
+Keyword sets loaded from files and reloaded when the files change.
+
+Keyword files hold one keyword per line; blank lines and lines starting
+with ``#`` are ignored. A background thread polls the files and hands a
+changed list to ``PromptChecker.replace_keywords``, which builds the new
+automaton off to the side and swaps it in atomically.
+"""
+import logging
+import os
+import threading
+from typing import TYPE_CHECKING, List, Optional, Sequence, Tuple
+
+if TYPE_CHECKING:
+    from .checker import PromptChecker
+
+
+logger = logging.getLogger(__name__)
+
+
+def parse_keyword_list(value: Optional[str]) -> List[str]:
+    """
+    Split a comma-separated setting into its non-empty entries.
+    
+    Args:
+        value: Comma-separated value, or None
+        
+    Returns:
+        Stripped entries in order
+    """
+    if not value:
+        return []
+    return [entry.strip() for entry in value.split(",") if entry.strip()]
+
+
+def read_keyword_file(path: str) -> List[str]:
+    """
+    Read the keywords listed in a file.
+    
+    Args:
+        path: Keyword file path
+        
+    Returns:
+        Keywords in file order
+    """
+    keywords = []
+    with open(path, encoding="utf-8") as handle:
+        for line in handle:
+            keyword = line.strip()
+            if keyword and not keyword.startswith("#"):
+                keywords.append(keyword)
+    return keywords
+
+
+class KeywordSource:
+    """
+    Where the keyword list comes from: files, or built-in defaults.
+    
+    Keywords from all files are combined in order; the defaults are only
+    used when no file is configured. Extra keywords are always appended.
+    """
+    
+    def __init__(self, paths: Sequence[str], defaults: Sequence[str],
+                 extra: Sequence[str] = ()):
+        """
+        Initialize the source.
+        
+        Args:
+            paths: Keyword files, in order
+            defaults: Keywords used when no file is configured
+            extra: Keywords added to the list in every case
+        """
+        self.paths = list(paths)
+        self.defaults = list(defaults)
+        self.extra = list(extra)
+        self._signature: Optional[Tuple] = None
+    
+    def _current_signature(self) -> Tuple:
+        """Modification time and size of each file, None when missing."""
+        signature = []
+        for path in self.paths:
+            try:
+                stat = os.stat(path)
+                signature.append((stat.st_mtime_ns, stat.st_size))
+            except OSError:
+                signature.append(None)
+        return tuple(signature)
+    
+    def has_changed(self) -> bool:
+        """Tell whether a file changed since the last load."""
+        return bool(self.paths) and self._current_signature() != self._signature
+    
+    def load(self) -> List[str]:
+        """
+        Read the current keyword list.
+        
+        Returns:
+            Unique keywords, in order of first appearance
+            
+        Raises:
+            OSError: If a keyword file cannot be read
+        """
+        # Taken first, so a write during the read triggers another reload
+        signature = self._current_signature()
+        if self.paths:
+            keywords = []
+            for path in self.paths:
+                keywords.extend(read_keyword_file(path))
+        else:
+            keywords = list(self.defaults)
+        
+        self._signature = signature
+        return list(dict.fromkeys(keywords + self.extra))
+
+
+class KeywordReloader:
+    """Background thread that swaps in changed keyword files."""
+    
+    def __init__(self, checker: "PromptChecker", source: KeywordSource, interval: float):
+        """
+        Initialize the reloader.
+        
+        Args:
+            checker: Checker whose keywords are replaced
+            source: Keyword source to watch
+            interval: Seconds between polls; 0 disables polling
+        """
+        self.checker = checker
+        self.source = source
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+    
+    def check(self) -> bool:
+        """
+        Reload the keywords if a file changed.
+        
+        A file that cannot be read keeps the current keywords in use.
+        
+        Returns:
+            True if a new keyword set was swapped in
+        """
+        if not self.source.has_changed():
+            return False
+        
+        try:
+            keywords = self.source.load()
+        except (OSError, UnicodeDecodeError) as e:
+            logger.warning("Keeping current keywords, reload failed: %s", e)
+            return False
+        
+        keyword_set = self.checker.replace_keywords(keywords)
+        logger.info(
+            "Loaded keyword set version %d (%d keywords) in %.3fs",
+            keyword_set.version, len(keyword_set.keywords), keyword_set.build_seconds
+        )
+        return True
+    
+    def start(self) -> None:
+        """Start polling, unless there is nothing to watch."""
+        if not self.source.paths or self.interval <= 0 or self._thread is not None:
+            return
+        
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="keyword-reloader", daemon=True)
+        self._thread.start()
+    
+    def stop(self) -> None:
+        """Stop polling and wait for the thread to exit."""
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+    
+    def _run(self) -> None:
+        """Poll the keyword files until stopped."""
+        while not self._stop.wait(self.interval):
+            try:
+                self.check()
+            except Exception:
+                logger.exception("Keyword reload failed")
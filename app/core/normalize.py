@@ -0,0 +1,154 @@
+"""
+Obfuscation-resistant keyword matching.
+
+Text is folded one character at a time while the automaton walks it:
+compatibility forms (full-width letters, ligature-free styled letters) and
+accents are reduced to their base letter, case is folded, common homoglyphs
+and leetspeak digits become the letter they imitate, and separators
+(whitespace, punctuation, zero-width and other format characters) are
+dropped. "P a s s w 0 r d", "ｐａｓｓｗｏｒｄ" and "pa\\u200bssword" all match
+"password", and match offsets still point into the original text.
+
+Dropping separators also joins words, so "compass wording" contains
+"password"; this matcher is meant for checks that opt into it.
+"""
+import unicodedata
+from functools import lru_cache
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from .aho_corasick import AhoCorasick
+
+
+# Letters imitated by digits and symbols, applied after case folding
+LEET_MAP = {
+    "0": "o",
+    "1": "i",
+    "3": "e",
+    "4": "a",
+    "5": "s",
+    "7": "t",
+    "8": "b",
+    "@": "a",
+    "$": "s",
+    "!": "i",
+}
+
+# Cyrillic and Greek lowercase letters that look like Latin ones
+HOMOGLYPH_MAP = {
+    "а": "a",  # Cyrillic a
+    "в": "b",  # Cyrillic ve
+    "е": "e",  # Cyrillic ie
+    "к": "k",  # Cyrillic ka
+    "м": "m",  # Cyrillic em
+    "н": "h",  # Cyrillic en
+    "о": "o",  # Cyrillic o
+    "р": "p",  # Cyrillic er
+    "с": "c",  # Cyrillic es
+    "т": "t",  # Cyrillic te
+    "у": "y",  # Cyrillic u
+    "х": "x",  # Cyrillic ha
+    "ѕ": "s",  # Cyrillic dze
+    "і": "i",  # Cyrillic Byelorussian-Ukrainian i
+    "ј": "j",  # Cyrillic je
+    "ԁ": "d",  # Cyrillic komi de
+    "α": "a",  # Greek alpha
+    "ι": "i",  # Greek iota
+    "κ": "k",  # Greek kappa
+    "ν": "v",  # Greek nu
+    "ο": "o",  # Greek omicron
+    "ρ": "p",  # Greek rho
+    "τ": "t",  # Greek tau
+    "υ": "u",  # Greek upsilon
+}
+
+
+@lru_cache(maxsize=None)
+def fold_char(char: str) -> str:
+    """
+    Fold one character for obfuscation-resistant matching.
+    
+    Args:
+        char: Character to fold
+        
+    Returns:
+        The folded character, or an empty string for separators
+    """
+    decomposed = unicodedata.normalize("NFKD", char)
+    base = "".join(part for part in decomposed if not unicodedata.combining(part)).lower()
+    if len(base) != 1:
+        # Marks alone fold to nothing; multi-letter forms (ligatures) stay as is
+        return base if base else ""
+    
+    base = LEET_MAP.get(base) or HOMOGLYPH_MAP.get(base) or base
+    category = unicodedata.category(base)
+    if base.isspace() or category[0] in "PZ" or category == "Cf":
+        return ""
+    return base
+
+
+def normalize_keyword(keyword: str) -> str:
+    """
+    Fold a keyword the way fold_char folds text.
+    
+    Args:
+        keyword: Keyword to fold
+        
+    Returns:
+        The keyword as the automaton sees it ("api key" becomes "apikey")
+    """
+    return "".join(fold_char(char) for char in keyword)
+
+
+class NormalizingMatcher:
+    """
+    Keyword matcher that sees through case, width, accents and separators.
+    
+    Keywords are folded once when the matcher is built; text is folded
+    during the scan by AhoCorasick.search_folded, without extra passes or
+    copies. Matches are reported under the original keyword.
+    """
+    
+    def __init__(self, keywords: Sequence[str], boundaries: Optional[Sequence[int]] = None):
+        """
+        Build the matcher.
+        
+        Args:
+            keywords: Keywords to detect
+            boundaries: Optional boundary mode of each keyword, checked
+                against the characters around the match in the original text
+        """
+        folded = [normalize_keyword(keyword) for keyword in keywords]
+        self.automaton = AhoCorasick(folded, boundaries)
+        # Keywords folding to the same form are reported under the first one
+        self._names: Dict[str, str] = {}
+        for key, keyword in zip(folded, keywords):
+            if key:
+                self._names.setdefault(key, keyword.lower())
+    
+    def search(self, text: str) -> List[Tuple[str, int, int]]:
+        """
+        Search the text for obfuscated keywords.
+        
+        Args:
+            text: Text to search in
+            
+        Returns:
+            List of tuples (keyword, start, end) with offsets in the text
+        """
+        names = self._names
+        return [
+            (names[key], start, end)
+            for key, start, end in self.automaton.search_folded(text, fold_char)
+        ]
+    
+    def has_matches(self, text: str) -> bool:
+        """
+        Tell whether the text contains any obfuscated keyword.
+        
+        Args:
+            text: Text to check
+            
+        Returns:
+            True if any keyword is found
+        """
+        return self.automaton.has_folded_matches(text, fold_char)
@@ -0,0 +1,307 @@
+"""
+Detectors for numeric personal data that keyword matching cannot see.
+
+One regex pass finds digit runs (optionally grouped with spaces, dots or
+dashes, and with a leading "+"). Each run is then classified by its digit
+count first, so most runs are rejected by a dictionary lookup; only runs
+of a plausible length reach the structural checks: NIK region and birth
+date, NPWP layout, Indonesian mobile prefixes and the issuer, length and
+Luhn checksum of card numbers.
+"""
+import re
+from typing import Any, Callable, Dict, Iterable, Iterator, List, NamedTuple, Sequence, Tuple
+
+
+PII_NIK = "nik"      # Indonesian national ID number (16 digits)
+PII_NPWP = "npwp"    # Indonesian tax ID (15 digits)
+PII_PHONE = "phone"  # Indonesian mobile number
+PII_CARD = "card"    # Payment card number
+PII_TYPES = (PII_NIK, PII_NPWP, PII_PHONE, PII_CARD)
+
+# Digits grouped by single separators, not glued to letters or digits
+_DIGIT_RUN = re.compile(r'(?<![\w+])\+?\d(?:[ .\-]?\d)*(?!\w)')
+_WORD = re.compile(r'\+?\d(?:[.\-]?\d)*')
+_SEPARATORS = str.maketrans("", "", " .-+")
+
+# Characters a digit run can end with, and the longest run held back
+# between stream chunks
+_TRAILING_RUN = re.compile(r'[\d .\-+]*\Z')
+_MAX_CARRY = 64
+
+# Province codes: the first two digits of a NIK
+_NIK_PROVINCES = frozenset(
+    [11, 12, 13, 14, 15, 16, 17, 18, 19, 21, 31, 32, 33, 34, 35, 36,
+     51, 52, 53, 61, 62, 63, 64, 65, 71, 72, 73, 74, 75, 76, 81, 82,
+     91, 92, 93, 94, 95, 96]
+)
+
+_NPWP_LAYOUT = re.compile(r'\d{2}\.\d{3}\.\d{3}\.\d-\d{3}\.\d{3}')
+
+# Third digit of an 08xx mobile number (0811 Telkomsel ... 0899 Tri)
+_MOBILE_OPERATORS = frozenset("1235789")
+
+# Issuer prefixes and card lengths: Visa, Mastercard, American Express,
+# Discover, JCB. Only Amex numbers have 15 digits, the length of IMEIs,
+# which also carry a Luhn check digit
+_CARD_ISSUERS = (
+    (("4",), (13, 16, 19)),
+    (("51", "52", "53", "54", "55", "2"), (16,)),
+    (("34", "37"), (15,)),
+    (("6011", "65"), (16, 17, 18, 19)),
+    (("35",), (16, 17, 18, 19)),
+)
+
+
+# Words standing in for redacted findings, in the sanitizer's register
+PII_REPLACEMENTS = {
+    PII_NIK: "ID number",
+    PII_NPWP: "tax ID",
+    PII_PHONE: "phone",
+    PII_CARD: "card number",
+}
+
+
+class PiiFinding(NamedTuple):
+    """Typed personal data found in a text; the value itself is not kept."""
+    type: str
+    start: int
+    end: int
+
+
+def luhn_valid(digits: str) -> bool:
+    """
+    Check the Luhn checksum of a digit string.
+    
+    Args:
+        digits: Digits only
+        
+    Returns:
+        True if the checksum holds
+    """
+    total = 0
+    for index, char in enumerate(reversed(digits)):
+        digit = ord(char) - 48
+        if index % 2:
+            digit *= 2
+            if digit > 9:
+                digit -= 9
+        total += digit
+    return total % 10 == 0
+
+
+def is_nik(run: str, digits: str) -> bool:
+    """NIK: province, regency and district codes, birth date, serial."""
+    if run[0] == "+" or int(digits[:2]) not in _NIK_PROVINCES:
+        return False
+    if digits[2:4] == "00" or digits[4:6] == "00":
+        return False
+    # Women add 40 to the day of birth
+    day = int(digits[6:8])
+    month = int(digits[8:10])
+    return (1 <= day <= 31 or 41 <= day <= 71) and 1 <= month <= 12 and digits[12:] != "0000"
+
+
+def is_npwp(run: str, digits: str) -> bool:
+    """NPWP: 15 digits in the 99.999.999.9-999.999 layout."""
+    # Plain 15-digit runs are far more often IMEIs or order numbers
+    return _NPWP_LAYOUT.fullmatch(run) is not None
+
+
+def is_phone(run: str, digits: str) -> bool:
+    """Indonesian mobile number: 08xx, 628xx or +628xx."""
+    if digits.startswith("08"):
+        return run[0] != "+" and 10 <= len(digits) <= 13 and digits[2] in _MOBILE_OPERATORS
+    if digits.startswith("628"):
+        return 11 <= len(digits) <= 14 and digits[3] in _MOBILE_OPERATORS
+    return False
+
+
+def is_card(run: str, digits: str) -> bool:
+    """Payment card: known issuer prefix and length, and a valid Luhn checksum."""
+    if run[0] == "+":
+        return False
+    for prefixes, lengths in _CARD_ISSUERS:
+        if digits.startswith(prefixes):
+            return len(digits) in lengths and luhn_valid(digits)
+    return False
+
+
+# Validators by type, and the digit counts each type can have
+VALIDATORS: Dict[str, Tuple[Callable[[str, str], bool], range]] = {
+    PII_NIK: (is_nik, range(16, 17)),
+    PII_NPWP: (is_npwp, range(15, 16)),
+    PII_PHONE: (is_phone, range(10, 15)),
+    PII_CARD: (is_card, range(13, 20)),
+}
+
+
+class PiiDetector:
+    """
+    Compiled pipeline of numeric personal data validators.
+    
+    Validators are grouped by the digit counts they accept, so a run is
+    only checked by the validators for its length, in PII_TYPES order.
+    """
+    
+    def __init__(self, types: Sequence[str] = PII_TYPES):
+        """
+        Compile the pipeline.
+        
+        Args:
+            types: PII types to detect, in priority order for runs that
+                several types accept
+                
+        Raises:
+            ValueError: If a type is unknown
+        """
+        unknown = set(types) - set(VALIDATORS)
+        if unknown:
+            raise ValueError(f"Unknown PII types: {', '.join(sorted(unknown))}")
+        
+        self.types = tuple(types)
+        self._by_length: Dict[int, List[Tuple[str, Callable[[str, str], bool]]]] = {}
+        for pii_type in self.types:
+            validator, lengths = VALIDATORS[pii_type]
+            for length in lengths:
+                self._by_length.setdefault(length, []).append((pii_type, validator))
+    
+    def _classify(self, run: str) -> str:
+        """Type of a digit run, or an empty string."""
+        digits = run.translate(_SEPARATORS)
+        for pii_type, validator in self._by_length.get(len(digits), ()):
+            if validator(run, digits):
+                return pii_type
+        return ""
+    
+    def detect(self, text: str) -> List[PiiFinding]:
+        """
+        Find numeric personal data in a text.
+        
+        A run with spaces that is no known type as a whole is retried one
+        space-separated part at a time, so a NIK followed by another number
+        is still found.
+        
+        Args:
+            text: Text to scan
+            
+        Returns:
+            Findings in order of position
+        """
+        return list(self._iter_findings(text))
+    
+    def has_findings(self, text: str) -> bool:
+        """
+        Tell whether a text contains any numeric personal data.
+        
+        Args:
+            text: Text to scan
+            
+        Returns:
+            True if anything is found
+        """
+        for _ in self._iter_findings(text):
+            return True
+        return False
+    
+    def _iter_findings(self, text: str) -> Iterator[PiiFinding]:
+        """Lazily yield the findings of detect."""
+        classify = self._classify
+        for match in _DIGIT_RUN.finditer(text):
+            run = match.group()
+            pii_type = classify(run)
+            if pii_type:
+                yield PiiFinding(pii_type, match.start(), match.end())
+            elif " " in run:
+                offset = match.start()
+                for word in _WORD.finditer(run):
+                    pii_type = classify(word.group())
+                    if pii_type:
+                        yield PiiFinding(pii_type, offset + word.start(), offset + word.end())
+
+
+class PiiStreamScanner:
+    """
+    Numeric personal data detection over text delivered in chunks.
+    
+    A digit run at the end of a chunk may go on in the next one, so it is
+    held back until a character that cannot extend it arrives, or the
+    stream ends. Runs longer than 64 characters are checked in pieces.
+    """
+    
+    def __init__(self, detector: PiiDetector):
+        """
+        Initialize the scanner at the start of a stream.
+        
+        Args:
+            detector: Detector to classify the runs with
+        """
+        self._detector = detector
+        self._carry = ""   # Held back end of the text so far
+        self._before = ""  # Character preceding the carry, for boundaries
+        self.offset = 0    # Stream offset of the carry
+    
+    def feed(self, chunk: str) -> List[PiiFinding]:
+        """
+        Scan the next chunk of the stream.
+        
+        Args:
+            chunk: Next piece of text
+            
+        Returns:
+            Findings that are complete, with absolute positions
+        """
+        text = self._carry + chunk
+        cut = max(_TRAILING_RUN.search(text).start(), len(text) - _MAX_CARRY)
+        findings = self._detect(text[:cut])
+        if cut:
+            self._before = text[cut - 1]
+        self.offset += cut
+        self._carry = text[cut:]
+        return findings
+    
+    def finish(self) -> List[PiiFinding]:
+        """
+        Scan the text held back at the end of the stream.
+        
+        Returns:
+            Findings in the remaining text
+        """
+        findings = self._detect(self._carry)
+        self.offset += len(self._carry)
+        self._carry = ""
+        return findings
+    
+    def _detect(self, text: str) -> List[PiiFinding]:
+        """Findings in text starting at self.offset."""
+        if not text:
+            return []
+        shift = self.offset - len(self._before)
+        return [
+            PiiFinding(finding.type, finding.start + shift, finding.end + shift)
+            for finding in self._detector.detect(self._before + text)
+            if finding.start >= len(self._before)
+        ]
+
+
+def redact_findings(text: str, findings: Iterable[Dict[str, Any]]) -> str:
+    """
+    Replace formatted PII findings in a text by their type's placeholder.
+    
+    Args:
+        text: Text the findings were detected in
+        findings: Findings with "type", "position" and "end", as reported
+            by PromptChecker
+            
+    Returns:
+        Text with every finding replaced
+    """
+    parts = []
+    last = 0
+    for finding in sorted(findings, key=lambda finding: finding["position"]):
+        if finding["position"] < last:
+            continue
+        parts.append(text[last:finding["position"]])
+        parts.append(PII_REPLACEMENTS[finding["type"]])
+        last = finding["end"]
+    parts.append(text[last:])
+    return "".join(parts)
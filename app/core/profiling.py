@@ -0,0 +1,281 @@
+"""
+Opt-in request profiling with a ring buffer of slow requests.
+
+With ``PROFILING`` set to ``all`` (every request) or ``header`` (requests
+sending ``X-Profile: 1``), the checker methods, the sanitizer and the
+Ollama calls record timing spans into the profile of the request being
+served. Requests slower than ``SLOW_REQUEST_SECONDS``, and every request
+that asked for profiling by header, are kept with their stage breakdown
+and input sizes in a ring buffer served by the admin endpoint, which
+requires ``PROFILING_TOKEN``. Prompt text is never stored.
+
+With ``PROFILING=off`` (the default) ``profiled`` returns the functions
+unchanged and no middleware is installed, so profiling costs nothing.
+"""
+import functools
+import inspect
+import os
+import threading
+import time
+from collections import deque
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, List, NamedTuple, Optional
+
+
+PROFILING_MODES = ("off", "header", "all")
+
+# Which requests are profiled: none, those sending PROFILE_HEADER, or all
+PROFILING = os.getenv("PROFILING", "off").lower()
+PROFILE_HEADER = "X-Profile"
+
+# Requests at least this slow are kept, as are all header-requested profiles
+SLOW_REQUEST_SECONDS = float(os.getenv("SLOW_REQUEST_SECONDS", "0.5"))
+
+# Number of slow requests kept; older ones are dropped first
+SLOW_REQUEST_BUFFER = int(os.getenv("SLOW_REQUEST_BUFFER", "100"))
+
+# Bearer token required by the slow request endpoints, which are only
+# served when profiling is enabled and this is set
+PROFILING_TOKEN = os.getenv("PROFILING_TOKEN", "")
+
+# Spans kept per request; later ones still count towards the stage totals
+MAX_SPANS = 256
+
+if PROFILING not in PROFILING_MODES:
+    raise ValueError(f"PROFILING must be one of: {', '.join(PROFILING_MODES)}")
+
+
+class Span(NamedTuple):
+    """One timed stage of a request."""
+    stage: str
+    start: float    # Seconds since the request started
+    seconds: float
+    size: int       # Characters of input handled by the stage, if known
+
+
+class RequestProfile:
+    """Spans collected while one request is served."""
+    
+    def __init__(self, method: str, path: str, forced: bool = False):
+        """
+        Start a profile.
+        
+        Args:
+            method: HTTP method
+            path: Request path, without the query string
+            forced: Whether the client asked for profiling by header
+        """
+        self.method = method
+        self.path = path
+        self.forced = forced
+        self.started_at = time.time()
+        self.started = time.perf_counter()
+        self.spans: List[Span] = []
+        self.stages: Dict[str, float] = {}
+        self.dropped_spans = 0
+        self.request_bytes = 0
+        self.response_bytes = 0
+        self.status = 0
+    
+    def add(self, stage: str, started: float, seconds: float, size: int = 0) -> None:
+        """Record a span that started at perf_counter value started."""
+        self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+        if len(self.spans) < MAX_SPANS:
+            # list.append is atomic, so threadpool work can report too
+            self.spans.append(Span(stage, started - self.started, seconds, size))
+        else:
+            self.dropped_spans += 1
+    
+    def summary(self, seconds: float) -> Dict[str, Any]:
+        """
+        Describe the finished request.
+        
+        Args:
+            seconds: Total request duration
+            
+        Returns:
+            Request line, status, sizes, total seconds per stage and the
+            spans in order of start
+        """
+        return {
+            "method": self.method,
+            "path": self.path,
+            "status": self.status,
+            "started_at": self.started_at,
+            "seconds": seconds,
+            "request_bytes": self.request_bytes,
+            "response_bytes": self.response_bytes,
+            "stages": dict(self.stages),
+            "spans": [span._asdict() for span in sorted(self.spans, key=lambda span: span.start)],
+            "dropped_spans": self.dropped_spans,
+        }
+
+
+_current: ContextVar[Optional[RequestProfile]] = ContextVar("secureprompt_profile", default=None)
+
+
+def current_profile() -> Optional[RequestProfile]:
+    """Profile of the request being served, if it is profiled."""
+    return _current.get()
+
+
+def profiled(stage: str, size: Optional[Callable[..., int]] = None) -> Callable[[Callable], Callable]:
+    """
+    Decorate a function to record a span in the current request profile.
+    
+    Works on plain functions, coroutine functions and async generators,
+    whose span lasts until the generator is exhausted or closed. With
+    profiling off, the function is returned undecorated.
+    
+    Args:
+        stage: Stage name of the span
+        size: Optional function of the call arguments giving the input size
+        
+    Returns:
+        Decorator
+    """
+    def decorate(func: Callable) -> Callable:
+        if PROFILING == "off":
+            return func
+        
+        def measure(profile: RequestProfile, started: float, args: tuple, kwargs: dict):
+            profile.add(stage, started, time.perf_counter() - started,
+                        size(*args, **kwargs) if size else 0)
+        
+        if inspect.isasyncgenfunction(func):
+            @functools.wraps(func)
+            async def async_gen_wrapper(*args, **kwargs):
+                profile = _current.get()
+                started = time.perf_counter()
+                try:
+                    async for item in func(*args, **kwargs):
+                        yield item
+                finally:
+                    if profile is not None:
+                        measure(profile, started, args, kwargs)
+            return async_gen_wrapper
+        
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                profile = _current.get()
+                if profile is None:
+                    return await func(*args, **kwargs)
+                started = time.perf_counter()
+                try:
+                    return await func(*args, **kwargs)
+                finally:
+                    measure(profile, started, args, kwargs)
+            return async_wrapper
+        
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            profile = _current.get()
+            if profile is None:
+                return func(*args, **kwargs)
+            started = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                measure(profile, started, args, kwargs)
+        return wrapper
+    
+    return decorate
+
+
+class SlowRequestLog:
+    """Ring buffer of the most recent slow request summaries."""
+    
+    def __init__(self, capacity: int = SLOW_REQUEST_BUFFER):
+        """
+        Initialize an empty log.
+        
+        Args:
+            capacity: Number of summaries kept
+        """
+        self._entries: deque = deque(maxlen=capacity)
+        self._lock = threading.Lock()
+        self.recorded = 0
+    
+    def add(self, summary: Dict[str, Any]) -> None:
+        """Keep a request summary, dropping the oldest one when full."""
+        with self._lock:
+            self._entries.append(summary)
+            self.recorded += 1
+    
+    def entries(self) -> List[Dict[str, Any]]:
+        """Kept summaries, newest first."""
+        with self._lock:
+            return list(reversed(self._entries))
+    
+    def clear(self) -> None:
+        """Drop every kept summary."""
+        with self._lock:
+            self._entries.clear()
+
+
+class ProfilingMiddleware:
+    """
+    ASGI middleware profiling requests and logging the slow ones.
+    
+    The profile is bound to the request's context, so spans recorded by
+    the handler, by threadpool work it starts and while its response
+    streams all land in it.
+    """
+    
+    def __init__(self, app: Callable, log: SlowRequestLog, mode: str = PROFILING,
+                 threshold: float = SLOW_REQUEST_SECONDS):
+        """
+        Wrap an application.
+        
+        Args:
+            app: ASGI application
+            log: Log receiving the slow request summaries
+            mode: "all" or "header" (see PROFILING)
+            threshold: Duration in seconds from which a request is logged
+        """
+        self.app = app
+        self.log = log
+        self.mode = mode
+        self.threshold = threshold
+        self._header = PROFILE_HEADER.lower().encode("latin-1")
+    
+    async def __call__(self, scope: Dict[str, Any], receive: Callable, send: Callable) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        
+        forced = any(
+            name == self._header and value.strip() in (b"1", b"true")
+            for name, value in scope.get("headers", ())
+        )
+        if self.mode != "all" and not forced:
+            await self.app(scope, receive, send)
+            return
+        
+        profile = RequestProfile(scope["method"], scope["path"], forced)
+        
+        async def receive_counted() -> Dict[str, Any]:
+            message = await receive()
+            profile.request_bytes += len(message.get("body", b""))
+            return message
+        
+        async def send_counted(message: Dict[str, Any]) -> None:
+            if message["type"] == "http.response.start":
+                profile.status = message["status"]
+            elif message["type"] == "http.response.body":
+                profile.response_bytes += len(message.get("body", b""))
+            await send(message)
+        
+        token = _current.set(profile)
+        try:
+            await self.app(scope, receive_counted, send_counted)
+        finally:
+            _current.reset(token)
+            seconds = time.perf_counter() - profile.started
+            if forced or seconds >= self.threshold:
+                self.log.add(profile.summary(seconds))
+
+
+# Global instance for use in API
+slow_request_log = SlowRequestLog(SLOW_REQUEST_BUFFER)
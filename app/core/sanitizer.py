@@ -0,0 +1,165 @@
+"""
+Single-pass sanitizer for sensitive values in prompts.
+
+All sanitization rules are compiled once into one alternation pattern and
+applied in a single left-to-right pass that writes into one output buffer,
+instead of one ``re.sub`` and ``str.replace`` pass (and one copy of the
+prompt) per rule.
+"""
+import re
+from typing import List, NamedTuple, Optional, Sequence, Tuple
+
+
+# (pattern, replacement) pairs, case insensitive; earlier rules win when
+# several rules could match at the same position
+DEFAULT_SANITIZATION_RULES: List[Tuple[str, str]] = [
+    # Indonesian ID patterns
+    (r'\b(?:NIK|nik)\s*[:\s]*\d+', 'ID'),
+    (r'\b(?:NIM|nim)\s*[:\s]*\d+', 'student ID'),
+    (r'\b(?:NISN|nisn)\s*[:\s]*\d+', 'student number'),
+    (r'\b(?:KTP|ktp)\s*[:\s]*\d+', 'ID card'),
+    
+    # Phone patterns
+    (r'\b(?:Phone|phone|Telepon|telepon|HP|hp)\s*[:\s]*\d+', 'phone'),
+    (r'\b08\d{8,11}', 'phone'),
+    (r'\b\+62\d{8,11}', 'phone'),
+    
+    # Email patterns
+    (r'\b[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}', 'email'),
+    
+    # Any remaining long numbers that might be IDs
+    (r'\b\d{10,16}\b', 'ID number'),
+]
+
+# Tried again right after every rule match. The rules used to run one after
+# another, so the email rule also saw earlier replacements, and an email
+# glued to a phone number or ID value ("081234567890john@x.com") was still
+# redacted; without this it would be left behind the phone replacement
+DEFAULT_SUFFIX_RULE: Tuple[str, str] = (r'[a-zA-Z0-9._%+-]*@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}', 'email')
+
+# Every match of the default rules contains a digit or an "@"
+DEFAULT_RULE_TRIGGER = r'[\d@]'
+
+# Case-sensitive ID labels renamed to "ID" when followed by ":" or whitespace
+DEFAULT_ID_LABELS = ['NIK', 'NIM', 'NISN', 'KTP', 'nik', 'nim', 'nisn', 'ktp']
+
+
+class SanitizeResult(NamedTuple):
+    """Sanitized text and the replacements applied to the original."""
+    text: str
+    spans: List[Tuple[int, int, str]]  # (start, end, replacement) in the input
+
+
+class Sanitizer:
+    """Compiled sanitization rules applied in one pass."""
+    
+    def __init__(self, rules: Sequence[Tuple[str, str]] = DEFAULT_SANITIZATION_RULES,
+                 id_labels: Sequence[str] = DEFAULT_ID_LABELS,
+                 trigger: Optional[str] = DEFAULT_RULE_TRIGGER,
+                 suffix_rule: Optional[Tuple[str, str]] = DEFAULT_SUFFIX_RULE):
+        """
+        Compile the rules into a single pattern.
+        
+        Args:
+            rules: (regex, replacement) pairs, in priority order
+            id_labels: Labels replaced by "ID" when followed by ":" or
+                whitespace, matched case-sensitively
+            trigger: Optional regex for a character that every rule match
+                contains; text without it skips the rules entirely
+            suffix_rule: Optional (regex, replacement) tried where a rule
+                match ends; when it matches there, the rule match and its
+                continuation are replaced together by its replacement
+        """
+        # Named groups tell which rule matched, even if a rule has groups.
+        # Consecutive rules starting with \b share one boundary check, so
+        # positions inside words are rejected before trying each rule.
+        alternatives = []
+        bounded = []
+        self._replacements = {}
+        for index, (pattern, replacement) in enumerate(rules):
+            self._replacements[f"r{index}"] = replacement
+            if pattern.startswith(r"\b"):
+                bounded.append(f"(?P<r{index}>{pattern[2:]})")
+                continue
+            if bounded:
+                alternatives.append(r"\b(?:" + "|".join(bounded) + ")")
+                bounded = []
+            alternatives.append(f"(?P<r{index}>{pattern})")
+        if bounded:
+            alternatives.append(r"\b(?:" + "|".join(bounded) + ")")
+        
+        # Label and whitespace handling applies to every text
+        always = []
+        if id_labels:
+            labels = "|".join(
+                re.escape(label) for label in sorted(id_labels, key=len, reverse=True)
+            )
+            always.append(f"(?P<label>(?-i:{labels})(?=[:\\s]))")
+            self._replacements["label"] = "ID"
+        
+        # Whitespace runs collapse to one space; a lone space is left alone
+        # so ordinary text produces no matches at all
+        always.append(r"(?P<space>\s{2,}|[^\S ])")
+        self._replacements["space"] = " "
+        
+        self._pattern = re.compile("|".join(alternatives + always), re.IGNORECASE)
+        self._base_pattern = re.compile("|".join(always))
+        self._trigger = re.compile(trigger) if trigger else None
+        self._suffix = None
+        if suffix_rule is not None:
+            self._suffix = (re.compile(suffix_rule[0], re.IGNORECASE), suffix_rule[1])
+    
+    def sanitize(self, text: str) -> SanitizeResult:
+        """
+        Replace sensitive values, collapse whitespace and trim the text.
+        
+        Args:
+            text: Text to sanitize
+            
+        Returns:
+            SanitizeResult with the new text and the replaced spans
+        """
+        start = len(text) - len(text.lstrip())
+        end = len(text.rstrip())
+        if start >= end:
+            return SanitizeResult("", [])
+        
+        replacements = self._replacements
+        output: List[str] = []
+        spans: List[Tuple[int, int, str]] = []
+        position = start
+        
+        pattern = self._pattern
+        if self._trigger is not None and not self._trigger.search(text, start, end):
+            pattern = self._base_pattern
+        
+        suffix = self._suffix
+        search_from = start
+        while search_from <= end:
+            match = pattern.search(text, search_from, end)
+            if match is None:
+                break
+            rule = match.lastgroup
+            match_start, match_end = match.span()
+            replacement = replacements[rule]
+            if suffix is not None and rule[0] == "r":
+                continuation = suffix[0].match(text, match_end, end)
+                if continuation is not None:
+                    match_end = continuation.end()
+                    replacement = suffix[1]
+            output.append(text[position:match_start])
+            output.append(replacement)
+            if rule != "space":
+                spans.append((match_start, match_end, replacement))
+            position = match_end
+            search_from = match_end if match_end > match_start else match_end + 1
+        
+        if not output:
+            return SanitizeResult(text[start:end], spans)
+        
+        output.append(text[position:end])
+        return SanitizeResult("".join(output), spans)
+
+
+# Shared instance compiled at import time
+default_sanitizer = Sanitizer()
@@ -0,0 +1,232 @@
+"""
+Binary snapshot format for compiled Aho-Corasick automata.
+
+A snapshot stores the compiled tables of an ``AhoCorasick`` instance so a
+process can load them with ``mmap`` instead of rebuilding the automaton.
+The tables are used in place, which keeps startup time independent of the
+keyword list size and lets forked workers share the pages through the OS
+page cache.
+
+Layout (all integers little-endian):
+
+    header   magic, format version, state count, start row, fingerprint of
+             the keyword set
+    sections (offset, length) pairs for each table below, 8-byte aligned
+             transitions, pattern IDs, output links: int32 arrays
+             char classes: (codepoint, class) int32 pairs
+             patterns: UTF-8 text, one pattern per NUL-separated entry
+             boundaries: int32 boundary mode per pattern ID
+             depths: int32 trie depth per state
+"""
+import mmap
+import os
+import struct
+import sys
+from array import array
+from typing import List, Optional
+
+from .aho_corasick import AhoCorasick
+
+
+MAGIC = b"SPAC"
+FORMAT_VERSION = 4
+
+_HEADER = struct.Struct("<4sIIi40s")
+_SECTION = struct.Struct("<QQ")
+_SECTIONS = ("transitions", "pattern_ids", "output_links", "char_classes", "patterns",
+             "boundaries", "depths")
+_ALIGNMENT = 8
+
+
+class SnapshotError(ValueError):
+    """Raised when a snapshot file is missing, corrupt or incompatible."""
+
+
+def _int_table(section: memoryview):
+    """View a little-endian int32 section as an integer sequence."""
+    if sys.byteorder == "little":
+        return section.cast("i")
+    # Big-endian hosts cannot use the mapping in place
+    table = array('i', section.tobytes())
+    table.byteswap()
+    return table
+
+
+def _int32_bytes(values) -> bytes:
+    """Encode an integer sequence as little-endian int32."""
+    table = array('i', values)
+    if sys.byteorder != "little":
+        table.byteswap()
+    return table.tobytes()
+
+
+def save_snapshot(automaton: AhoCorasick, path: str) -> None:
+    """
+    Write a compiled automaton to a snapshot file.
+    
+    The file is written to a temporary name and renamed into place, so
+    readers never observe a partially written snapshot.
+    
+    Args:
+        automaton: Compiled automaton to store
+        path: Destination file path
+    """
+    if any("\0" in pattern for pattern in automaton.patterns):
+        raise SnapshotError("Patterns containing NUL characters cannot be stored")
+    
+    class_pairs = []
+    for char, class_id in automaton._char_classes.items():
+        class_pairs.extend((ord(char), class_id))
+    
+    payloads = [
+        _int32_bytes(automaton._delta),
+        _int32_bytes(automaton._pattern_ids),
+        _int32_bytes(automaton._out_links),
+        _int32_bytes(class_pairs),
+        "\0".join(automaton.patterns).encode("utf-8"),
+        _int32_bytes(automaton._boundaries),
+        _int32_bytes(automaton._depths),
+    ]
+    
+    offset = _HEADER.size + _SECTION.size * len(_SECTIONS)
+    sections = []
+    for payload in payloads:
+        offset += -offset % _ALIGNMENT
+        sections.append((offset, len(payload)))
+        offset += len(payload)
+    
+    header = _HEADER.pack(
+        MAGIC,
+        FORMAT_VERSION,
+        automaton.state_count,
+        automaton._start,
+        automaton.fingerprint.encode("ascii"),
+    )
+    
+    temp_path = f"{path}.tmp{os.getpid()}"
+    try:
+        with open(temp_path, "wb") as handle:
+            handle.write(header)
+            for section in sections:
+                handle.write(_SECTION.pack(*section))
+            for (section_offset, _), payload in zip(sections, payloads):
+                handle.write(b"\0" * (section_offset - handle.tell()))
+                handle.write(payload)
+        os.replace(temp_path, path)
+    except OSError:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+
+def _unpack_header(header: bytes):
+    """Validate and unpack a snapshot header."""
+    if len(header) < _HEADER.size:
+        raise SnapshotError("Snapshot file is truncated")
+    magic, version, state_count, start, fingerprint = _HEADER.unpack_from(header)
+    if magic != MAGIC:
+        raise SnapshotError("Not an automaton snapshot file")
+    if version != FORMAT_VERSION:
+        raise SnapshotError(
+            f"Unsupported snapshot version {version} (expected {FORMAT_VERSION})"
+        )
+    return state_count, start, fingerprint.decode("ascii")
+
+
+def load_snapshot(path: str, expected_fingerprint: Optional[str] = None) -> AhoCorasick:
+    """
+    Memory-map a snapshot file and return the automaton it contains.
+    
+    The transition, pattern ID, output link and depth tables are zero-copy
+    views over the mapping; only the small character class map and the
+    pattern list are materialized.
+    
+    Args:
+        path: Snapshot file path
+        expected_fingerprint: Reject the snapshot unless it was built from
+            the keyword set with this fingerprint
+            
+    Returns:
+        AhoCorasick instance backed by the mapped file
+        
+    Raises:
+        SnapshotError: If the file cannot be mapped, or is not a complete
+            snapshot of the expected keyword set
+    """
+    try:
+        with open(path, "rb") as handle:
+            mapping = mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError) as e:
+        raise SnapshotError(f"Cannot map snapshot {path}: {e}") from e
+    
+    state_count, start, fingerprint = _unpack_header(mapping)
+    if expected_fingerprint is not None and fingerprint != expected_fingerprint:
+        raise SnapshotError("Snapshot was built from a different keyword set")
+    
+    view = memoryview(mapping)
+    tables = {}
+    for index, name in enumerate(_SECTIONS):
+        offset, length = _SECTION.unpack_from(
+            mapping, _HEADER.size + index * _SECTION.size
+        )
+        if offset + length > len(mapping):
+            raise SnapshotError(f"Snapshot section {name} is truncated")
+        if name != "patterns" and length % 4:
+            raise SnapshotError(f"Snapshot section {name} is not an int32 table")
+        tables[name] = view[offset:offset + length]
+    
+    # A corrupt table would only fail later, while scanning a request
+    pattern_ids = _int_table(tables["pattern_ids"])
+    output_links = _int_table(tables["output_links"])
+    depths = _int_table(tables["depths"])
+    if not len(pattern_ids) == len(output_links) == len(depths) == state_count:
+        raise SnapshotError("Snapshot state count does not match its tables")
+    
+    class_pairs = _int_table(tables["char_classes"])
+    if len(class_pairs) % 2:
+        raise SnapshotError("Snapshot character class table is truncated")
+    char_classes = {
+        chr(class_pairs[i]): class_pairs[i + 1]
+        for i in range(0, len(class_pairs), 2)
+    }
+    width = len(set(char_classes.values())) + 1
+    transitions = _int_table(tables["transitions"])
+    if len(transitions) != state_count * width or not 0 <= start < len(transitions):
+        raise SnapshotError("Snapshot transition table does not match its state count")
+    
+    # The boundary table has one entry per pattern, so it tells an empty
+    # pattern list from a list holding one removed ("") pattern
+    try:
+        pattern_blob = bytes(tables["patterns"]).decode("utf-8")
+    except UnicodeDecodeError as e:
+        raise SnapshotError(f"Snapshot patterns are not valid UTF-8: {e}") from e
+    boundaries = _int_table(tables["boundaries"])
+    patterns: List[str] = pattern_blob.split("\0") if len(boundaries) else []
+    if len(boundaries) != len(patterns) or (pattern_blob and not patterns):
+        raise SnapshotError("Snapshot boundary table does not match its patterns")
+    
+    return AhoCorasick.from_tables(
+        patterns,
+        char_classes,
+        transitions,
+        pattern_ids,
+        output_links,
+        start,
+        boundaries,
+        depths,
+    )
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 2:
+        print("Usage: python -m app.core.snapshot OUTPUT_PATH")
+        sys.exit(1)
+    
+    # The checker builds its global instance on import, from the same
+    # keyword files and boundaries the application uses; keep it from
+    # loading or writing a snapshot of its own meanwhile
+    os.environ.pop("AUTOMATON_SNAPSHOT", None)
+    from .checker import prompt_checker
+    
+    save_snapshot(prompt_checker.aho_corasick, sys.argv[1])
+    print(f"Snapshot written to {sys.argv[1]} ({len(prompt_checker.sensitive_keywords)} keywords)")
@@ -0,0 +1,287 @@
+"""
+Per-tenant keyword sets for deployments serving several Moodle instances.
+
+A tenant sees the base keyword list plus its own overlay of extra keywords,
+or only its own keywords when it does not inherit the base list. Tenants
+whose keyword sets come out identical share one PromptChecker, and so one
+compiled automaton. When the shared automata outgrow the memory budget, the
+least recently used ones are dropped and rebuilt (or mapped again from a
+snapshot) on their next request.
+
+The tenant list is a JSON file named by ``TENANTS_FILE``::
+
+    {
+        "campus-a": {"api_keys": ["sk-campus-a"], "keywords": ["nilai ujian"]},
+        "campus-b": {"keyword_files": ["keywords/campus-b.txt"], "inherit": false}
+    }
+"""
+import json
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+from .aho_corasick import pattern_fingerprint
+from .checker import PromptChecker, keyword_boundaries, prompt_checker
+from .keywords import read_keyword_file
+
+
+# JSON file describing the tenants; without it every request uses the base set
+TENANTS_FILE = os.getenv("TENANTS_FILE")
+
+# Request header naming the tenant; a known API key also selects its tenant
+TENANT_HEADER = os.getenv("TENANT_HEADER", "X-Tenant-ID")
+
+# Upper bound for the summed size of the tenant automata, in bytes
+TENANT_MEMORY_BUDGET = int(os.getenv("TENANT_MEMORY_BUDGET", str(256 * 1024 * 1024)))
+
+# Optional directory of per-keyword-set snapshots, so evicted automata are
+# memory-mapped again instead of rebuilt
+TENANT_SNAPSHOT_DIR = os.getenv("TENANT_SNAPSHOT_DIR")
+
+
+class UnknownTenantError(LookupError):
+    """Raised for a tenant name that is not configured."""
+
+
+class TenantConfig(NamedTuple):
+    """Keywords and credentials of one tenant."""
+    keywords: Sequence[str] = ()       # Overlay added to the base keywords
+    keyword_files: Sequence[str] = ()  # Files read for more overlay keywords
+    inherit: bool = True               # Whether the base keywords apply
+    api_keys: Sequence[str] = ()       # API keys that select this tenant
+
+
+def load_tenant_configs(path: str) -> Dict[str, TenantConfig]:
+    """
+    Read the tenant list from a JSON file.
+    
+    Args:
+        path: JSON file mapping tenant names to their settings
+        
+    Returns:
+        Configuration of each tenant
+        
+    Raises:
+        OSError: If the file cannot be read
+        ValueError: If the file is not a JSON object of tenant settings
+    """
+    with open(path, encoding="utf-8") as handle:
+        data = json.load(handle)
+    if not isinstance(data, dict):
+        raise ValueError(f"{path}: expected an object of tenants")
+    
+    configs = {}
+    for name, settings in data.items():
+        if not isinstance(settings, dict):
+            raise ValueError(f"{path}: settings of tenant {name!r} must be an object")
+        configs[name] = TenantConfig(
+            keywords=list(settings.get("keywords", [])),
+            keyword_files=list(settings.get("keyword_files", [])),
+            inherit=bool(settings.get("inherit", True)),
+            api_keys=list(settings.get("api_keys", [])),
+        )
+    return configs
+
+
+class _SharedChecker(NamedTuple):
+    """Checker shared by every tenant with the same keyword set."""
+    checker: PromptChecker
+    size: int  # Bytes held by its automaton
+
+
+class TenantRegistry:
+    """
+    PromptChecker per tenant, shared between identical keyword sets.
+    
+    Checkers are built on a tenant's first request, outside the registry
+    lock, so building one tenant never stalls the others. Overlay keyword
+    files are read at that point. A change of the base keyword set drops
+    every tenant checker, and each is rebuilt on its next request.
+    """
+    
+    def __init__(self, base: PromptChecker, tenants: Dict[str, TenantConfig],
+                 memory_budget: int = TENANT_MEMORY_BUDGET,
+                 snapshot_dir: Optional[str] = None):
+        """
+        Initialize the registry.
+        
+        Args:
+            base: Checker holding the base keywords, used for requests
+                without a tenant; its result cache is shared by all tenants
+            tenants: Configuration of each tenant
+            memory_budget: Upper bound for the summed size of the tenant
+                automata in bytes; the base automaton is not counted
+            snapshot_dir: Optional directory for per-keyword-set snapshots
+        """
+        self.base = base
+        self.tenants = dict(tenants)
+        self.memory_budget = memory_budget
+        self.snapshot_dir = snapshot_dir
+        self._api_keys = {
+            key: name for name, config in self.tenants.items() for key in config.api_keys
+        }
+        self._lock = threading.Lock()
+        self._fingerprints: Dict[str, str] = {}
+        self._shared: "OrderedDict[str, _SharedChecker]" = OrderedDict()
+        self._base_version = base.keyword_set.version
+        self.evictions = 0
+    
+    def resolve(self, tenant: Optional[str] = None, api_key: Optional[str] = None) -> Optional[str]:
+        """
+        Name the tenant of a request.
+        
+        Args:
+            tenant: Tenant named by the request, if any
+            api_key: API key sent with the request, if any
+            
+        Returns:
+            Tenant name, or None for the base keyword set
+            
+        Raises:
+            UnknownTenantError: If the named tenant is not configured
+        """
+        if tenant:
+            if tenant not in self.tenants:
+                raise UnknownTenantError(tenant)
+            return tenant
+        # Keys of no tenant are not an error; authentication is not our job
+        return self._api_keys.get(api_key) if api_key else None
+    
+    def checker_for(self, tenant: Optional[str]) -> PromptChecker:
+        """
+        Return the checker of a tenant, building it if needed.
+        
+        Args:
+            tenant: Tenant name, or None for the base keyword set
+            
+        Returns:
+            Checker with the tenant's keywords
+            
+        Raises:
+            UnknownTenantError: If the tenant is not configured
+        """
+        if tenant is None:
+            return self.base
+        config = self.tenants.get(tenant)
+        if config is None:
+            raise UnknownTenantError(tenant)
+        
+        with self._lock:
+            self._drop_stale()
+            version = self._base_version
+            fingerprint = self._fingerprints.get(tenant)
+            if fingerprint == self.base.aho_corasick.fingerprint:
+                return self.base
+            entry = self._shared.get(fingerprint) if fingerprint else None
+            if entry is not None:
+                self._shared.move_to_end(fingerprint)
+                return entry.checker
+        
+        keywords, boundaries = self._tenant_keywords(config)
+        fingerprint = pattern_fingerprint(keywords, boundaries)
+        if fingerprint == self.base.aho_corasick.fingerprint:
+            checker = self.base
+            entry = None
+        else:
+            with self._lock:
+                entry = self._shared.get(fingerprint)
+            if entry is None:
+                checker = PromptChecker(
+                    keywords, snapshot_path=self._snapshot_path(fingerprint),
+                    cache=self.base.cache, boundaries=boundaries,
+                    pii_detector=self.base.pii_detector
+                )
+                entry = _SharedChecker(checker, checker.aho_corasick.memory_usage()["total"])
+        
+        with self._lock:
+            self._drop_stale()
+            if self._base_version != version:
+                # Built from base keywords that were replaced meanwhile
+                return checker if entry is None else entry.checker
+            self._fingerprints[tenant] = fingerprint
+            if entry is None:
+                return checker
+            # Another request may have built the same set meanwhile
+            entry = self._shared.setdefault(fingerprint, entry)
+            self._shared.move_to_end(fingerprint)
+            self._evict()
+        return entry.checker
+    
+    def _tenant_keywords(self, config: TenantConfig) -> Tuple[List[str], List[int]]:
+        """Keywords and boundary modes of a tenant, base keywords first."""
+        overlay = list(config.keywords)
+        for path in config.keyword_files:
+            overlay.extend(read_keyword_file(path))
+        
+        keywords: List[str] = []
+        boundaries: List[int] = []
+        if config.inherit:
+            keyword_set = self.base.keyword_set
+            keywords.extend(keyword_set.keywords)
+            boundaries.extend(keyword_set.boundaries)
+        inherited = set(keywords)
+        overlay = [keyword for keyword in dict.fromkeys(overlay) if keyword not in inherited]
+        keywords.extend(overlay)
+        boundaries.extend(keyword_boundaries(overlay))
+        return keywords, boundaries
+    
+    def _snapshot_path(self, fingerprint: str) -> Optional[str]:
+        """Snapshot file of a keyword set, when snapshots are enabled."""
+        if not self.snapshot_dir:
+            return None
+        return os.path.join(self.snapshot_dir, f"{fingerprint}.snap")
+    
+    def _drop_stale(self):
+        """Forget every tenant checker once the base keywords changed."""
+        version = self.base.keyword_set.version
+        if version != self._base_version:
+            self._base_version = version
+            self._fingerprints.clear()
+            for entry in self._shared.values():
+                # Requests may still be using it; do not wait for them
+                entry.checker.close(wait=False)
+            self._shared.clear()
+    
+    def _evict(self):
+        """Drop least recently used automata until the budget is met."""
+        total = sum(entry.size for entry in self._shared.values())
+        # The most recent entry is in use by the current request
+        while total > self.memory_budget and len(self._shared) > 1:
+            _, entry = self._shared.popitem(last=False)
+            entry.checker.close(wait=False)
+            total -= entry.size
+            self.evictions += 1
+    
+    def close(self) -> None:
+        """Stop the batch worker processes of the base and tenant checkers."""
+        with self._lock:
+            checkers = [entry.checker for entry in self._shared.values()]
+        for checker in [self.base] + checkers:
+            checker.close()
+    
+    def stats(self) -> Dict[str, Any]:
+        """
+        Report tenant and shared automaton counters.
+        
+        Returns:
+            Dictionary with tenant, automaton and memory counters
+        """
+        with self._lock:
+            return {
+                "tenants": len(self.tenants),
+                "active_tenants": len(self._fingerprints),
+                "automata": len(self._shared),
+                "bytes": sum(entry.size for entry in self._shared.values()),
+                "max_bytes": self.memory_budget,
+                "evictions": self.evictions,
+            }
+
+
+# Global instance for use in API
+tenant_registry = TenantRegistry(
+    prompt_checker,
+    load_tenant_configs(TENANTS_FILE) if TENANTS_FILE else {},
+    TENANT_MEMORY_BUDGET,
+    TENANT_SNAPSHOT_DIR
+)
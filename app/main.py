@@ -2,9 +2,18 @@
 FastAPI application entry point for SecurePrompt.
 """
 import os
-from fastapi import FastAPI
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request, Response
+from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
-from .api import router
+from .api import admin_router, router
+from .core.checker import keyword_reloader
+from .core.profiling import PROFILING, PROFILING_TOKEN, ProfilingMiddleware, slow_request_log
+from .core.tenants import tenant_registry
+from .metrics import (CONTENT_TYPE, MetricsMiddleware, registry, request_duration, requests_total,
+                      upstream_rejections)
+from .scheduler import UpstreamBusyError
+from .upstream import close_client
 
 
 # Get configuration from environment variables
@@ -13,11 +22,29 @@ API_VERSION = os.getenv("API_VERSION", "1.0.0")
 API_DESCRIPTION = os.getenv("API_DESCRIPTION", "A sensitive prompt protection system using Aho-Corasick algorithm")
 ALLOWED_ORIGINS = os.getenv("ALLOWED_ORIGINS", "*").split(",")
 
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Watch keyword files while running; release upstream connections and batch workers on shutdown."""
+    keyword_reloader.start()
+    yield
+    keyword_reloader.stop()
+    await close_client()
+    tenant_registry.close()
+
+
+def add_admin_routes(app: FastAPI) -> None:
+    """Serve the slow request log, which exists only with profiling on and needs a token."""
+    if PROFILING != "off" and PROFILING_TOKEN:
+        app.include_router(admin_router, prefix="/api/v1")
+
+
 # Create FastAPI application
 app = FastAPI(
     title=API_TITLE,
     description=API_DESCRIPTION,
-    version=API_VERSION
+    version=API_VERSION,
+    lifespan=lifespan
 )
 
 # Add CORS middleware
@@ -29,8 +56,33 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Count and time every request, CORS handling included
+app.add_middleware(MetricsMiddleware, requests=requests_total, duration=request_duration)
+
+# Profile requests when enabled; otherwise not even the middleware runs
+if PROFILING != "off":
+    app.add_middleware(ProfilingMiddleware, log=slow_request_log)
+
 # Include API routes
 app.include_router(router, prefix="/api/v1")
+add_admin_routes(app)
+
+
+@app.exception_handler(UpstreamBusyError)
+async def upstream_busy(request: Request, exc: UpstreamBusyError) -> JSONResponse:
+    """Turn a saturated Ollama queue into 429 or 503 with Retry-After."""
+    upstream_rejections.inc((exc.model, exc.reason))
+    return JSONResponse(
+        status_code=exc.status_code,
+        headers={"Retry-After": str(exc.retry_after)},
+        content={
+            "error": {
+                "message": f"{exc}, retry in {exc.retry_after}s",
+                "type": "rate_limit_error" if exc.status_code == 429 else "server_error",
+                "code": exc.reason
+            }
+        }
+    )
 
 
 @app.get("/")
@@ -42,13 +94,23 @@ async def root():
         "version": "1.0.0",
         "endpoints": {
             "check_prompt": "/api/v1/check",
+            "check_batch": "/api/v1/check/batch",
+            "check_stream": "/api/v1/check/stream",
+            "keywords": "/api/v1/keywords",
             "health": "/api/v1/health", 
             "generate": "/api/v1/generate",
-            "chat_completions": "/api/v1/chat/completions"
+            "chat_completions": "/api/v1/chat/completions",
+            "metrics": "/metrics"
         }
     }
 
 
+@app.get("/metrics", include_in_schema=False)
+async def metrics() -> Response:
+    """Prometheus metrics in the text exposition format."""
+    return Response(registry.render(), media_type=CONTENT_TYPE)
+
+
 if __name__ == "__main__":
     import uvicorn
     port = int(os.getenv("PORT", 8000))
@@ -0,0 +1,446 @@
+"""
+Prometheus metrics for SecurePrompt.
+
+Counters and histograms live in plain Python lists guarded by one lock per
+metric, so recording a value on the hot path costs a bisect and a few
+increments. Nothing is formatted until ``/metrics`` is scraped. State that
+already lives elsewhere (automaton size, cache counters) is read at scrape
+time instead of being mirrored on every request.
+
+Exposed in the Prometheus text format, version 0.0.4, so no client library
+is needed.
+"""
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from .core.checker import PromptChecker, prompt_checker
+from .core.tenants import TenantRegistry, tenant_registry
+from .response_cache import ResponseCache, response_cache
+from .scheduler import UpstreamScheduler, upstream_scheduler
+
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Bucket upper bounds in seconds: in-process work, and whole requests
+SCAN_BUCKETS = (0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01,
+                0.025, 0.05, 0.1, 0.25, 1.0)
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                   1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# Endpoint label of requests that match no route
+UNMATCHED = "unmatched"
+
+Labels = Tuple[str, ...]
+
+
+def _format_value(value: float) -> str:
+    """Sample value in exposition format."""
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    """Label set in exposition format, empty without labels."""
+    if not names:
+        return ""
+    pairs = []
+    for name, value in zip(names, values):
+        escaped = str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+        pairs.append(f'{name}="{escaped}"')
+    return "{" + ",".join(pairs) + "}"
+
+
+class Metric:
+    """Named metric family with fixed label names."""
+    
+    type = "untyped"
+    
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        """
+        Initialize the family.
+        
+        Args:
+            name: Metric name
+            documentation: HELP text
+            labelnames: Names of the labels every sample carries
+        """
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+    
+    def samples(self) -> Iterator[Tuple[str, Sequence[str], Sequence[str], float]]:
+        """Yield (name suffix, label names, label values, value) per sample."""
+        return iter(())
+    
+    def render(self) -> List[str]:
+        """Exposition lines of the family."""
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.type}",
+        ]
+        for suffix, names, values, value in self.samples():
+            lines.append(
+                f"{self.name}{suffix}{_format_labels(names, values)} {_format_value(value)}"
+            )
+        return lines
+
+
+class Counter(Metric):
+    """Monotonic counter per label set."""
+    
+    type = "counter"
+    
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        """Initialize the counter at zero; see Metric."""
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Labels, float] = {}
+    
+    def inc(self, labels: Labels = (), amount: float = 1) -> None:
+        """
+        Add to the counter.
+        
+        Args:
+            labels: Label values, in labelnames order
+            amount: Non-negative increment
+        """
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+    
+    def value(self, labels: Labels = ()) -> float:
+        """Current value of a label set."""
+        return self._values.get(labels, 0)
+    
+    def samples(self):
+        """Yield the value of each label set."""
+        with self._lock:
+            values = list(self._values.items())
+        for labels, value in sorted(values):
+            yield "", self.labelnames, labels, value
+
+
+class Histogram(Metric):
+    """Distribution of observed values over fixed buckets, per label set."""
+    
+    type = "histogram"
+    
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        """
+        Initialize the histogram.
+        
+        Args:
+            name: Metric name
+            documentation: HELP text
+            labelnames: Names of the labels every sample carries
+            buckets: Sorted bucket upper bounds; +Inf is implied
+        """
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+        # Per label set: count per bucket (not cumulative), then the sum
+        self._values: Dict[Labels, List[float]] = {}
+    
+    def observe(self, value: float, labels: Labels = ()) -> None:
+        """
+        Record one observation.
+        
+        Args:
+            value: Observed value
+            labels: Label values, in labelnames order
+        """
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            counts = self._values.get(labels)
+            if counts is None:
+                counts = self._values[labels] = [0] * (len(self.buckets) + 2)
+            counts[index] += 1
+            counts[-1] += value
+    
+    def count(self, labels: Labels = ()) -> int:
+        """Number of observations of a label set."""
+        counts = self._values.get(labels)
+        return int(sum(counts[:-1])) if counts else 0
+    
+    def samples(self):
+        """Yield cumulative buckets, sum and count of each label set."""
+        with self._lock:
+            values = [(labels, list(counts)) for labels, counts in self._values.items()]
+        names = self.labelnames + ("le",)
+        for labels, counts in sorted(values):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                yield "_bucket", names, labels + (_format_value(bound),), cumulative
+            yield "_sum", self.labelnames, labels, counts[-1]
+            yield "_count", self.labelnames, labels, cumulative
+
+
+class Gauge(Metric):
+    """Value read from application state when scraped."""
+    
+    type = "gauge"
+    
+    def __init__(self, name: str, documentation: str, read: Callable[[], float],
+                 metric_type: str = "gauge"):
+        """
+        Initialize the gauge.
+        
+        Args:
+            name: Metric name
+            documentation: HELP text
+            read: Returns the current value
+            metric_type: "counter" for values that only grow, such as the
+                hit counter of a cache
+        """
+        super().__init__(name, documentation)
+        self._read = read
+        self.type = metric_type
+    
+    def samples(self):
+        """Yield the current value."""
+        yield "", (), (), self._read()
+
+
+class MetricsRegistry:
+    """Metric families rendered together by /metrics."""
+    
+    def __init__(self):
+        """Initialize an empty registry."""
+        self.metrics: List[Metric] = []
+    
+    def register(self, metric: Metric) -> Metric:
+        """Add a metric family and return it."""
+        self.metrics.append(metric)
+        return metric
+    
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        """Register a counter."""
+        return self.register(Counter(name, documentation, labelnames))
+    
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        """Register a histogram."""
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+    
+    def gauge(self, name: str, documentation: str, read: Callable[[], float],
+              metric_type: str = "gauge") -> Gauge:
+        """Register a value read at scrape time."""
+        return self.register(Gauge(name, documentation, read, metric_type))
+    
+    def render(self) -> str:
+        """
+        Render every family in the Prometheus text format.
+        
+        Returns:
+            Exposition text, newline terminated
+        """
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware counting requests and timing them end to end.
+    
+    The duration runs until the last body chunk is sent, so streamed
+    responses count in full. Requests are labelled with their path once a
+    route has handled them; paths no route matched share one label, so
+    unknown URLs cannot grow the label sets.
+    """
+    
+    def __init__(self, app: Callable, requests: Counter, duration: Histogram):
+        """
+        Wrap an application.
+        
+        Args:
+            app: ASGI application
+            requests: Counter labelled by endpoint, method and status
+            duration: Histogram labelled by endpoint
+        """
+        self.app = app
+        self.requests = requests
+        self.duration = duration
+    
+    async def __call__(self, scope: Dict[str, Any], receive: Callable, send: Callable) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        
+        started = time.perf_counter()
+        status = 500
+        
+        async def send_with_status(message: Dict[str, Any]) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+        
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            endpoint = self._endpoint(scope)
+            self.requests.inc((endpoint, scope["method"], str(status)))
+            self.duration.observe(time.perf_counter() - started, (endpoint,))
+    
+    @staticmethod
+    def _endpoint(scope: Dict[str, Any]) -> str:
+        """Endpoint label of a handled request."""
+        if "endpoint" not in scope:
+            return UNMATCHED
+        if scope.get("path_params"):
+            # The template keeps one label per route, whatever the parameters
+            return getattr(scope.get("route"), "path", UNMATCHED)
+        return scope["path"]
+
+
+registry = MetricsRegistry()
+
+requests_total = registry.counter(
+    "secureprompt_requests_total", "HTTP requests by endpoint, method and status.",
+    ("endpoint", "method", "status")
+)
+request_duration = registry.histogram(
+    "secureprompt_request_duration_seconds",
+    "Total request latency, until the last response byte.", ("endpoint",)
+)
+verdicts_total = registry.counter(
+    "secureprompt_verdicts_total", "Checked prompts by endpoint and verdict.", ("endpoint", "verdict")
+)
+scan_duration = registry.histogram(
+    "secureprompt_scan_seconds", "Time spent checking prompts, per request or NDJSON line.",
+    ("endpoint",), SCAN_BUCKETS
+)
+scanned_chars = registry.counter(
+    "secureprompt_scanned_chars_total", "Characters of prompt text checked.", ("endpoint",)
+)
+sanitize_duration = registry.histogram(
+    "secureprompt_sanitize_seconds", "Time spent sanitizing one message.", (), SCAN_BUCKETS
+)
+upstream_duration = registry.histogram(
+    "secureprompt_upstream_seconds",
+    "Ollama call latency by operation, until the last byte for streams.", ("operation",)
+)
+upstream_queue_duration = registry.histogram(
+    "secureprompt_upstream_queue_seconds",
+    "Time Ollama calls waited for a slot, by configured model or \"other\".", ("model",)
+)
+upstream_rejections = registry.counter(
+    "secureprompt_upstream_rejections_total", "Requests turned away while Ollama was saturated.",
+    ("model", "reason")
+)
+
+
+
+def register_state_gauges(registry: MetricsRegistry, checker: PromptChecker,
+                          tenants: TenantRegistry,
+                          responses: Optional[ResponseCache] = None,
+                          scheduler: Optional[UpstreamScheduler] = None) -> None:
+    """
+    Register scrape-time readers of the keyword set, caches and tenant automata.
+    
+    Args:
+        registry: Registry to add the gauges to
+        checker: Base checker; its result cache is shared by all tenants
+        tenants: Tenant registry
+        responses: Upstream response cache, if enabled
+        scheduler: Upstream scheduler, if any
+    """
+    def cache_stat(name: str) -> Callable[[], float]:
+        return lambda: checker.cache.stats()[name] if checker.cache is not None else 0
+    
+    def response_stat(name: str) -> Callable[[], float]:
+        return lambda: responses.stats()[name]
+    
+    def tenant_stat(name: str) -> Callable[[], float]:
+        return lambda: tenants.stats()[name]
+    
+    registry.gauge("secureprompt_keywords", "Keywords in the base keyword set.",
+                   lambda: len(checker.keyword_set.keywords))
+    registry.gauge("secureprompt_keyword_set_version", "Version of the base keyword set.",
+                   lambda: checker.keyword_set.version)
+    registry.gauge("secureprompt_automaton_states", "States of the base automaton.",
+                   lambda: checker.aho_corasick.state_count)
+    registry.gauge("secureprompt_automaton_bytes", "Memory held by the base automaton.",
+                   lambda: checker.aho_corasick.memory_usage()["total"])
+    registry.gauge("secureprompt_result_cache_entries", "Cached check results.",
+                   cache_stat("entries"))
+    registry.gauge("secureprompt_result_cache_bytes", "Estimated size of the cached results.",
+                   cache_stat("bytes"))
+    registry.gauge("secureprompt_result_cache_hits_total", "Result cache hits.",
+                   cache_stat("hits"), "counter")
+    registry.gauge("secureprompt_result_cache_misses_total", "Result cache misses.",
+                   cache_stat("misses"), "counter")
+    registry.gauge("secureprompt_result_cache_evictions_total", "Results evicted for space.",
+                   cache_stat("evictions"), "counter")
+    registry.gauge("secureprompt_result_cache_hit_ratio", "Share of cache lookups that hit.",
+                   cache_stat("hit_ratio"))
+    registry.gauge("secureprompt_tenant_automata", "Automata shared by tenant keyword sets.",
+                   tenant_stat("automata"))
+    registry.gauge("secureprompt_tenant_automata_bytes", "Memory held by the tenant automata.",
+                   tenant_stat("bytes"))
+    registry.gauge("secureprompt_tenant_automata_evictions_total",
+                   "Tenant automata dropped over the memory budget.",
+                   tenant_stat("evictions"), "counter")
+    if scheduler is not None:
+        registry.gauge("secureprompt_upstream_in_flight", "Ollama calls running.",
+                       lambda: scheduler.stats()["in_flight"])
+        registry.gauge("secureprompt_upstream_queued", "Ollama calls waiting for a slot.",
+                       lambda: scheduler.stats()["queued"])
+    if responses is None:
+        return
+    registry.gauge("secureprompt_response_cache_entries", "Cached upstream responses.",
+                   response_stat("entries"))
+    registry.gauge("secureprompt_response_cache_bytes", "Estimated size of the cached responses.",
+                   response_stat("bytes"))
+    registry.gauge("secureprompt_response_cache_hits_total", "Response cache hits.",
+                   response_stat("hits"), "counter")
+    registry.gauge("secureprompt_response_cache_misses_total", "Response cache misses.",
+                   response_stat("misses"), "counter")
+    registry.gauge("secureprompt_response_cache_coalesced_total",
+                   "Requests that shared an upstream call already in flight.",
+                   response_stat("coalesced"), "counter")
+
+
+register_state_gauges(registry, prompt_checker, tenant_registry, response_cache, upstream_scheduler)
+
+
+def record_check(endpoint: str, seconds: float, chars: int, sensitive: int,
+                 checked: int = 1) -> None:
+    """
+    Record the prompts checked by one request.
+    
+    Args:
+        endpoint: Endpoint label
+        seconds: Time spent in the checker
+        chars: Characters of prompt text checked
+        sensitive: Number of prompts found SENSITIVE
+        checked: Number of prompts checked
+    """
+    if sensitive:
+        verdicts_total.inc((endpoint, "SENSITIVE"), sensitive)
+    if checked > sensitive:
+        verdicts_total.inc((endpoint, "SAFE"), checked - sensitive)
+    scan_duration.observe(seconds, (endpoint,))
+    scanned_chars.inc((endpoint,), chars)
+
+
+@contextmanager
+def timed(histogram: Histogram, labels: Labels = ()) -> Iterator[None]:
+    """
+    Observe the duration of a block, also when it raises.
+    
+    Args:
+        histogram: Histogram to record into
+        labels: Label values of the observation
+    """
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        histogram.observe(time.perf_counter() - started, labels)
@@ -0,0 +1,99 @@
+"""
+NDJSON helpers for streaming bulk prompt audits.
+
+Each input line is either a JSON string (the prompt) or a JSON object with a
+``prompt`` field and an optional ``id`` that is echoed back. Each output line
+holds the 1-based input line number, the ``id`` if given, and the check
+result, including its ``pii`` findings when PII detection is enabled. The
+dummy ``response`` echo of SAFE results is left out so output size does not
+grow with the prompts being audited.
+"""
+import json
+from typing import Any, AsyncIterator, Callable, Dict, Optional
+
+from .core.checker import check_prompt
+
+
+# Lines longer than this are rejected instead of being buffered
+MAX_LINE_BYTES = 16 * 1024 * 1024
+
+
+class LineTooLongError(ValueError):
+    """Raised when an NDJSON line exceeds MAX_LINE_BYTES."""
+
+
+def encode_record(record: Dict[str, Any]) -> bytes:
+    """Serialize one output record as an NDJSON line."""
+    return json.dumps(record, ensure_ascii=False).encode("utf-8") + b"\n"
+
+
+def check_ndjson_line(line: bytes, line_number: int,
+                      check: Callable[[str], Dict[str, Any]] = check_prompt
+                      ) -> Optional[Dict[str, Any]]:
+    """
+    Check the prompt on one NDJSON input line.
+    
+    Args:
+        line: Raw input line, with or without the trailing newline
+        line_number: 1-based line number, reported in the output
+        check: Function used to check the prompt
+        
+    Returns:
+        Output record, or None for blank input lines
+    """
+    line = line.strip()
+    if not line:
+        return None
+    
+    try:
+        item = json.loads(line)
+    except ValueError as e:
+        return {"line": line_number, "error": f"Invalid JSON: {e}"}
+    
+    record: Dict[str, Any] = {"line": line_number}
+    if isinstance(item, str):
+        prompt = item
+    elif isinstance(item, dict) and isinstance(item.get("prompt"), str):
+        prompt = item["prompt"]
+        if "id" in item:
+            record["id"] = item["id"]
+    else:
+        record["error"] = "Expected a JSON string or an object with a string 'prompt' field"
+        return record
+    
+    result = check(prompt)
+    record["status"] = result["status"]
+    record["matches"] = result["matches"]
+    if "pii" in result:
+        record["pii"] = result["pii"]
+    return record
+
+
+async def iter_lines(chunks: AsyncIterator[bytes],
+                     max_line_bytes: int = MAX_LINE_BYTES) -> AsyncIterator[bytes]:
+    """
+    Split an incoming byte stream into lines without buffering the whole body.
+    
+    Args:
+        chunks: Body chunks as they arrive
+        max_line_bytes: Longest line accepted
+        
+    Yields:
+        Each line without its newline; a final unterminated line included
+    """
+    buffer = bytearray()
+    async for chunk in chunks:
+        buffer.extend(chunk)
+        start = 0
+        while True:
+            end = buffer.find(b"\n", start)
+            if end == -1:
+                break
+            yield bytes(buffer[start:end])
+            start = end + 1
+        del buffer[:start]
+        if len(buffer) > max_line_bytes:
+            raise LineTooLongError(f"Line exceeds {max_line_bytes} bytes")
+    
+    if buffer:
+        yield bytes(buffer)
@@ -0,0 +1,132 @@
+"""
+Cache of upstream Ollama responses for repeated safe requests.
+
+Moodle often sends the very same request for many students ("summarize this
+page"). With ``RESPONSE_CACHE_MAX_BYTES`` set, non-streaming responses are
+kept in a bounded LRU cache keyed on the endpoint, the model, the sanitized
+prompt or messages and the generation parameters. Identical requests that
+arrive while the first one is still waiting for Ollama share its upstream
+call instead of starting their own.
+
+Caching is opt-in: with sampling enabled the model answers the same request
+differently each time, and a cached answer repeats one of them.
+"""
+import asyncio
+import hashlib
+import json
+import os
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from .core.cache import ResultCache
+
+
+# Response cache size in bytes; 0 (the default) disables the cache
+RESPONSE_CACHE_MAX_BYTES = int(os.getenv("RESPONSE_CACHE_MAX_BYTES", "0"))
+
+# Seconds a cached response is served
+RESPONSE_CACHE_TTL = float(os.getenv("RESPONSE_CACHE_TTL", "300"))
+
+
+def response_key(endpoint: str, model: str, payload: Any, parameters: Optional[Dict[str, Any]] = None) -> bytes:
+    """
+    Build the cache key of an upstream request.
+    
+    Args:
+        endpoint: Upstream endpoint label, e.g. "generate" or "v1_chat"
+        model: Model name
+        payload: Prompt or messages exactly as sent upstream
+        parameters: Generation parameters; None values are left out
+        
+    Returns:
+        128-bit digest of the canonical JSON form of the request
+    """
+    parameters = {name: value for name, value in (parameters or {}).items() if value is not None}
+    canonical = json.dumps([endpoint, model, payload, parameters], sort_keys=True,
+                           ensure_ascii=False, separators=(",", ":"))
+    return hashlib.blake2b(canonical.encode("utf-8"), digest_size=16).digest()
+
+
+class ResponseCache:
+    """
+    LRU cache of upstream responses with request coalescing.
+    
+    Only responses the caller marks as cacheable are stored, so an Ollama
+    outage is not served from the cache after Ollama recovers. Coalesced
+    requests do receive the error of the call they shared.
+    """
+    
+    def __init__(self, max_bytes: int, ttl: float):
+        """
+        Initialize the cache.
+        
+        Args:
+            max_bytes: Upper bound for the summed size of the cached responses
+            ttl: Seconds a response stays valid after it is stored
+        """
+        self.results = ResultCache(max_bytes, ttl)
+        self._pending: Dict[bytes, "asyncio.Future[Dict[str, Any]]"] = {}
+        self.coalesced = 0
+    
+    async def fetch(self, key: bytes, call: Callable[[], Awaitable[Dict[str, Any]]],
+                    cacheable: Callable[[Dict[str, Any]], bool] = lambda response: "error" not in response
+                    ) -> Dict[str, Any]:
+        """
+        Return the cached response for a key, or make the upstream call once.
+        
+        The call runs as its own task, so a client that disconnects does not
+        cancel it for the requests sharing it.
+        
+        Args:
+            key: Key built by response_key
+            call: Coroutine function making the upstream call
+            cacheable: Whether a response may be stored; by default those
+                without an "error" field
+                
+        Returns:
+            Upstream response; callers must treat it as immutable
+        """
+        cached = self.results.get(key)
+        if cached is not None:
+            return cached
+        
+        pending = self._pending.get(key)
+        if pending is not None:
+            self.coalesced += 1
+        else:
+            pending = asyncio.ensure_future(call())
+            self._pending[key] = pending
+            pending.add_done_callback(lambda task: self._finish(key, task, cacheable))
+        return await asyncio.shield(pending)
+    
+    def _finish(self, key: bytes, task: "asyncio.Future[Dict[str, Any]]",
+                cacheable: Callable[[Dict[str, Any]], bool]) -> None:
+        """Store the response of a finished upstream call."""
+        del self._pending[key]
+        if task.cancelled() or task.exception() is not None:
+            return
+        response = task.result()
+        if cacheable(response):
+            self.results.put(key, response, len(json.dumps(response)))
+    
+    def clear(self) -> None:
+        """Drop every cached response; calls in flight are not affected."""
+        self.results.clear()
+    
+    def stats(self) -> Dict[str, Any]:
+        """
+        Report cache counters.
+        
+        Returns:
+            Result cache counters plus coalesced and in-flight requests
+        """
+        return {
+            **self.results.stats(),
+            "coalesced": self.coalesced,
+            "pending": len(self._pending),
+        }
+
+
+# Global instance for use in API
+response_cache = (
+    ResponseCache(RESPONSE_CACHE_MAX_BYTES, RESPONSE_CACHE_TTL) if RESPONSE_CACHE_MAX_BYTES > 0 else None
+)
@@ -0,0 +1,314 @@
+"""
+Admission control for upstream Ollama calls.
+
+A single Ollama instance slows down for everyone once it runs more than a
+few generations at a time. The scheduler lets at most
+``OLLAMA_MAX_IN_FLIGHT`` calls per model run at once and queues the rest,
+interactive requests before bulk ones and in arrival order within a
+priority. A request is turned away at once when the queue of its model is
+full, and after ``OLLAMA_QUEUE_TIMEOUT`` seconds of waiting, in both cases
+with an estimate of when to retry.
+
+Models not listed in ``OLLAMA_MODELS`` or ``OLLAMA_MODEL_LIMITS`` share one
+queue and one metric label, "other", since clients choose the model name.
+
+Limits apply per process; with several workers, size them per worker.
+"""
+import asyncio
+import heapq
+import itertools
+import math
+import os
+import time
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, List, Optional, Sequence
+
+
+# Models served, each with its own queue; other names share the "other" queue
+OLLAMA_MODELS = os.getenv("OLLAMA_MODELS", os.getenv("OLLAMA_MODEL", "llama3.2:latest"))
+
+# Calls per model running at once; 0 disables the scheduler
+OLLAMA_MAX_IN_FLIGHT = int(os.getenv("OLLAMA_MAX_IN_FLIGHT", "4"))
+
+# Per-model overrides of OLLAMA_MAX_IN_FLIGHT, e.g. "llama3.2:latest=2,qwen2.5:14b=1"
+OLLAMA_MODEL_LIMITS = os.getenv("OLLAMA_MODEL_LIMITS", "")
+
+# Calls per model waiting for a slot before new ones are rejected
+OLLAMA_QUEUE_SIZE = int(os.getenv("OLLAMA_QUEUE_SIZE", "32"))
+
+# Seconds a call waits for a slot before it is rejected
+OLLAMA_QUEUE_TIMEOUT = float(os.getenv("OLLAMA_QUEUE_TIMEOUT", "30"))
+
+# Prompts longer than this are queued as bulk unless the client says otherwise
+BULK_PROMPT_CHARS = int(os.getenv("BULK_PROMPT_CHARS", "4000"))
+
+# Request header overriding the priority: "interactive" or "bulk"
+PRIORITY_HEADER = "X-Priority"
+
+# Queue and metric label shared by models that are not configured
+OTHER_MODELS = "other"
+
+# Queue priorities, lowest first
+INTERACTIVE = 0
+BULK = 1
+
+# Weight of the latest call in the running average of call durations
+_DURATION_SMOOTHING = 0.2
+
+
+def parse_model_limits(spec: str) -> Dict[str, int]:
+    """
+    Parse per-model in-flight limits.
+    
+    Args:
+        spec: Comma-separated model=limit pairs
+        
+    Returns:
+        Limit of each listed model
+        
+    Raises:
+        ValueError: If a pair is malformed
+    """
+    limits = {}
+    for pair in filter(None, (part.strip() for part in spec.split(","))):
+        model, separator, limit = pair.rpartition("=")
+        if not separator or not model.strip() or not limit.strip().isdigit():
+            raise ValueError(f"OLLAMA_MODEL_LIMITS: expected model=limit, got {pair!r}")
+        limits[model.strip()] = int(limit)
+    return limits
+
+
+def request_priority(chars: int, hint: Optional[str] = None) -> int:
+    """
+    Pick the queue priority of a request.
+    
+    Args:
+        chars: Characters of prompt text sent upstream
+        hint: Value of the PRIORITY_HEADER header, if any
+        
+    Returns:
+        INTERACTIVE or BULK
+    """
+    hint = (hint or "").strip().lower()
+    if hint == "bulk":
+        return BULK
+    if hint == "interactive":
+        return INTERACTIVE
+    return BULK if chars > BULK_PROMPT_CHARS else INTERACTIVE
+
+
+class UpstreamBusyError(Exception):
+    """Raised when a call is turned away because Ollama is saturated."""
+    
+    def __init__(self, model: str, reason: str, retry_after: int):
+        """
+        Describe the rejection.
+        
+        Args:
+            model: Queue label of the model the call was for
+            reason: "queue_full" or "queue_timeout"
+            retry_after: Suggested seconds before retrying
+        """
+        super().__init__(f"Ollama is busy for model {model} ({reason})")
+        self.model = model
+        self.reason = reason
+        self.retry_after = retry_after
+    
+    @property
+    def status_code(self) -> int:
+        """429 when the queue was full, 503 when waiting timed out."""
+        return 429 if self.reason == "queue_full" else 503
+
+
+class _ModelQueue:
+    """Running calls and waiting calls of one model."""
+    
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.in_flight = 0
+        self.queued = 0
+        # Entries are [priority, sequence, future]; cancelled futures are
+        # left in place and skipped when popped
+        self.waiting: List[list] = []
+        self.average_seconds = 1.0
+
+
+class UpstreamScheduler:
+    """
+    Per-model concurrency limit with a bounded priority queue.
+    
+    Runs on the event loop and needs no locking; slots are handed from a
+    finishing call directly to the next waiting one.
+    """
+    
+    def __init__(self, max_in_flight: int = OLLAMA_MAX_IN_FLIGHT, queue_size: int = OLLAMA_QUEUE_SIZE,
+                 queue_timeout: float = OLLAMA_QUEUE_TIMEOUT,
+                 model_limits: Optional[Dict[str, int]] = None,
+                 models: Sequence[str] = ()):
+        """
+        Initialize the scheduler.
+        
+        Args:
+            max_in_flight: Calls per model running at once; 0 for no limit
+            queue_size: Calls per model allowed to wait for a slot
+            queue_timeout: Seconds a call waits before it is rejected
+            model_limits: Per-model overrides of max_in_flight
+            models: Models with a queue of their own, besides those in
+                model_limits; any other model uses the OTHER_MODELS queue
+        """
+        self.max_in_flight = max_in_flight
+        self.queue_size = queue_size
+        self.queue_timeout = queue_timeout
+        self.model_limits = dict(model_limits or {})
+        self.models = frozenset(models) | frozenset(self.model_limits)
+        self._queues: Dict[str, _ModelQueue] = {}
+        self._sequence = itertools.count()
+        self.rejected = 0
+    
+    def label(self, model: str) -> str:
+        """
+        Name the queue of a model, which is also its metric label.
+        
+        Args:
+            model: Model name sent by the client
+            
+        Returns:
+            The model name if it is configured, otherwise OTHER_MODELS
+        """
+        return model if model in self.models else OTHER_MODELS
+    
+    def _queue(self, model: str) -> _ModelQueue:
+        """Queue of a model label, created on first use."""
+        queue = self._queues.get(model)
+        if queue is None:
+            queue = self._queues[model] = _ModelQueue(self.model_limits.get(model, self.max_in_flight))
+        return queue
+    
+    def retry_after(self, model: str) -> int:
+        """
+        Estimate when a new call for a model would get a slot.
+        
+        Args:
+            model: Model name
+            
+        Returns:
+            Whole seconds, at least 1
+        """
+        model = self.label(model)
+        queue = self._queue(model)
+        if queue.limit <= 0:
+            return 1
+        return max(1, math.ceil(queue.average_seconds * (queue.queued + 1) / queue.limit))
+    
+    def admit(self, model: str) -> None:
+        """
+        Reject a call up front when the queue of its model is full.
+        
+        Streaming endpoints call this before their response starts, since
+        errors raised by slot() reach the client as part of the stream.
+        
+        Args:
+            model: Model name
+            
+        Raises:
+            UpstreamBusyError: If the queue is full
+        """
+        model = self.label(model)
+        queue = self._queue(model)
+        if 0 < queue.limit <= queue.in_flight and queue.queued >= self.queue_size:
+            self.rejected += 1
+            raise UpstreamBusyError(model, "queue_full", self.retry_after(model))
+    
+    @asynccontextmanager
+    async def slot(self, model: str, priority: int = INTERACTIVE) -> AsyncIterator[float]:
+        """
+        Hold one of a model's slots while an upstream call runs.
+        
+        Args:
+            model: Model name
+            priority: INTERACTIVE or BULK
+            
+        Yields:
+            Seconds spent waiting for the slot
+            
+        Raises:
+            UpstreamBusyError: If the queue is full or the wait timed out
+        """
+        model = self.label(model)
+        queue = self._queue(model)
+        if queue.limit <= 0:
+            yield 0.0
+            return
+        
+        waited = await self._acquire(model, queue, priority)
+        started = time.perf_counter()
+        try:
+            yield waited
+        finally:
+            queue.average_seconds += _DURATION_SMOOTHING * (
+                time.perf_counter() - started - queue.average_seconds
+            )
+            self._release(queue)
+    
+    async def _acquire(self, model: str, queue: _ModelQueue, priority: int) -> float:
+        """Take a slot, waiting in the queue if none is free."""
+        if queue.in_flight < queue.limit and not queue.queued:
+            queue.in_flight += 1
+            return 0.0
+        if queue.queued >= self.queue_size:
+            self.rejected += 1
+            raise UpstreamBusyError(model, "queue_full", self.retry_after(model))
+        
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(queue.waiting, [priority, next(self._sequence), future])
+        queue.queued += 1
+        started = time.perf_counter()
+        try:
+            await asyncio.wait_for(future, self.queue_timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if future.done() and not future.cancelled():
+                # The slot was handed over just as we gave up; pass it on
+                self._release(queue)
+            else:
+                future.cancel()
+                queue.queued -= 1
+            if isinstance(e, asyncio.TimeoutError):
+                self.rejected += 1
+                raise UpstreamBusyError(model, "queue_timeout", self.retry_after(model)) from None
+            raise
+        return time.perf_counter() - started
+    
+    def _release(self, queue: _ModelQueue) -> None:
+        """Hand a finished call's slot to the next waiting call, or free it."""
+        while queue.waiting:
+            future = heapq.heappop(queue.waiting)[2]
+            if future.cancelled():
+                continue
+            queue.queued -= 1
+            future.set_result(None)
+            return
+        queue.in_flight -= 1
+    
+    def stats(self) -> Dict[str, Any]:
+        """
+        Report scheduler counters.
+        
+        Returns:
+            Running and waiting calls in total and per model, and rejections
+        """
+        return {
+            "in_flight": sum(queue.in_flight for queue in self._queues.values()),
+            "queued": sum(queue.queued for queue in self._queues.values()),
+            "rejected": self.rejected,
+            "models": {
+                model: {"limit": queue.limit, "in_flight": queue.in_flight, "queued": queue.queued}
+                for model, queue in self._queues.items()
+            },
+        }
+
+
+# Global instance for use in API
+upstream_scheduler = UpstreamScheduler(
+    OLLAMA_MAX_IN_FLIGHT, OLLAMA_QUEUE_SIZE, OLLAMA_QUEUE_TIMEOUT, parse_model_limits(OLLAMA_MODEL_LIMITS),
+    [model.strip() for model in OLLAMA_MODELS.split(",") if model.strip()]
+)
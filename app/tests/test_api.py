@@ -0,0 +1,658 @@
+"""
+Test cases for SecurePrompt API endpoints.
+"""
+import asyncio
+import io
+import json
+import httpx
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from app.api import admin_router
+from app.core import profiling
+from app.core.checker import prompt_checker
+from app.core.pii import PiiDetector
+from app.cli import check_ndjson
+from app.main import add_admin_routes, app
+from app.metrics import (Histogram, request_duration, scan_duration, upstream_duration,
+                         upstream_rejections, verdicts_total)
+from app.response_cache import ResponseCache, response_key
+from app.scheduler import BULK, INTERACTIVE, UpstreamBusyError, UpstreamScheduler, parse_model_limits
+
+
+client = TestClient(app)
+
+
+class TestCheckEndpoints:
+    """Test cases for the prompt checking endpoints."""
+    
+    def test_check_single_prompt(self):
+        """Test the single prompt check endpoint."""
+        response = client.post("/api/v1/check", json={"prompt": "What is my password?"})
+        assert response.status_code == 200
+        assert response.json()["status"] == "SENSITIVE"
+    
+    def test_check_match_kinds(self, monkeypatch):
+        """Test the count and exists match kinds of the check endpoint."""
+        monkeypatch.setattr(prompt_checker, "pii_detector", PiiDetector())
+        prompt = "password or PASSWORD"
+        response = client.post("/api/v1/check", json={"prompt": prompt, "match_kind": "count"})
+        assert response.json() == {"status": "SENSITIVE", "counts": {"password": 2}, "pii": []}
+        response = client.post("/api/v1/check", json={"prompt": prompt, "match_kind": "exists"})
+        assert response.json() == {"status": "SENSITIVE", "pii": []}
+        response = client.post("/api/v1/check", json={"prompt": prompt, "match_kind": "fuzzy"})
+        assert response.status_code == 422
+    
+    def test_check_reports_pii(self, monkeypatch):
+        """Test that an unlabeled NIK is reported next to keyword matches."""
+        monkeypatch.setattr(prompt_checker, "pii_detector", PiiDetector())
+        response = client.post("/api/v1/check", json={"prompt": "data 3201234505900001"})
+        body = response.json()
+        assert body["status"] == "SENSITIVE"
+        assert body["pii"] == [{"type": "nik", "position": 5, "end": 21}]
+    
+    def test_pii_verdict_matches_across_kinds(self, monkeypatch):
+        """Test that every match kind and the NDJSON audit report a lone NIK."""
+        monkeypatch.setattr(prompt_checker, "pii_detector", PiiDetector())
+        prompt = "data 3201234505900001"
+        pii = [{"type": "nik", "position": 5, "end": 21}]
+        for match_kind in ("all", "leftmost-longest", "count", "exists"):
+            body = client.post("/api/v1/check", json={"prompt": prompt, "match_kind": match_kind}).json()
+            assert body["status"] == "SENSITIVE", match_kind
+            assert body["pii"] == pii, match_kind
+        
+        response = client.post("/api/v1/check/stream", content=json.dumps(prompt).encode())
+        record = json.loads(response.text)
+        assert record == {"line": 1, "status": "SENSITIVE", "matches": [], "pii": pii}
+    
+    def test_check_normalized(self):
+        """Test that the normalize flag catches obfuscated keywords."""
+        body = {"prompt": "my p-a-s-s-w-0-r-d", "normalize": True}
+        response = client.post("/api/v1/check", json=body)
+        assert response.json()["matches"] == [{"keyword": "password", "position": 3, "end": 18}]
+        response = client.post("/api/v1/check", json={**body, "match_kind": "count"})
+        assert response.status_code == 422
+    
+    def test_check_fuzzy(self):
+        """Test that max_errors catches misspelled keywords."""
+        body = {"prompt": "what is my pasword", "max_errors": 1}
+        response = client.post("/api/v1/check", json=body)
+        keywords = [match["keyword"] for match in response.json()["matches"]]
+        assert "password" in keywords
+        response = client.post("/api/v1/check", json={**body, "normalize": True})
+        assert response.status_code == 422
+    
+    def test_keyword_set_info(self):
+        """Test the keyword listing and the description of the live set."""
+        body = client.get("/api/v1/keywords").json()
+        assert body["version"] >= 1
+        assert "password" in body["keywords"]
+        assert body["count"] == len(body["keywords"])
+        assert len(body["fingerprint"]) == 40
+    
+    def test_tenant_keywords(self, monkeypatch):
+        """Test that the tenant header and API keys select tenant keywords."""
+        from app.core.checker import prompt_checker
+        from app.core.tenants import TenantConfig, TenantRegistry
+        registry = TenantRegistry(prompt_checker, {
+            "campus-a": TenantConfig(keywords=["nilai ujian"], api_keys=["key-a"])
+        })
+        monkeypatch.setattr("app.api.tenant_registry", registry)
+        
+        body = {"prompt": "bocoran nilai ujian"}
+        assert client.post("/api/v1/check", json=body).json()["status"] == "SAFE"
+        response = client.post("/api/v1/check", json=body, headers={"X-Tenant-ID": "campus-a"})
+        assert response.json()["status"] == "SENSITIVE"
+        response = client.post("/api/v1/check", json=body,
+                               headers={"Authorization": "Bearer key-a"})
+        assert response.json()["status"] == "SENSITIVE"
+        response = client.post("/api/v1/check", json=body, headers={"X-Tenant-ID": "campus-z"})
+        assert response.status_code == 403
+    
+    def test_check_batch(self):
+        """Test checking several prompts in one request."""
+        prompts = ["How do I cook pasta?", "What is my password?", ""]
+        response = client.post("/api/v1/check/batch", json={"prompts": prompts})
+        assert response.status_code == 200
+        
+        body = response.json()
+        assert body["total"] == 3
+        assert body["sensitive"] == 1
+        assert [result["status"] for result in body["results"]] == ["SAFE", "SENSITIVE", "SAFE"]
+    
+    def test_check_batch_too_large(self, monkeypatch):
+        """Test that oversized batches are rejected."""
+        monkeypatch.setattr("app.api.BATCH_MAX_PROMPTS", 2)
+        response = client.post("/api/v1/check/batch", json={"prompts": ["a", "b", "c"]})
+        assert response.status_code == 413
+    
+    def test_check_stream_ndjson(self, monkeypatch):
+        """Test streaming NDJSON checks."""
+        monkeypatch.setattr(prompt_checker, "pii_detector", PiiDetector())
+        body = b'{"id": "a", "prompt": "my password"}\n"hello"\n\nnot json\n"my email"'
+        response = client.post("/api/v1/check/stream", content=body)
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("application/x-ndjson")
+        
+        records = [json.loads(line) for line in response.text.splitlines()]
+        assert [record["line"] for record in records] == [1, 2, 4, 5]
+        assert records[0]["id"] == "a"
+        assert records[0]["status"] == "SENSITIVE"
+        assert records[1] == {"line": 2, "status": "SAFE", "matches": [], "pii": []}
+        assert "error" in records[2]
+        assert records[3]["status"] == "SENSITIVE"
+
+
+async def fake_chat_stream(messages, model, priority=0):
+    """Yield OpenAI-style chunks the way Ollama streams them."""
+    for piece in ["Your pass", "word is ", "hunter2"]:
+        yield {
+            "id": "chatcmpl-1",
+            "object": "chat.completion.chunk",
+            "created": 1,
+            "model": model,
+            "choices": [{"index": 0, "delta": {"content": piece}, "finish_reason": None}]
+        }
+
+
+def read_sse(response):
+    """Decode the data payloads of a server-sent event stream."""
+    events = [line[6:] for line in response.text.split("\n\n") if line.startswith("data: ")]
+    return [event if event == "[DONE]" else json.loads(event) for event in events]
+
+
+class TestStreaming:
+    """Test cases for streamed LLM responses."""
+    
+    def test_chat_completions_stream_passthrough(self, monkeypatch):
+        """Test that chunks are relayed as server-sent events."""
+        monkeypatch.setattr("app.api.stream_ollama_v1_chat", fake_chat_stream)
+        response = client.post("/api/v1/chat/completions", json={
+            "messages": [{"role": "user", "content": "Tell me a story"}],
+            "stream": True
+        })
+        assert response.headers["content-type"].startswith("text/event-stream")
+        
+        events = read_sse(response)
+        assert events[-1] == "[DONE]"
+        content = "".join(event["choices"][0]["delta"]["content"] for event in events[:-1])
+        assert content == "Your password is hunter2"
+    
+    def test_chat_completions_stream_cut_on_keyword(self, monkeypatch):
+        """Test that the output filter ends the stream at a keyword."""
+        monkeypatch.setattr("app.api.stream_ollama_v1_chat", fake_chat_stream)
+        monkeypatch.setattr("app.api.STREAM_OUTPUT_FILTER", True)
+        response = client.post("/api/v1/chat/completions", json={
+            "messages": [{"role": "user", "content": "Tell me a story"}],
+            "stream": True
+        })
+        
+        events = read_sse(response)
+        assert [event["choices"][0]["delta"].get("content") for event in events[:-2]] == ["Your pass"]
+        assert events[-2]["choices"][0]["finish_reason"] == "content_filter"
+        assert events[-1] == "[DONE]"
+    
+    def test_chat_stream_holds_chunk_ending_in_short_keyword(self, monkeypatch):
+        """Test that a whole-word keyword ending a chunk is never relayed."""
+        async def fake_stream(messages, model, priority=0):
+            for piece in ["Your PIN", " is 1234"]:
+                yield {"id": "chatcmpl-2", "created": 1, "model": model,
+                       "choices": [{"index": 0, "delta": {"content": piece}, "finish_reason": None}]}
+        
+        monkeypatch.setattr("app.api.stream_ollama_v1_chat", fake_stream)
+        monkeypatch.setattr("app.api.STREAM_OUTPUT_FILTER", True)
+        response = client.post("/api/v1/chat/completions", json={
+            "messages": [{"role": "user", "content": "Tell me a story"}],
+            "stream": True
+        })
+        
+        events = read_sse(response)
+        assert "PIN" not in response.text
+        assert events[0]["choices"][0]["finish_reason"] == "content_filter"
+        assert events[-1] == "[DONE]"
+    
+    def test_generate_stream_cut_on_final_keyword(self, monkeypatch):
+        """Test that a keyword at the very end of the stream is caught."""
+        async def fake_generate_stream(prompt, model, priority=0):
+            yield {"model": model, "response": "It ends with", "done": False}
+            yield {"model": model, "response": " otp", "done": False}
+            yield {"model": model, "response": "", "done": True}
+        
+        monkeypatch.setattr("app.api.stream_ollama_generate", fake_generate_stream)
+        monkeypatch.setattr("app.api.STREAM_OUTPUT_FILTER", True)
+        response = client.post("/api/v1/generate", json={"prompt": "Say it", "stream": True})
+        
+        chunks = [json.loads(line) for line in response.text.splitlines()]
+        assert "".join(chunk["response"] for chunk in chunks) == "It ends with"
+        assert chunks[-1]["done_reason"] == "content_filter"
+    
+    def test_generate_stream_passthrough(self, monkeypatch):
+        """Test that generate results are relayed as NDJSON."""
+        async def fake_generate_stream(prompt, model, priority=0):
+            yield {"model": model, "response": "Hel", "done": False}
+            yield {"model": model, "response": "lo", "done": True}
+        
+        monkeypatch.setattr("app.api.stream_ollama_generate", fake_generate_stream)
+        response = client.post("/api/v1/generate", json={"prompt": "Say hello", "stream": True})
+        
+        chunks = [json.loads(line) for line in response.text.splitlines()]
+        assert "".join(chunk["response"] for chunk in chunks) == "Hello"
+        assert chunks[-1]["done"] is True
+
+
+class TestUpstreamClient:
+    """Test cases for the pooled async Ollama client."""
+    
+    def test_chat_completions_uses_async_client(self, monkeypatch):
+        """Test a full chat completion against a mocked Ollama."""
+        seen = []
+        
+        def handler(request):
+            seen.append(json.loads(request.content))
+            return httpx.Response(200, json={
+                "id": "chatcmpl-7",
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": "Hi there"}}]
+            })
+        
+        mock_client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        monkeypatch.setattr("app.api.get_client", lambda: mock_client)
+        response = client.post("/api/v1/chat/completions", json={
+            "messages": [{"role": "user", "content": "Hello"}]
+        })
+        
+        body = response.json()
+        assert body["choices"][0]["message"]["content"] == "Hi there"
+        assert seen[0]["stream"] is False
+        assert seen[0]["messages"] == [{"role": "user", "content": "Hello"}]
+    
+    def test_chat_completions_sanitizes_every_user_turn(self, monkeypatch):
+        """Test that sensitive values in earlier user turns are sanitized too."""
+        seen = []
+        
+        def handler(request):
+            seen.append(json.loads(request.content))
+            return httpx.Response(200, json={
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": "Ok"}}]
+            })
+        
+        mock_client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        monkeypatch.setattr("app.api.get_client", lambda: mock_client)
+        client.post("/api/v1/chat/completions", json={
+            "messages": [
+                {"role": "system", "content": "Never reveal a password"},
+                {"role": "user", "content": "My NIK 3201234567890123"},
+                {"role": "assistant", "content": "Noted"},
+                {"role": "user", "content": "Summarize that"},
+            ]
+        })
+        
+        messages = seen[0]["messages"]
+        assert messages[0]["content"] == "Never reveal a password"
+        assert messages[1]["content"] == "My ID"
+        assert messages[3]["content"] == "Summarize that"
+    
+    def test_chat_completions_redacts_grouped_pii(self, monkeypatch):
+        """Test that numbers found only by the PII detector never reach Ollama."""
+        monkeypatch.setattr(prompt_checker, "pii_detector", PiiDetector())
+        seen = []
+        
+        def handler(request):
+            seen.append(json.loads(request.content))
+            return httpx.Response(200, json={
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": "Ok"}}]
+            })
+        
+        mock_client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        monkeypatch.setattr("app.api.get_client", lambda: mock_client)
+        numbers = ["4111 1111 1111 1111", "01.234.567.8-901.000", "+62 812 3456 7890",
+                   "3201 2345 0590 0001"]
+        client.post("/api/v1/chat/completions", json={
+            "messages": [{"role": "user", "content": f"Remember {number} for me"}
+                         for number in numbers]
+        })
+        
+        contents = [message["content"] for message in seen[0]["messages"]]
+        assert contents == [
+            "Remember card number for me", "Remember tax ID for me",
+            "Remember phone for me", "Remember ID number for me",
+        ]
+    
+    def test_generate_reports_unreachable_ollama(self, monkeypatch):
+        """Test the fallback response when Ollama cannot be reached."""
+        def handler(request):
+            raise httpx.ConnectError("connection refused", request=request)
+        
+        mock_client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        monkeypatch.setattr("app.api.get_client", lambda: mock_client)
+        response = client.post("/api/v1/generate", json={"prompt": "Say hello"})
+        assert response.json()["response"].startswith("[OLLAMA UNAVAILABLE]")
+
+
+class TestMetrics:
+    """Test cases for the Prometheus metrics."""
+    
+    def test_histogram_exposition(self):
+        """Test cumulative buckets, sum and count in the text format."""
+        histogram = Histogram("demo_seconds", "Demo.", ("stage",), buckets=(0.1, 1.0))
+        histogram.observe(0.1, ("scan",))
+        histogram.observe(0.5, ("scan",))
+        histogram.observe(3.0, ("scan",))
+        assert histogram.render() == [
+            "# HELP demo_seconds Demo.",
+            "# TYPE demo_seconds histogram",
+            'demo_seconds_bucket{stage="scan",le="0.1"} 1',
+            'demo_seconds_bucket{stage="scan",le="1"} 2',
+            'demo_seconds_bucket{stage="scan",le="+Inf"} 3',
+            'demo_seconds_sum{stage="scan"} 3.6',
+            'demo_seconds_count{stage="scan"} 3',
+        ]
+    
+    def test_requests_are_recorded(self, monkeypatch):
+        """Test that verdicts and per-stage timings reach /metrics."""
+        def handler(request):
+            return httpx.Response(200, json={
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": "Ok"}}]
+            })
+        
+        mock_client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        monkeypatch.setattr("app.api.get_client", lambda: mock_client)
+        monkeypatch.setattr("app.api.response_cache", None)
+        sensitive = verdicts_total.value(("/check", "SENSITIVE"))
+        scans = scan_duration.count(("/check",))
+        requests = request_duration.count(("/api/v1/check",))
+        upstream = upstream_duration.count(("v1_chat",))
+        
+        client.post("/api/v1/check", json={"prompt": "my password"})
+        client.post("/api/v1/chat/completions", json={
+            "messages": [{"role": "user", "content": "Hello"}]
+        })
+        client.get("/no/such/path")
+        
+        assert verdicts_total.value(("/check", "SENSITIVE")) == sensitive + 1
+        assert scan_duration.count(("/check",)) == scans + 1
+        assert request_duration.count(("/api/v1/check",)) == requests + 1
+        assert upstream_duration.count(("v1_chat",)) == upstream + 1
+        
+        response = client.get("/metrics")
+        assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+        assert 'secureprompt_requests_total{endpoint="unmatched",method="GET",status="404"}' \
+            in response.text
+        assert "# TYPE secureprompt_scan_seconds histogram" in response.text
+        assert "secureprompt_automaton_bytes " in response.text
+
+
+class TestResponseCache:
+    """Test cases for the upstream response cache."""
+    
+    def test_identical_requests_share_one_call(self, monkeypatch):
+        """Test that repeats are served from the cache, keyed on parameters."""
+        calls = []
+        
+        def handler(request):
+            calls.append(json.loads(request.content))
+            return httpx.Response(200, json={
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": "Summary"}}]
+            })
+        
+        mock_client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        monkeypatch.setattr("app.api.get_client", lambda: mock_client)
+        monkeypatch.setattr("app.api.response_cache", ResponseCache(1 << 20, 60))
+        body = {"messages": [{"role": "user", "content": "Summarize this page"}]}
+        
+        first = client.post("/api/v1/chat/completions", json=body).json()
+        second = client.post("/api/v1/chat/completions", json=body).json()
+        assert first["choices"] == second["choices"]
+        assert len(calls) == 1
+        
+        client.post("/api/v1/chat/completions", json={**body, "temperature": 0.2})
+        assert len(calls) == 2
+    
+    def test_failed_calls_are_not_cached(self, monkeypatch):
+        """Test that an unreachable Ollama is asked again next time."""
+        calls = []
+        
+        def handler(request):
+            calls.append(request)
+            raise httpx.ConnectError("refused")
+        
+        mock_client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        monkeypatch.setattr("app.api.get_client", lambda: mock_client)
+        monkeypatch.setattr("app.api.response_cache", ResponseCache(1 << 20, 60))
+        
+        for _ in range(2):
+            client.post("/api/v1/generate", json={"prompt": "Summarize this page"})
+        assert len(calls) == 2
+    
+    def test_concurrent_requests_coalesce(self):
+        """Test that identical requests in flight share the upstream call."""
+        cache = ResponseCache(1 << 20, 60)
+        calls = []
+        
+        async def call():
+            calls.append(1)
+            await asyncio.sleep(0.01)
+            return {"response": "Summary"}
+        
+        async def run():
+            key = response_key("generate", "llama3.2:latest", "Summarize this page")
+            return await asyncio.gather(*(cache.fetch(key, call) for _ in range(5)))
+        
+        results = asyncio.run(run())
+        assert results == [{"response": "Summary"}] * 5
+        assert len(calls) == 1
+        assert cache.stats()["coalesced"] == 4
+        assert cache.stats()["entries"] == 1
+    
+    def test_key_ignores_unset_parameters(self):
+        """Test that absent and None parameters give the same key."""
+        messages = [{"role": "user", "content": "Hi"}]
+        assert response_key("v1_chat", "m", messages) == \
+            response_key("v1_chat", "m", messages, {"temperature": None})
+        assert response_key("v1_chat", "m", messages) != \
+            response_key("v1_chat", "other", messages)
+
+
+class TestUpstreamScheduler:
+    """Test cases for the Ollama concurrency limit and queue."""
+    
+    def test_interactive_calls_go_first(self):
+        """Test that waiting calls get slots by priority, then arrival."""
+        scheduler = UpstreamScheduler(max_in_flight=1, queue_size=8, queue_timeout=5)
+        order = []
+        
+        async def call(name, priority):
+            async with scheduler.slot("llama", priority):
+                order.append(name)
+                await asyncio.sleep(0)
+        
+        async def run():
+            async with scheduler.slot("llama"):
+                tasks = [asyncio.ensure_future(call(name, priority)) for name, priority in
+                         (("bulk", BULK), ("chat-1", INTERACTIVE), ("chat-2", INTERACTIVE))]
+                await asyncio.sleep(0)
+                assert scheduler.stats()["queued"] == 3
+            await asyncio.gather(*tasks)
+        
+        asyncio.run(run())
+        assert order == ["chat-1", "chat-2", "bulk"]
+        assert scheduler.stats()["in_flight"] == 0
+    
+    def test_full_queue_and_timeout_are_rejected(self):
+        """Test 429 for a full queue and 503 after waiting too long."""
+        scheduler = UpstreamScheduler(max_in_flight=1, queue_size=1, queue_timeout=0.01)
+        
+        async def wait_for_slot():
+            async with scheduler.slot("llama"):
+                pass
+        
+        async def run():
+            async with scheduler.slot("llama"):
+                waiting = asyncio.ensure_future(wait_for_slot())
+                await asyncio.sleep(0)
+                with pytest.raises(UpstreamBusyError) as full:
+                    await wait_for_slot()
+                with pytest.raises(UpstreamBusyError) as timeout:
+                    await waiting
+            return full.value, timeout.value
+        
+        full, timeout = asyncio.run(run())
+        assert (full.reason, full.status_code) == ("queue_full", 429)
+        assert (timeout.reason, timeout.status_code) == ("queue_timeout", 503)
+        assert full.retry_after >= 1
+        assert scheduler.stats()["queued"] == 0 and scheduler.stats()["in_flight"] == 0
+    
+    def test_busy_endpoint_returns_retry_after(self, monkeypatch):
+        """Test that a saturated model is answered with 429 and Retry-After."""
+        scheduler = UpstreamScheduler(max_in_flight=1, queue_size=0, queue_timeout=5, models=["llama"])
+        monkeypatch.setattr("app.api.upstream_scheduler", scheduler)
+        rejections = upstream_rejections.value(("llama", "queue_full"))
+        
+        async def run():
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://test") as http:
+                async with scheduler.slot("llama"):
+                    return [await http.post("/api/v1/chat/completions", json={
+                        "model": "llama", "messages": [{"role": "user", "content": "Hello"}],
+                        "stream": stream
+                    }) for stream in (False, True)]
+        
+        for response in asyncio.run(run()):
+            assert response.status_code == 429
+            assert int(response.headers["Retry-After"]) >= 1
+            assert response.json()["error"]["code"] == "queue_full"
+        assert upstream_rejections.value(("llama", "queue_full")) == rejections + 2
+    
+    def test_unknown_models_share_one_queue(self):
+        """Test that client-chosen model names cannot add queues or labels."""
+        scheduler = UpstreamScheduler(max_in_flight=1, queue_size=0, queue_timeout=5,
+                                      model_limits={"qwen": 2}, models=["llama"])
+        
+        async def run():
+            for index in range(100):
+                async with scheduler.slot(f"made-up-{index}"):
+                    pass
+            async with scheduler.slot("made-up"):
+                with pytest.raises(UpstreamBusyError) as busy:
+                    async with scheduler.slot("another-made-up"):
+                        pass
+            return busy.value
+        
+        busy = asyncio.run(run())
+        assert busy.model == "other"
+        assert scheduler.label("llama") == "llama" and scheduler.label("qwen") == "qwen"
+        assert set(scheduler.stats()["models"]) == {"other"}
+    
+    def test_parse_model_limits(self):
+        """Test per-model limit overrides, including tags with colons."""
+        assert parse_model_limits("llama3.2:latest=2, qwen2.5:14b=1") == {
+            "llama3.2:latest": 2, "qwen2.5:14b": 1
+        }
+        with pytest.raises(ValueError):
+            parse_model_limits("llama3.2")
+
+
+class TestProfiling:
+    """Test cases for the opt-in profiling and the slow request log."""
+    
+    def profiled_app(self, monkeypatch, mode):
+        """Small app whose handler runs a profiled stage."""
+        monkeypatch.setattr(profiling, "PROFILING", "all")
+        
+        @profiling.profiled("stage", lambda text: len(text))
+        def stage(text):
+            return text.upper()
+        
+        demo = FastAPI()
+        
+        @demo.post("/demo")
+        async def handler(payload: dict):
+            return {"text": stage(payload["text"])}
+        
+        log = profiling.SlowRequestLog(capacity=2)
+        demo.add_middleware(profiling.ProfilingMiddleware, log=log, mode=mode, threshold=60.0)
+        return TestClient(demo), log
+    
+    def test_disabled_profiling_returns_function(self, monkeypatch):
+        """Test that profiling off leaves functions undecorated."""
+        monkeypatch.setattr(profiling, "PROFILING", "off")
+        
+        def stage():
+            pass
+        
+        assert profiling.profiled("stage")(stage) is stage
+    
+    def test_header_requests_are_logged(self, monkeypatch):
+        """Test stage spans, sizes and the header opt-in."""
+        demo_client, log = self.profiled_app(monkeypatch, "header")
+        
+        demo_client.post("/demo", json={"text": "hello"})
+        assert log.entries() == []
+        
+        response = demo_client.post("/demo", json={"text": "hello"}, headers={"X-Profile": "1"})
+        assert response.json() == {"text": "HELLO"}
+        [entry] = log.entries()
+        assert entry["method"] == "POST" and entry["path"] == "/demo"
+        assert entry["status"] == 200
+        assert entry["request_bytes"] == len(b'{"text":"hello"}')
+        assert entry["response_bytes"] == len(response.content)
+        assert set(entry["stages"]) == {"stage"}
+        [span] = entry["spans"]
+        assert span["stage"] == "stage" and span["size"] == 5
+        assert 0 <= span["start"] <= entry["seconds"]
+    
+    def test_ring_buffer_keeps_newest(self, monkeypatch):
+        """Test that the log drops its oldest entries when full."""
+        demo_client, log = self.profiled_app(monkeypatch, "all")
+        for text in ("a", "bb", "ccc"):
+            demo_client.post("/demo", json={"text": text}, headers={"X-Profile": "true"})
+        
+        assert log.recorded == 3
+        assert [entry["spans"][0]["size"] for entry in log.entries()] == [3, 2]
+    
+    def test_admin_endpoint(self, monkeypatch):
+        """Test listing and clearing the slow request log with the admin token."""
+        monkeypatch.setattr("app.api.PROFILING_TOKEN", "s3cret")
+        admin = FastAPI()
+        admin.include_router(admin_router, prefix="/api/v1")
+        admin_client = TestClient(admin)
+        profiling.slow_request_log.add({"path": "/api/v1/check", "seconds": 1.0})
+        
+        assert admin_client.get("/api/v1/admin/slow-requests").status_code == 401
+        wrong = {"Authorization": "Bearer guess"}
+        assert admin_client.delete("/api/v1/admin/slow-requests", headers=wrong).status_code == 401
+        
+        headers = {"Authorization": "Bearer s3cret"}
+        response = admin_client.get("/api/v1/admin/slow-requests", headers=headers)
+        assert response.status_code == 200
+        data = response.json()
+        assert data["profiling"] == profiling.PROFILING
+        assert data["requests"][0]["path"] == "/api/v1/check"
+        
+        admin_client.delete("/api/v1/admin/slow-requests", headers=headers)
+        assert admin_client.get("/api/v1/admin/slow-requests", headers=headers).json()["requests"] == []
+    
+    def test_admin_endpoint_needs_profiling(self, monkeypatch):
+        """Test that the slow request log is only served with profiling on and a token."""
+        for mode, token, status in (("off", "s3cret", 404), ("all", "", 404), ("all", "s3cret", 401)):
+            monkeypatch.setattr("app.main.PROFILING", mode)
+            monkeypatch.setattr("app.main.PROFILING_TOKEN", token)
+            demo = FastAPI()
+            add_admin_routes(demo)
+            assert TestClient(demo).get("/api/v1/admin/slow-requests").status_code == status, mode
+
+
+class TestCli:
+    """Test cases for the command line tools."""
+    
+    def test_check_ndjson(self):
+        """Test the NDJSON audit command."""
+        source = io.BytesIO(b'{"prompt": "my password"}\n{"prompt": "hello"}\n')
+        destination = io.BytesIO()
+        assert check_ndjson(source, destination) == 1
+        
+        records = [json.loads(line) for line in destination.getvalue().splitlines()]
+        assert [record["status"] for record in records] == ["SENSITIVE", "SAFE"]
+
+
+if __name__ == "__main__":
+    pytest.main([__file__])
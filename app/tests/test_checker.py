@@ -1,9 +1,23 @@
 """
 Test cases for SecurePrompt checker functionality.
 """
+import os
+import random
+import subprocess
+import sys
 import pytest
-from app.core.checker import PromptChecker
-from app.core.aho_corasick import AhoCorasick
+from app.core.checker import DEFAULT_SENSITIVE_KEYWORDS, PromptChecker
+from app.core.aho_corasick import (
+    ANYWHERE, MATCH_LEFTMOST_FIRST, MATCH_LEFTMOST_LONGEST, PREFIX, WHOLE_WORD, AhoCorasick
+)
+from app.core.cache import ResultCache
+from app.core.fuzzy import FuzzyMatcher, allowed_errors, best_alignment
+from app.core.keywords import KeywordReloader, KeywordSource
+from app.core.normalize import NormalizingMatcher, fold_char, normalize_keyword
+from app.core.pii import PII_CARD, PII_NIK, PII_NPWP, PII_PHONE, PiiDetector, luhn_valid
+from app.core import snapshot
+from app.core.snapshot import SnapshotError, load_snapshot, save_snapshot
+from app.core.tenants import TenantConfig, TenantRegistry, UnknownTenantError
 
 
 class TestAhoCorasick:
@@ -57,6 +71,567 @@ class TestAhoCorasick:
         ac = AhoCorasick(["password", "email"])
         assert ac.has_matches("Enter your password") == True
         assert ac.has_matches("This is normal text") == False
+    
+    def test_compiled_table_reports_suffix_matches(self):
+        """Test that matches reachable only through failure links are reported."""
+        ac = AhoCorasick(["he", "she", "his", "hers"])
+        matches = sorted(ac.search("USHERS"), key=lambda x: (x[1], x[0]))
+        assert matches == [("she", 1), ("he", 2), ("hers", 2)]
+    
+    def test_compiled_table_handles_unknown_characters(self):
+        """Test that characters outside the pattern alphabet reset the scan."""
+        ac = AhoCorasick(["pin"])
+        assert ac.search("p-in ✓ PIN") == [("pin", 7)]
+    
+    def test_duplicate_patterns_share_one_state(self):
+        """Test that duplicate patterns are reported once."""
+        ac = AhoCorasick(["SIM", "sim", "simcard"])
+        assert ac.search("simcard") == [("sim", 0), ("simcard", 0)]
+    
+    def test_memory_usage_report(self):
+        """Test the automaton memory report."""
+        ac = AhoCorasick(["password", "pass"])
+        report = ac.memory_usage()
+        assert ac.state_count == 9
+        assert report["transitions"] > 0
+        assert report["total"] == sum(v for k, v in report.items() if k != "total")
+    
+    def test_boundary_modes(self):
+        """Test that bounded patterns inside longer words are not reported."""
+        ac = AhoCorasick(["hp", "pin", "whatsapp"], [WHOLE_WORD, PREFIX, ANYWHERE])
+        text = "whatsapp hp, pinjam shipping HP"
+        assert ac.search(text) == [("whatsapp", 0), ("hp", 9), ("pin", 13), ("hp", 29)]
+        assert ac.search("NIK123 hp2") == [("hp", 7)]
+        assert ac.has_matches("shipping") == False
+    
+    def test_duplicate_patterns_keep_least_restrictive_mode(self):
+        """Test that a duplicate pattern without boundaries wins."""
+        ac = AhoCorasick(["pin", "PIN"], [WHOLE_WORD, ANYWHERE])
+        assert ac.search("shipping") == [("pin", 4)]
+        assert ac.fingerprint != AhoCorasick(["pin"], [WHOLE_WORD]).fingerprint
+    
+    def test_leftmost_match_kinds(self):
+        """Test non-overlapping leftmost-longest and leftmost-first matches."""
+        ac = AhoCorasick(["card", "credit", "credit card", "it ca"])
+        text = "my credit card"
+        assert ac.search(text, MATCH_LEFTMOST_LONGEST) == [("credit card", 3)]
+        assert ac.search(text, MATCH_LEFTMOST_FIRST) == [("credit", 3), ("card", 10)]
+        with pytest.raises(ValueError):
+            ac.search(text, "fuzzy")
+    
+    def test_count_and_exists(self):
+        """Test counting occurrences and the early-exit existence check."""
+        ac = AhoCorasick(["he", "she", "pin"], [ANYWHERE, ANYWHERE, WHOLE_WORD])
+        assert ac.count("she said he, shipping a PIN") == {"she": 1, "he": 2, "pin": 1}
+        assert ac.has_matches("spinning") == False
+        assert ac.has_matches("a pin") == True
+    
+    def test_add_and_remove_patterns(self):
+        """Test in-place updates, including a character the automaton lacks."""
+        ac = AhoCorasick(["he", "she", "hers"])
+        ac.add("his")
+        ac.add("pin", WHOLE_WORD)
+        assert ac.remove("he") == True
+        assert ac.remove("he") == False
+        assert ac.search("ushers his spin") == [("she", 1), ("hers", 2), ("his", 7)]
+        
+        ac.add("xyz")
+        assert ac.search("she xyz") == [("she", 0), ("xyz", 4)]
+        assert ac.fingerprint == AhoCorasick(["she", "hers", "his", "pin", "xyz"],
+                                             [0, 0, 0, WHOLE_WORD, 0]).fingerprint
+    
+    def test_updated_matches_fresh_build(self):
+        """Test that random update sequences match a freshly built automaton."""
+        rng = random.Random(7)
+        word = lambda: "".join(rng.choice("abc") for _ in range(rng.randint(1, 4)))
+        for _ in range(200):
+            modes = {}
+            for _ in range(rng.randint(0, 6)):
+                modes.setdefault(word(), rng.choice([ANYWHERE, PREFIX, WHOLE_WORD]))
+            ac = AhoCorasick(list(modes), list(modes.values()))
+            for _ in range(4):
+                removed = [pattern for pattern in modes if rng.random() < 0.3]
+                added = [pattern for pattern in {word(): None for _ in range(2)}
+                         if pattern not in modes or pattern in removed]
+                for pattern in removed:
+                    del modes[pattern]
+                for pattern in added:
+                    modes[pattern] = rng.choice([ANYWHERE, PREFIX, WHOLE_WORD])
+                ac = ac.updated(added, removed, [modes[pattern] for pattern in added])
+                
+                fresh = AhoCorasick(list(modes), list(modes.values()))
+                for _ in range(5):
+                    text = "".join(rng.choice("abc ") for _ in range(rng.randint(0, 20)))
+                    assert sorted(ac.search(text)) == sorted(fresh.search(text))
+                    assert ac.search(text, MATCH_LEFTMOST_LONGEST) == \
+                        fresh.search(text, MATCH_LEFTMOST_LONGEST)
+
+    
+    def test_prefilter_skips_clean_text(self):
+        """Test that only windows around rare parts of the patterns are scanned."""
+        ac = AhoCorasick(["password", "nik"], [ANYWHERE, WHOLE_WORD])
+        clean = "please summarize the lecture notes for the final exam " * 3
+        assert ac._prefilter.windows(clean) == []
+        text = clean + "my Password is " + clean
+        assert ac._prefilter.windows(text) == [(161, 178)]
+        assert ac.search(text) == [("password", 165)]
+        # Folding that changes lengths falls back to a full scan
+        assert ac._prefilter.windows("ß" + clean) is None
+        assert AhoCorasick(["σ"]).search("ΟΣ " * 40)[:1] == [("σ", 1)]
+    
+    def test_prefilter_matches_full_scan(self):
+        """Test that random texts give the same matches with and without the pre-filter."""
+        rng = random.Random(11)
+        word = lambda: "".join(rng.choice("abcde") for _ in range(rng.randint(1, 6)))
+        for _ in range(300):
+            patterns = [word() for _ in range(rng.randint(1, 5))]
+            modes = [rng.choice([ANYWHERE, PREFIX, WHOLE_WORD]) for _ in patterns]
+            ac = AhoCorasick(patterns, modes)
+            unfiltered = AhoCorasick(patterns, modes)
+            unfiltered._prefilter = None
+            for _ in range(5):
+                text = "".join(rng.choice("abcdexyz  ") for _ in range(rng.randint(0, 200)))
+                assert ac.search(text) == unfiltered.search(text)
+                assert ac.search(text, MATCH_LEFTMOST_FIRST) == \
+                    unfiltered.search(text, MATCH_LEFTMOST_FIRST)
+                assert ac.count(text) == unfiltered.count(text)
+                assert ac.has_matches(text) == unfiltered.has_matches(text)
+
+
+class TestStreamScanner:
+    """Test cases for chunked scanning."""
+    
+    def test_keyword_split_across_chunks(self):
+        """Test that a keyword split between chunks is found at its absolute offset."""
+        ac = AhoCorasick(["password", "pin"])
+        scanner = ac.scanner()
+        matches = scanner.feed("my pass")
+        matches += scanner.feed("word and P")
+        matches += scanner.feed("IN")
+        matches += scanner.finish()
+        assert matches == [("password", 3), ("pin", 16)]
+        assert scanner.offset == 19
+    
+    def test_chunked_scan_matches_full_scan(self):
+        """Test that every chunking gives the same matches as one search."""
+        ac = AhoCorasick(["he", "she", "his", "hers"])
+        text = "ushers said his hershe"
+        for size in range(1, len(text) + 1):
+            scanner = ac.scanner()
+            matches = []
+            for start in range(0, len(text), size):
+                matches += scanner.feed(text[start:start + size])
+            assert matches == ac.search(text)
+    
+    def test_right_boundary_across_chunks(self):
+        """Test that a whole-word match at a chunk end waits for the next chunk."""
+        ac = AhoCorasick(["hp"], [WHOLE_WORD])
+        scanner = ac.scanner()
+        assert scanner.feed("my hp") == []
+        assert scanner.feed(" and ") == [("hp", 3)]
+        assert scanner.feed("hp") + scanner.feed("one") == []
+        scanner = ac.scanner()
+        assert scanner.feed("h") + scanner.feed("p") + scanner.finish() == [("hp", 0)]
+    
+    def test_utf8_bytes_split_inside_character(self):
+        """Test byte chunks that split a multi-byte character."""
+        ac = AhoCorasick(["rahasia"])
+        data = "é rahasia".encode("utf-8")
+        scanner = ac.scanner()
+        matches = scanner.feed(data[:1]) + scanner.feed(data[1:6]) + scanner.feed(data[6:])
+        matches += scanner.finish()
+        assert matches == [("rahasia", 2)]
+
+
+class TestSnapshot:
+    """Test cases for automaton snapshot files."""
+    
+    def test_round_trip(self, tmp_path):
+        """Test that a loaded snapshot finds the same matches."""
+        path = str(tmp_path / "automaton.snap")
+        original = AhoCorasick(["he", "she", "his", "hers", "kartu kredit"],
+                               [ANYWHERE, ANYWHERE, WHOLE_WORD, ANYWHERE, ANYWHERE])
+        save_snapshot(original, path)
+        loaded = load_snapshot(path, original.fingerprint)
+        
+        text = "USHERS and his Kartu Kredit, this"
+        assert loaded.search(text) == original.search(text)
+        assert loaded.search(text, MATCH_LEFTMOST_LONGEST) == original.search(text, MATCH_LEFTMOST_LONGEST)
+        assert loaded.has_matches("nothing") == False
+        assert loaded.memory_usage()["transitions"] == original.memory_usage()["transitions"]
+    
+    def test_round_trip_without_patterns(self, tmp_path):
+        """Test snapshots of an automaton whose patterns were all removed, or never added."""
+        emptied = AhoCorasick(["password"])
+        emptied.remove("password")
+        for automaton in (emptied, AhoCorasick([])):
+            path = str(tmp_path / "automaton.snap")
+            save_snapshot(automaton, path)
+            loaded = load_snapshot(path, automaton.fingerprint)
+            assert loaded.patterns == automaton.patterns
+            assert loaded.search("my password") == []
+    
+    def test_rejects_other_keyword_set(self, tmp_path):
+        """Test that a snapshot of another keyword set is rejected."""
+        path = str(tmp_path / "automaton.snap")
+        save_snapshot(AhoCorasick(["password"]), path)
+        with pytest.raises(SnapshotError):
+            load_snapshot(path, AhoCorasick(["email"]).fingerprint)
+    
+    def test_rejects_invalid_file(self, tmp_path):
+        """Test that a file that is not a snapshot is rejected."""
+        path = tmp_path / "automaton.snap"
+        path.write_bytes(b"not a snapshot at all, just some bytes here")
+        with pytest.raises(SnapshotError):
+            load_snapshot(str(path))
+    
+    def test_rejects_truncated_tables(self, tmp_path):
+        """Test that tables shorter than the state count are rejected up front."""
+        path = tmp_path / "automaton.snap"
+        automaton = AhoCorasick(["password", "email"])
+        for index in (0, 6):  # Transitions, depths
+            save_snapshot(automaton, str(path))
+            data = bytearray(path.read_bytes())
+            position = snapshot._HEADER.size + index * snapshot._SECTION.size
+            offset, length = snapshot._SECTION.unpack_from(data, position)
+            snapshot._SECTION.pack_into(data, position, offset, length - 8)
+            path.write_bytes(bytes(data))
+            with pytest.raises(SnapshotError):
+                load_snapshot(str(path), automaton.fingerprint)
+        
+        save_snapshot(automaton, str(path))
+        path.write_bytes(path.read_bytes()[:-8])
+        with pytest.raises(SnapshotError):
+            load_snapshot(str(path), automaton.fingerprint)
+    
+    def test_checker_writes_and_reuses_snapshot(self, tmp_path):
+        """Test that the checker creates a missing snapshot and then maps it."""
+        path = str(tmp_path / "automaton.snap")
+        PromptChecker(["password"], snapshot_path=path)
+        checker = PromptChecker(["password"], snapshot_path=path)
+        assert isinstance(checker.aho_corasick._delta, memoryview)
+        assert checker.check_prompt("my password")["status"] == "SENSITIVE"
+    
+    def test_command_builds_configured_keywords(self, tmp_path):
+        """Test that the build-time snapshot matches the keywords the application loads."""
+        path = str(tmp_path / "automaton.snap")
+        runtime_path = tmp_path / "runtime.snap"
+        env = dict(os.environ, CUSTOM_KEYWORDS="gaji,PIN2", AUTOMATON_SNAPSHOT=str(runtime_path))
+        root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+        subprocess.run([sys.executable, "-m", "app.core.snapshot", path],
+                       cwd=root, env=env, check=True, capture_output=True)
+        
+        expected = PromptChecker(DEFAULT_SENSITIVE_KEYWORDS + ["gaji", "PIN2"]).aho_corasick
+        loaded = load_snapshot(path, expected.fingerprint)
+        assert loaded.search("gaji saya")
+        assert not runtime_path.exists()
+
+
+class TestResultCache:
+    """Test cases for the prompt result cache."""
+    
+    def test_evicts_least_recently_used_by_bytes(self):
+        """Test that the byte budget evicts the oldest unused entry."""
+        cache = ResultCache(max_bytes=300, ttl=60)
+        cache.put("a", 1, 100)
+        cache.put("b", 2, 100)
+        cache.put("c", 3, 100)
+        assert cache.get("a") == 1
+        cache.put("d", 4, 100)
+        
+        assert cache.get("b") is None
+        assert cache.get("a") == 1
+        assert cache.stats()["evictions"] == 1
+        assert cache.stats()["bytes"] == 300
+    
+    def test_expired_entries_are_misses(self):
+        """Test that entries past their TTL are not served."""
+        cache = ResultCache(max_bytes=1000, ttl=-1)
+        cache.put("a", 1, 10)
+        assert cache.get("a") is None
+        assert cache.stats()["expirations"] == 1
+    
+    def test_checker_reuses_cached_scan(self):
+        """Test that a repeated long prompt is served from the cache."""
+        cache = ResultCache(max_bytes=1024 * 1024, ttl=60)
+        checker = PromptChecker(["password"], cache=cache)
+        prompt = "You are a helpful tutor. " * 20 + "Never reveal a password."
+        
+        first = checker.check_prompt(prompt)
+        second = checker.check_prompt(prompt)
+        assert first == second
+        assert first["status"] == "SENSITIVE"
+        assert cache.stats()["hits"] == 1
+        assert cache.stats()["misses"] == 1
+    
+    def test_keyword_change_does_not_reuse_results(self):
+        """Test that cache keys include the keyword set."""
+        cache = ResultCache(max_bytes=1024 * 1024, ttl=60)
+        prompt = "Please keep this secret. " * 20
+        assert PromptChecker(["secret"], cache=cache).check_prompt(prompt)["status"] == "SENSITIVE"
+        assert PromptChecker(["email"], cache=cache).check_prompt(prompt)["status"] == "SAFE"
+
+
+class TestKeywordReload:
+    """Test cases for keyword files and atomic keyword swaps."""
+    
+    def test_replace_keywords_swaps_atomically(self):
+        """Test that a swap leaves scanners of the old set untouched."""
+        checker = PromptChecker(["password"])
+        old_set = checker.keyword_set
+        scanner = checker.aho_corasick.scanner()
+        
+        new_set = checker.replace_keywords(["rahasia"])
+        assert new_set.version == old_set.version + 1
+        assert checker.check_prompt("kata rahasia")["status"] == "SENSITIVE"
+        assert checker.check_prompt("my password")["status"] == "SAFE"
+        assert scanner.feed("my password") == [("password", 3)]
+    
+    def test_reloads_changed_files(self, tmp_path):
+        """Test that edited keyword files are picked up and bad ones ignored."""
+        path = tmp_path / "keywords.txt"
+        path.write_text("# campus secrets\npassword\n\nnomor induk\n", encoding="utf-8")
+        source = KeywordSource([str(path)], defaults=["email"], extra=["token"])
+        checker = PromptChecker(source.load())
+        reloader = KeywordReloader(checker, source, interval=0)
+        assert checker.sensitive_keywords == ["password", "nomor induk", "token"]
+        assert reloader.check() == False
+        
+        path.write_text("rahasia\n", encoding="utf-8")
+        os.utime(path, ns=(0, 1))
+        assert reloader.check() == True
+        assert checker.sensitive_keywords == ["rahasia", "token"]
+        assert checker.keyword_set.version == 2
+        
+        path.unlink()
+        assert reloader.check() == False
+        assert checker.sensitive_keywords == ["rahasia", "token"]
+    
+    def test_small_changes_update_in_place(self):
+        """Test that a small keyword change reuses the current automaton."""
+        keywords = [f"keyword{index}" for index in range(40)]
+        checker = PromptChecker(keywords)
+        old_set = checker.keyword_set
+        
+        new_set = checker.replace_keywords(keywords[1:] + ["rahasia"])
+        assert new_set.automaton.state_count >= old_set.automaton.state_count
+        assert new_set.automaton.fingerprint == AhoCorasick(keywords[1:] + ["rahasia"]).fingerprint
+        assert checker.check_prompt("kata rahasia")["status"] == "SENSITIVE"
+        assert checker.check_prompt("keyword0 ")["status"] == "SAFE"
+        assert old_set.automaton.search("keyword0 rahasia") == [("keyword0", 0)]
+
+
+class TestNormalizingMatcher:
+    """Test cases for obfuscation-resistant matching."""
+    
+    def test_folds_obfuscated_text(self):
+        """Test spacing, width, accents, homoglyphs, leetspeak and zero-width."""
+        matcher = NormalizingMatcher(["password", "api key"])
+        for text in ["P a s s w o r d", "ｐａｓｓｗｏｒｄ", "pässwörd", "раssword",
+                     "p4ssw0rd", "pass\u200bword", "p.a.s.s-w_o*r*d"]:
+            assert [keyword for keyword, _, _ in matcher.search(text)] == ["password"], text
+        assert matcher.search("my API-Key") == [("api key", 3, 10)]
+        assert normalize_keyword("API Key") == "apikey"
+        assert fold_char("\u200d") == ""
+    
+    def test_offsets_and_boundaries_use_original_text(self):
+        """Test that offsets span the obfuscated text and boundaries hold."""
+        matcher = NormalizingMatcher(["hp", "pin"], [WHOLE_WORD, WHOLE_WORD])
+        assert matcher.search("call h . p now") == [("hp", 5, 10)]
+        assert matcher.search("whatsapp shipping") == []
+        assert matcher.has_matches("my P I N") == True
+    
+    def test_checker_normalize_option(self):
+        """Test the normalize option of the checker."""
+        checker = PromptChecker(["password"])
+        assert checker.check_prompt("p a s s w o r d")["status"] == "SAFE"
+        result = checker.check_prompt("p a s s w o r d", normalize=True)
+        assert result["matches"] == [{"keyword": "password", "position": 0, "end": 15}]
+        assert checker.is_sensitive("PASSW0RD", normalize=True) == True
+        with pytest.raises(ValueError):
+            checker.check_prompt("password", MATCH_LEFTMOST_FIRST, normalize=True)
+
+
+class TestFuzzyMatcher:
+    """Test cases for approximate matching."""
+    
+    def test_finds_typos(self):
+        """Test matches within the allowed number of edits."""
+        matcher = FuzzyMatcher(["password", "nomor rekening", "token"], max_errors=2)
+        assert matcher.search("my pasword") == [("password", 3, 10, 1)]
+        assert matcher.search("nomer rekning saya") == [("nomor rekening", 0, 13, 2)]
+        assert matcher.search("my password") == [("password", 3, 11, 0)]
+        # Too short for typos; still matched exactly
+        assert matcher.search("taken token") == [("token", 6, 11, 0)]
+        assert matcher.has_matches("how do I cook pasta?") == False
+    
+    def test_allowed_errors_and_alignment(self):
+        """Test the per-keyword edit budget and the verification step."""
+        keywords = ["pin", "token", "secret", "rekening"]
+        assert [allowed_errors(keyword, 2) for keyword in keywords] == [0, 0, 1, 1]
+        assert allowed_errors("nomor rekening", 1) == 1
+        # Ties go to the shortest span: "secrt" needs one edit, as "secrte" does
+        assert best_alignment("secret", "a secrte b") == (1, 2, 7)
+        with pytest.raises(ValueError):
+            FuzzyMatcher(["password"], max_errors=3)
+    
+    def test_matches_brute_force(self):
+        """Test that the filter never misses a match found by brute force."""
+        def distance(a, b):
+            row = list(range(len(b) + 1))
+            for i, char in enumerate(a, 1):
+                previous, row[0] = row[:], i
+                for j, other in enumerate(b, 1):
+                    row[j] = min(previous[j] + 1, row[j - 1] + 1, previous[j - 1] + (char != other))
+            return row[-1]
+        
+        rng = random.Random(3)
+        for _ in range(300):
+            keyword = "".join(rng.choice("abc") for _ in range(rng.randint(3, 10)))
+            text = "".join(rng.choice("abcd ") for _ in range(rng.randint(0, 16)))
+            errors = allowed_errors(keyword, 2)
+            expected = any(
+                distance(keyword, text[i:j]) <= errors
+                for i in range(len(text) + 1) for j in range(i, len(text) + 1)
+            )
+            assert FuzzyMatcher([keyword], max_errors=2).has_matches(text) == expected
+    
+    def test_checker_max_errors_option(self):
+        """Test the max_errors option of the checker."""
+        checker = PromptChecker(["password"])
+        assert checker.check_prompt("my pasword")["status"] == "SAFE"
+        result = checker.check_prompt("my pasword", max_errors=1)
+        assert result["matches"] == [{"keyword": "password", "position": 3, "end": 10, "distance": 1}]
+        assert checker.is_sensitive("passwrd", max_errors=1) == True
+        with pytest.raises(ValueError):
+            checker.check_prompt("password", normalize=True, max_errors=1)
+
+
+class TestPiiDetector:
+    """Test cases for numeric personal data detection."""
+    
+    def setup_method(self):
+        """Set up the detector."""
+        self.detector = PiiDetector()
+    
+    def test_detects_each_type(self):
+        """Test NIK, NPWP, phone and card numbers in their usual layouts."""
+        text = ("nik 3201234505900001, npwp 01.234.567.8-901.000, "
+                "hp 0812-3456-7890 / +62 812 3456 7890, kartu 4111 1111 1111 1111")
+        findings = self.detector.detect(text)
+        assert [finding.type for finding in findings] == [
+            PII_NIK, PII_NPWP, PII_PHONE, PII_PHONE, PII_CARD
+        ]
+        assert text[findings[0].start:findings[0].end] == "3201234505900001"
+        assert text[findings[3].start:findings[3].end] == "+62 812 3456 7890"
+    
+    def test_rejects_invalid_structures(self):
+        """Test that numbers failing the structural checks are ignored."""
+        assert self.detector.detect("kode 1234567890123456") == []  # No such province
+        assert self.detector.detect("3201234599900001") == []       # Month 99
+        assert self.detector.detect("kartu 4111 1111 1111 1112") == []
+        assert self.detector.detect("0800 1234 567") == []          # Not a mobile prefix
+        assert self.detector.detect("ID3201234505900001") == []
+    
+    def test_ignores_bare_fifteen_digit_numbers(self):
+        """Test that IMEIs and order numbers are neither NPWP nor card numbers."""
+        assert self.detector.detect("IMEI 356938035643809") == []
+        assert self.detector.detect("IMEI 490154203237518") == []
+        assert self.detector.detect("order 123456789012345") == []
+        assert self.detector.detect("npwp 012345678901000") == []  # Left to the NPWP keyword
+        assert self.detector.detect("amex 378282246310005")[0].type == PII_CARD
+        assert luhn_valid("79927398713") == True
+    
+    def test_splits_runs_at_spaces(self):
+        """Test that a NIK followed by another number is still found."""
+        findings = self.detector.detect("3201234505900001 2024")
+        assert findings[0].type == PII_NIK and (findings[0].start, findings[0].end) == (0, 16)
+        assert self.detector.has_findings("tahun 2024, 12 orang") == False
+    
+    def test_checker_reports_findings(self):
+        """Test that findings make a prompt sensitive next to keyword matches."""
+        checker = PromptChecker(["password"], pii_detector=PiiDetector([PII_NIK]))
+        result = checker.check_prompt("nomor saya 3201234505900001")
+        assert result["status"] == "SENSITIVE"
+        assert result["matches"] == []
+        assert result["pii"] == [{"type": PII_NIK, "position": 11, "end": 27}]
+        assert checker.is_sensitive("3201234505900001") == True
+        assert checker.check_prompt("hello")["pii"] == []
+        
+        result = checker.check_conversation(["hi", "my NIK 3201234505900001"])
+        assert result["pii"] == [{"type": PII_NIK, "position": 7, "end": 23, "message": 1}]
+        with pytest.raises(ValueError):
+            PiiDetector(["passport"])
+
+
+    def test_stream_findings_split_across_chunks(self):
+        """Test that a number split between chunks is found once, in place."""
+        checker = PromptChecker(["password"], pii_detector=PiiDetector())
+        result = checker.check_stream([b"kartu 4111 11", b"11 1111 ", b"1111 dan nik 32012345", b"05900001"])
+        assert result["status"] == "SENSITIVE"
+        assert result["matches"] == []
+        assert result["pii"] == [
+            {"type": PII_CARD, "position": 6, "end": 25},
+            {"type": PII_NIK, "position": 34, "end": 50},
+        ]
+        assert checker.check_stream(["tahun 20", "24"])["pii"] == []
+
+
+class TestTenantRegistry:
+    """Test cases for per-tenant checkers."""
+    
+    def setup_method(self):
+        """Set up a base checker and three tenants."""
+        self.base = PromptChecker(["password", "nik"])
+        self.registry = TenantRegistry(self.base, {
+            "campus-a": TenantConfig(keywords=["nilai ujian"], api_keys=["key-a"]),
+            "campus-b": TenantConfig(keywords=["nilai ujian"]),
+            "campus-c": TenantConfig(keywords=["rahasia"], inherit=False),
+            "plain": TenantConfig(keywords=["PASSWORD"]),
+        })
+    
+    def test_tenant_overlays(self):
+        """Test that overlays extend or replace the base keywords."""
+        checker = self.registry.checker_for("campus-a")
+        assert checker.check_prompt("nilai ujian and password")["status"] == "SENSITIVE"
+        assert self.base.check_prompt("nilai ujian")["status"] == "SAFE"
+        
+        checker = self.registry.checker_for("campus-c")
+        assert checker.sensitive_keywords == ["rahasia"]
+        assert checker.is_sensitive("my password") == False
+    
+    def test_identical_sets_share_a_checker(self):
+        """Test that tenants with the same keywords share one automaton."""
+        assert self.registry.checker_for("campus-a") is self.registry.checker_for("campus-b")
+        assert self.registry.checker_for("plain") is self.base
+        assert self.registry.stats()["automata"] == 1
+    
+    def test_resolve(self):
+        """Test tenant selection by name and by API key."""
+        assert self.registry.resolve("campus-b", "key-a") == "campus-b"
+        assert self.registry.resolve(None, "key-a") == "campus-a"
+        assert self.registry.resolve(None, "other-key") is None
+        with pytest.raises(UnknownTenantError):
+            self.registry.resolve("campus-z")
+    
+    def test_evicts_idle_automata_over_budget(self):
+        """Test that the least recently used automaton is dropped first."""
+        self.registry.memory_budget = 1
+        first = self.registry.checker_for("campus-a")
+        first.check_many(["nilai ujian", "hello"] * 2, processes=2, chunk_size=2)
+        pool = first._pool[2]
+        self.registry.checker_for("campus-c")
+        assert self.registry.stats()["automata"] == 1
+        assert self.registry.evictions == 1
+        assert first._pool is None and pool._shutdown_thread
+        assert self.registry.checker_for("campus-a") is not first
+    
+    def test_base_change_rebuilds_overlays(self):
+        """Test that tenant checkers follow a new base keyword set."""
+        assert self.registry.checker_for("campus-a").is_sensitive("rekening") == False
+        self.base.replace_keywords(["rekening"])
+        checker = self.registry.checker_for("campus-a")
+        assert checker.sensitive_keywords == ["rekening", "nilai ujian"]
 
 
 class TestPromptChecker:
@@ -127,6 +702,73 @@ class TestPromptChecker:
         assert len(result["matches"]) == 1
         assert result["matches"][0]["keyword"] == "credit card"
 
+    def test_short_default_keywords_match_whole_words(self):
+        """Test that short default keywords do not match inside words."""
+        checker = PromptChecker()
+        result = checker.check_prompt("Shipping via whatsapp is simple")
+        assert [match["keyword"] for match in result["matches"]] == ["whatsapp"]
+        result = checker.check_prompt("My PIN and SIM: 1234")
+        assert [match["keyword"] for match in result["matches"]] == ["pin", "sim"]
+    
+    def test_check_stream(self):
+        """Test checking chunked input."""
+        result = self.checker.check_stream([b"my cre", b"dit ca", b"rd"])
+        assert result == {
+            "status": "SENSITIVE",
+            "matches": [{"keyword": "credit card", "position": 3}]
+        }
+        assert self.checker.check_stream(["hello ", "world"])["status"] == "SAFE"
+    
+    def test_check_many_in_process(self):
+        """Test batch checking preserves input order."""
+        results = self.checker.check_many(["my email", "hello", "my phone"])
+        assert [result["status"] for result in results] == ["SENSITIVE", "SAFE", "SENSITIVE"]
+    
+    def test_check_many_with_worker_processes(self):
+        """Test batch checking split across worker processes."""
+        prompts = ["my email", "hello"] * 5
+        results = self.checker.check_many(prompts, processes=2, chunk_size=3)
+        assert results == [self.checker.check_prompt(prompt) for prompt in prompts]
+    
+    def test_check_many_reuses_worker_pool(self):
+        """Test that batches share one worker pool until the keywords change."""
+        checker = PromptChecker(["password", "email"])
+        prompts = ["my email", "hello"] * 3
+        try:
+            checker.check_many(prompts, processes=2, chunk_size=2)
+            pool = checker._pool[2]
+            checker.check_many(prompts, processes=2, chunk_size=2)
+            assert checker._pool[2] is pool
+            
+            checker.replace_keywords(["hello"])
+            results = checker.check_many(prompts, processes=2, chunk_size=2)
+            assert checker._pool[2] is not pool
+            assert [result["status"] for result in results] == ["SAFE", "SENSITIVE"] * 3
+        finally:
+            checker.close()
+        assert checker._pool is None
+    
+    def test_check_conversation_offsets_per_message(self):
+        """Test that conversation matches are reported per message."""
+        result = self.checker.check_conversation(["my pass", "word here", "", "email me, phone too"])
+        assert result["status"] == "SENSITIVE"
+        assert result["messages"][0] == [] and result["messages"][1] == []
+        assert result["messages"][3] == [
+            {"keyword": "email", "position": 0},
+            {"keyword": "phone", "position": 10},
+        ]
+        assert result["matches"][1] == {"keyword": "phone", "position": 10, "message": 3}
+    
+    def test_check_conversation_reuses_earlier_turns(self):
+        """Test that messages from earlier turns are not scanned again."""
+        checker = PromptChecker(["password"], cache=ResultCache(1024 * 1024, 60))
+        history = ["my password is " + "x" * 300]
+        first = checker.check_conversation(history)
+        second = checker.check_conversation(history + ["and the password again"])
+        assert second["messages"][0] == first["messages"][0]
+        assert second["messages"][1] == [{"keyword": "password", "position": 8}]
+        assert checker.cache.stats()["hits"] == 1
+
 
 class TestIntegration:
     """Integration tests combining multiple components."""
@@ -0,0 +1,64 @@
+"""
+Test cases for the single-pass prompt sanitizer.
+"""
+import pytest
+from app.core.sanitizer import Sanitizer, default_sanitizer
+
+
+class TestSanitizer:
+    """Test cases for Sanitizer."""
+    
+    def test_replaces_labelled_ids(self):
+        """Test that labelled ID numbers are replaced."""
+        result = default_sanitizer.sanitize("Student with NIM 12345678 and NIK 3202011234567890")
+        assert result.text == "Student with student ID and ID"
+    
+    def test_replaces_contact_details(self):
+        """Test that phone numbers and emails are replaced."""
+        result = default_sanitizer.sanitize("Call 081234567890 or mail john.doe@mail.com")
+        assert result.text == "Call phone or mail email"
+    
+    def test_replaces_emails_glued_to_values(self):
+        """Test that an email right after a phone number or ID value is replaced with it."""
+        assert default_sanitizer.sanitize("call 081234567890john@x.com").text == "call email"
+        assert default_sanitizer.sanitize("0812345678a@b.com").text == "email"
+        assert default_sanitizer.sanitize("hp 1234567890123HPa@b.com5").text == "email5"
+        assert default_sanitizer.sanitize("NIK 3202011234567890a@b.com ok").text == "email ok"
+        
+        result = default_sanitizer.sanitize("HP:08123456789.me@mail.co")
+        assert result.text == "email"
+        assert result.spans == [(0, 25, "email")]
+    
+    def test_reports_spans_in_original_text(self):
+        """Test that replacement spans point into the input."""
+        text = "  NIK: 3202011234567890 is mine"
+        result = default_sanitizer.sanitize(text)
+        assert result.spans == [(2, 23, "ID")]
+        assert text[2:23] == "NIK: 3202011234567890"
+    
+    def test_collapses_whitespace_and_trims(self):
+        """Test whitespace normalization without reporting it as a replacement."""
+        result = default_sanitizer.sanitize("  hello \n\t world  ")
+        assert result.text == "hello world"
+        assert result.spans == []
+    
+    def test_renames_bare_id_labels(self):
+        """Test that ID labels without a number are renamed case-sensitively."""
+        assert default_sanitizer.sanitize("NIK: unknown, ktp belum ada").text == "ID: unknown, ID belum ada"
+        assert default_sanitizer.sanitize("Nik: unknown").text == "Nik: unknown"
+    
+    def test_clean_text_is_unchanged(self):
+        """Test that text without sensitive values is returned as-is."""
+        text = "How do I cook pasta?"
+        result = default_sanitizer.sanitize(text)
+        assert result.text == text
+        assert result.spans == []
+    
+    def test_custom_rules_with_groups(self):
+        """Test rules that contain their own capturing groups."""
+        sanitizer = Sanitizer([(r"(secret)-(\d+)", "REDACTED")], id_labels=[])
+        assert sanitizer.sanitize("a secret-42 b").text == "a REDACTED b"
+
+
+if __name__ == "__main__":
+    pytest.main([__file__])
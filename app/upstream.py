@@ -0,0 +1,50 @@
+"""
+Pooled async HTTP client for upstream Ollama calls.
+
+A single ``httpx.AsyncClient`` per process keeps HTTP/1.1 connections to
+Ollama alive and reuses them across requests, so route handlers can await
+upstream calls without blocking the event loop or paying a TCP handshake
+per request.
+"""
+import os
+from typing import Optional
+
+import httpx
+
+
+# Connection pool and timeout configuration
+OLLAMA_POOL_SIZE = int(os.getenv('OLLAMA_POOL_SIZE', '200'))
+OLLAMA_KEEPALIVE_CONNECTIONS = int(os.getenv('OLLAMA_KEEPALIVE_CONNECTIONS', '50'))
+OLLAMA_KEEPALIVE_EXPIRY = float(os.getenv('OLLAMA_KEEPALIVE_EXPIRY', '30'))
+OLLAMA_CONNECT_TIMEOUT = float(os.getenv('OLLAMA_CONNECT_TIMEOUT', '5'))
+OLLAMA_TIMEOUT = float(os.getenv('OLLAMA_TIMEOUT', '30'))
+
+_client: Optional[httpx.AsyncClient] = None
+
+
+def get_client() -> httpx.AsyncClient:
+    """
+    Return the shared upstream client, creating it on first use.
+    
+    Returns:
+        Pooled AsyncClient configured from the OLLAMA_* settings
+    """
+    global _client
+    if _client is None or _client.is_closed:
+        _client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=OLLAMA_POOL_SIZE,
+                max_keepalive_connections=OLLAMA_KEEPALIVE_CONNECTIONS,
+                keepalive_expiry=OLLAMA_KEEPALIVE_EXPIRY,
+            ),
+            timeout=httpx.Timeout(OLLAMA_TIMEOUT, connect=OLLAMA_CONNECT_TIMEOUT),
+        )
+    return _client
+
+
+async def close_client() -> None:
+    """Close the shared upstream client and its pooled connections."""
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
@@ -0,0 +1,83 @@
+"""
+Compare a full automaton rebuild with an incremental update.
+
+Run from the repository root:
+
+    python -m benchmarks.incremental_update
+    
+For each keyword list size, times a fresh build, then adding and removing
+a batch of keywords with ``AhoCorasick.updated``. The first update indexes
+the trie and is left out. Updates still copy the tables, one memory copy
+per table; the rest of the cost follows the batch size, not the list size.
+"""
+import random
+import string
+import time
+from typing import List, Tuple
+
+from app.core.aho_corasick import AhoCorasick
+
+
+LIST_SIZES = [1_000, 10_000, 100_000]
+BATCH_SIZES = [1, 10, 100]
+REPEATS = 5
+
+
+def random_keywords(count: int, rng: random.Random) -> List[str]:
+    """Random lowercase keywords of 4 to 16 letters, plus a space now and then."""
+    alphabet = string.ascii_lowercase + " "
+    return [
+        "".join(rng.choice(alphabet) for _ in range(rng.randint(4, 16)))
+        for _ in range(count)
+    ]
+
+
+def time_update(automaton: AhoCorasick, keywords: List[str], batch: int,
+                rng: random.Random, repeats: int = REPEATS) -> Tuple[float, AhoCorasick]:
+    """
+    Time swapping a batch of keywords into an automaton and back out.
+    
+    Args:
+        automaton: Automaton holding the keywords, already indexed
+        keywords: Keywords compiled into the automaton
+        batch: Number of keywords added and removed per update
+        rng: Random source for the batch
+        repeats: Number of timed updates; the fastest one counts
+        
+    Returns:
+        Best update time in seconds, and the automaton to keep updating
+    """
+    added = random_keywords(batch, rng)
+    removed = rng.sample(keywords, batch)
+    best = float("inf")
+    for _ in range(repeats):
+        # Swap the batch in and back out, keeping the list size
+        started = time.perf_counter()
+        automaton = automaton.updated(added, removed)
+        best = min(best, time.perf_counter() - started)
+        automaton = automaton.updated(removed, added)
+    return best, automaton
+
+
+def main() -> None:
+    """Print build and update timings for each list size."""
+    rng = random.Random(0)
+    print(f"{'keywords':>9} {'build':>9} " + " ".join(
+        f"{f'+/-{batch}':>9}" for batch in BATCH_SIZES
+    ))
+    for size in LIST_SIZES:
+        keywords = random_keywords(size, rng)
+        started = time.perf_counter()
+        AhoCorasick(keywords)
+        build = time.perf_counter() - started
+        automaton = AhoCorasick(keywords).updated()
+        
+        timings = []
+        for batch in BATCH_SIZES:
+            best, automaton = time_update(automaton, keywords, batch, rng)
+            timings.append(best)
+        print(f"{size:>9} {build:>8.3f}s " + " ".join(f"{t * 1000:>7.2f}ms" for t in timings))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,414 @@
+"""
+Reproducible benchmark suite for the checker, sanitizer and endpoints.
+
+Run from the repository root:
+
+    python -m benchmarks.suite -o results.json
+    python -m benchmarks.suite --quick --compare results.json
+    
+Measures automaton build and update time against the keyword count, scan
+throughput against text length and match density, sanitizer throughput,
+and requests per second of /check and /chat/completions. Requests go
+through the ASGI app in process, and upstream calls reach a stub Ollama
+that answers at once, so the numbers cover SecurePrompt alone. Inputs come
+from fixed seeds, so two runs on one machine measure the same work.
+
+Results are written as JSON, one record per measurement keyed by its name
+and parameters. ``--compare`` matches the records against an earlier file
+and exits with status 1 when any of them got worse beyond the threshold.
+"""
+import argparse
+import asyncio
+import json
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+import httpx
+
+from app.core.aho_corasick import AhoCorasick
+from app.core.checker import DEFAULT_SENSITIVE_KEYWORDS, keyword_boundaries
+from app.core.sanitizer import default_sanitizer
+
+from .incremental_update import random_keywords, time_update
+
+
+GROUPS = ("build", "scan", "sanitizer", "endpoints")
+
+# Parameters of the full run, and of --quick
+BUILD_SIZES = {"full": [100, 1_000, 10_000, 100_000], "quick": [100, 1_000, 10_000]}
+UPDATE_BATCHES = [1, 100]
+SCAN_LENGTHS = {"full": [1_024, 65_536, 1_048_576], "quick": [1_024, 65_536]}
+MATCH_DENSITIES = [0.0, 0.01, 0.1]  # Share of words that are keywords or PII
+ENDPOINT_REQUESTS = {"full": 2_000, "quick": 200}
+ENDPOINT_CONCURRENCY = 16
+ENDPOINT_PROMPT_LENGTH = 512
+
+# Shortest total time of one timed repeat, and the number of repeats
+MIN_DURATION = {"full": 0.2, "quick": 0.05}
+REPEATS = 5
+
+# Relative change beyond which --compare reports a regression
+DEFAULT_THRESHOLD = 0.1
+
+# Everyday English and Indonesian words for the filler text
+FILLER_WORDS = (
+    "the of and to in is for on that with as by at from this it be are which or "
+    "students course exam lecture grade assignment deadline quiz forum module "
+    "tolong jelaskan bagaimana cara membuat tugas kuliah saya dengan baik untuk "
+    "materi minggu ini dosen jadwal ruang kelas nilai akhir"
+).split()
+
+# Personal data the sanitizer rewrites
+PII_SAMPLES = (
+    "NIK 3201234505900001", "nim: 1301194000", "hp 081234567890",
+    "+6281234567890", "budi.santoso@example.ac.id",
+)
+
+# Body of every stub Ollama response
+STUB_COMPLETION = json.dumps({
+    "id": "chatcmpl-bench",
+    "object": "chat.completion",
+    "created": 0,
+    "model": "stub",
+    "choices": [{
+        "index": 0,
+        "message": {"role": "assistant", "content": "This is a stub answer."},
+        "finish_reason": "stop"
+    }],
+    "usage": {"prompt_tokens": 1, "completion_tokens": 5, "total_tokens": 6}
+}).encode("utf-8")
+
+
+def record(name: str, params: Dict[str, Any], value: float, unit: str,
+           higher_is_better: bool) -> Dict[str, Any]:
+    """Build one result record."""
+    return {
+        "name": name,
+        "params": params,
+        "value": round(value, 6),
+        "unit": unit,
+        "higher_is_better": higher_is_better,
+    }
+
+
+def best_time(func: Callable[[], Any], min_duration: float, repeats: int = REPEATS) -> float:
+    """
+    Time a function the way timeit does.
+    
+    The number of calls per repeat doubles until a repeat lasts at least
+    min_duration, so fast functions are not dominated by timer overhead.
+    
+    Args:
+        func: Function to time
+        min_duration: Shortest duration of one repeat, in seconds
+        repeats: Number of repeats; the fastest one counts
+        
+    Returns:
+        Seconds per call
+    """
+    number = 1
+    while True:
+        started = time.perf_counter()
+        for _ in range(number):
+            func()
+        elapsed = time.perf_counter() - started
+        if elapsed >= min_duration:
+            break
+        number *= 2
+    
+    best = elapsed
+    for _ in range(repeats - 1):
+        started = time.perf_counter()
+        for _ in range(number):
+            func()
+        best = min(best, time.perf_counter() - started)
+    return best / number
+
+
+def make_text(rng: random.Random, length: int, density: float,
+              inserts: Sequence[str]) -> str:
+    """
+    Filler text with a share of its words replaced by inserts.
+    
+    Args:
+        rng: Random source
+        length: Length of the text in characters
+        density: Share of words replaced
+        inserts: Keywords or PII samples to insert
+        
+    Returns:
+        Text of exactly the given length
+    """
+    words = []
+    size = 0
+    while size < length:
+        word = rng.choice(inserts) if rng.random() < density else rng.choice(FILLER_WORDS)
+        words.append(word)
+        size += len(word) + 1
+    return " ".join(words)[:length]
+
+
+def bench_build(mode: str, rng: random.Random) -> List[Dict[str, Any]]:
+    """Build and incremental update time against the keyword count."""
+    results = []
+    for size in BUILD_SIZES[mode]:
+        keywords = random_keywords(size, rng)
+        started = time.perf_counter()
+        automaton = AhoCorasick(keywords)
+        build = time.perf_counter() - started
+        results.append(record("build", {"keywords": size}, build * 1000, "ms", False))
+        
+        # The first update indexes the trie and is left out
+        automaton = automaton.updated()
+        for batch in UPDATE_BATCHES:
+            update, automaton = time_update(automaton, keywords, batch, rng)
+            results.append(record("update", {"keywords": size, "batch": batch},
+                                  update * 1000, "ms", False))
+    return results
+
+
+def bench_scan(mode: str, rng: random.Random) -> List[Dict[str, Any]]:
+    """Scan throughput of the default keywords against text length and match density."""
+    keywords = DEFAULT_SENSITIVE_KEYWORDS
+    automaton = AhoCorasick(keywords, keyword_boundaries(keywords))
+    results = []
+    for length in SCAN_LENGTHS[mode]:
+        for density in MATCH_DENSITIES:
+            text = make_text(rng, length, density, keywords)
+            seconds = best_time(lambda: automaton.search(text), MIN_DURATION[mode])
+            results.append(record("scan", {"length": length, "density": density},
+                                  length / seconds / 1e6, "MB/s", True))
+    return results
+
+
+def bench_sanitizer(mode: str, rng: random.Random) -> List[Dict[str, Any]]:
+    """Sanitizer throughput against text length and PII density."""
+    results = []
+    for length in SCAN_LENGTHS[mode]:
+        for density in MATCH_DENSITIES:
+            text = make_text(rng, length, density, PII_SAMPLES)
+            seconds = best_time(lambda: default_sanitizer.sanitize(text), MIN_DURATION[mode])
+            results.append(record("sanitizer", {"length": length, "density": density},
+                                  length / seconds / 1e6, "MB/s", True))
+    return results
+
+
+async def stub_ollama(scope: Dict[str, Any], receive: Callable, send: Callable) -> None:
+    """ASGI stand-in for Ollama answering every request with one completion."""
+    if scope["type"] != "http":
+        return
+    while (await receive()).get("more_body"):
+        pass
+    await send({
+        "type": "http.response.start",
+        "status": 200,
+        "headers": [(b"content-type", b"application/json")],
+    })
+    await send({"type": "http.response.body", "body": STUB_COMPLETION})
+
+
+async def run_requests(client: httpx.AsyncClient, path: str,
+                       bodies: Sequence[Dict[str, Any]]) -> Dict[str, float]:
+    """
+    Send requests with bounded concurrency and time them.
+    
+    Args:
+        client: Client bound to the application
+        path: Endpoint path
+        bodies: JSON body of each request
+        
+    Returns:
+        Requests per second and latency percentiles in milliseconds
+    """
+    latencies: List[float] = []
+    pending = iter(bodies)
+    
+    async def worker():
+        for body in pending:
+            started = time.perf_counter()
+            response = await client.post(path, json=body)
+            latencies.append(time.perf_counter() - started)
+            response.raise_for_status()
+    
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(ENDPOINT_CONCURRENCY)))
+    elapsed = time.perf_counter() - started
+    
+    cuts = statistics.quantiles(latencies, n=100)
+    return {"rps": len(bodies) / elapsed, "p50": cuts[49] * 1000, "p99": cuts[98] * 1000}
+
+
+async def _bench_endpoints(mode: str, rng: random.Random) -> List[Dict[str, Any]]:
+    """Run the endpoint benchmarks on one event loop."""
+    from app import upstream
+    from app.main import app
+    
+    count = ENDPOINT_REQUESTS[mode]
+    # Distinct prompts, so the result cache never answers for the checker
+    prompts = [
+        make_text(rng, ENDPOINT_PROMPT_LENGTH, 0.01, DEFAULT_SENSITIVE_KEYWORDS) + f" #{index}"
+        for index in range(count)
+    ]
+    endpoints = {
+        "/api/v1/check": [{"prompt": prompt} for prompt in prompts],
+        "/api/v1/chat/completions": [
+            {"model": "stub", "messages": [{"role": "user", "content": prompt}]}
+            for prompt in prompts
+        ],
+    }
+    
+    previous = upstream._client
+    upstream._client = httpx.AsyncClient(transport=httpx.ASGITransport(app=stub_ollama))
+    results = []
+    try:
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app),
+                                     base_url="http://bench") as client:
+            for path, bodies in endpoints.items():
+                # Warm up imports, caches of derived matchers and the pool
+                await run_requests(client, path, bodies[:ENDPOINT_CONCURRENCY])
+                timing = await run_requests(client, path, bodies)
+                params = {"endpoint": path, "concurrency": ENDPOINT_CONCURRENCY}
+                results.append(record("requests", params, timing["rps"], "req/s", True))
+                results.append(record("latency_p50", params, timing["p50"], "ms", False))
+                results.append(record("latency_p99", params, timing["p99"], "ms", False))
+    finally:
+        await upstream._client.aclose()
+        upstream._client = previous
+    return results
+
+
+def bench_endpoints(mode: str, rng: random.Random) -> List[Dict[str, Any]]:
+    """Requests per second and latency of /check and /chat/completions."""
+    return asyncio.run(_bench_endpoints(mode, rng))
+
+
+BENCHMARKS: Dict[str, Callable[[str, random.Random], List[Dict[str, Any]]]] = {
+    "build": bench_build,
+    "scan": bench_scan,
+    "sanitizer": bench_sanitizer,
+    "endpoints": bench_endpoints,
+}
+
+
+def git_revision() -> Optional[str]:
+    """Commit of the working tree, if it is a git checkout."""
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(groups: Sequence[str], quick: bool = False) -> Dict[str, Any]:
+    """
+    Run benchmark groups.
+    
+    Args:
+        groups: Names from GROUPS
+        quick: Use smaller inputs and shorter timings
+        
+    Returns:
+        Report with run metadata and the result records
+    """
+    mode = "quick" if quick else "full"
+    results = []
+    for group in groups:
+        # One seed per group, so selecting groups does not change the inputs
+        rng = random.Random(f"secureprompt-{group}")
+        for result in BENCHMARKS[group](mode, rng):
+            print(format_record(result), file=sys.stderr)
+            results.append(result)
+    return {
+        "meta": {
+            "revision": git_revision(),
+            "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "mode": mode,
+        },
+        "results": results,
+    }
+
+
+def record_key(result: Dict[str, Any]) -> str:
+    """Key matching a record across reports."""
+    return result["name"] + json.dumps(result["params"], sort_keys=True)
+
+
+def format_record(result: Dict[str, Any]) -> str:
+    """One line describing a record."""
+    params = " ".join(f"{key}={value}" for key, value in result["params"].items())
+    return f"{result['name']:<12} {params:<52} {result['value']:>12.3f} {result['unit']}"
+
+
+def compare(report: Dict[str, Any], baseline: Dict[str, Any],
+            threshold: float = DEFAULT_THRESHOLD) -> List[str]:
+    """
+    Compare a report with a baseline report.
+    
+    Args:
+        report: Current report
+        baseline: Earlier report
+        threshold: Relative change counted as a regression
+        
+    Returns:
+        Lines describing each record found in both, regressions marked
+    """
+    previous = {record_key(result): result for result in baseline["results"]}
+    lines = []
+    for result in report["results"]:
+        old = previous.get(record_key(result))
+        if old is None or not old["value"]:
+            continue
+        change = result["value"] / old["value"] - 1
+        worse = -change if result["higher_is_better"] else change
+        marker = "REGRESSION" if worse > threshold else ""
+        lines.append(f"{format_record(result)} {change:>+8.1%} {marker}".rstrip())
+    return lines
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """Entry point for ``python -m benchmarks.suite``."""
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.suite",
+                                     description="SecurePrompt benchmarks")
+    parser.add_argument("-o", "--output", help="Write the JSON report to this file")
+    parser.add_argument("--quick", action="store_true", help="Smaller inputs, shorter timings")
+    parser.add_argument("--only", default=",".join(GROUPS),
+                        help=f"Comma-separated groups to run (default: {','.join(GROUPS)})")
+    parser.add_argument("--compare", metavar="BASELINE", help="JSON report to compare with")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="Relative change reported as a regression (default: 0.1)")
+    args = parser.parse_args(argv)
+    
+    groups = [group.strip() for group in args.only.split(",") if group.strip()]
+    unknown = set(groups) - set(GROUPS)
+    if unknown:
+        parser.error(f"unknown groups: {', '.join(sorted(unknown))}")
+    
+    report = run(groups, args.quick)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as handle:
+            json.dump(report, handle, indent=2)
+            handle.write("\n")
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        sys.stdout.write("\n")
+    
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as handle:
+            lines = compare(report, json.load(handle), args.threshold)
+        print("\n".join(lines), file=sys.stderr)
+        if any(line.endswith("REGRESSION") for line in lines):
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())